@@ -0,0 +1,85 @@
+# Ядро агрегатора: обход файловой системы и вспомогательные функции без зависимостей от Flet
+import importlib
+
+from .constants import TEXT_EXTENSIONS, IGNORE_DIRS, DELTA_OFF, DELTA_FILES, DELTA_DIFF, DELTA_MODES
+from .classify import (
+    is_likely_text_file, sniff_is_text, clear_classification_cache, export_classification, import_classification, SNIFF_BYTES,
+)
+from .scan_control import ScanController, CancelToken, ScanCancelled
+from .ignore_rules import (
+    IgnoreRules, IgnoreScope, RuleSet, parse_rules, compile_pattern,
+    GITIGNORE_FILE_NAME, PROJECT_IGNORE_FILE_NAME, IGNORE_FILE_NAMES,
+)
+from .walker import WalkEntry, walk_tree, iter_files, is_pruned_dir_name, is_ignored_path
+from .tree_index import TreeIndex, NodeRow, KIND_FILE, KIND_DIR, KIND_DELETED, ROOT_ID
+from .selection import SelectionTrie, SelectionRegion, CHECKED, UNCHECKED, MIXED
+from .content_search import ContentSearch, ContentIndex, ContentQuery, CONTENT_INDEX_MAX_FILE_BYTES
+from .tree_filter import FilterEngine, NameIndex, FILTER_DEBOUNCE_SECONDS
+from .content_cache import ContentCache, DEFAULT_CONTENT_CACHE_BYTES
+from .reader import (
+    DEFAULT_READ_WORKERS, FileBlock, read_file, iter_blocks, read_blocks, read_file_block,
+    format_file_block, format_error_block, relative_display_path, format_size, read_text_stripped,
+    read_text_truncated, format_truncated_block, content_hash, block_digest, block_body, block_line_count,
+)
+from .dedup import BlockDeduplicator, format_duplicate_block, format_dedup_note
+from .budget import (
+    BudgetPlan, plan_budget, file_stamps, file_sizes, estimate_tokens, format_tokens, format_budget_note,
+    BYTES_PER_TOKEN, DEFAULT_FILE_CAP_BYTES, DEFAULT_BUDGET_TOKENS, MISSING_STAMP,
+)
+from .output_buffer import OutputBuffer, OutlineEntry, page_bounds, DEFAULT_SPILL_CHARS, compose_output, compose_text
+from .perf import Profiler, SpanRecord, profiler, PERF_ENV_VAR
+from .workspace import normalize_roots, display_bases, root_labels, root_of, build_indexes, WORKSPACE_WORKERS
+from .pipeline import collect_files, collect_workspace, write_aggregate, AggregateStats, WorkspaceFiles
+
+# Модули с тяжёлыми зависимостями (sqlite3, ctypes, difflib, asyncio) загружаются при первом обращении к их именам:
+# пакетной сборке без режима изменений они не нужны
+_LAZY_EXPORTS = {
+    **dict.fromkeys(("IndexStore", "SavedState", "default_cache_dir", "INDEX_SCHEMA_VERSION"), "index_store"),
+    **dict.fromkeys(("FsWatcher", "ChangeBatch"), "watcher"),
+    **dict.fromkeys((
+        "DeltaTracker", "FileSnapshot", "format_diff_block", "format_deleted_block", "format_delta_note", "merge_snapshots",
+        "SNAPSHOT_CONTENT_MAX_CHARS",
+    ), "snapshot"),
+    **dict.fromkeys(("aiter_blocks", "run_blocking"), "async_pipeline"),
+}
+
+
+def __getattr__(name: str):
+    module_name = _LAZY_EXPORTS.get(name)
+    if module_name is None: raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f".{module_name}", __name__), name)
+    globals()[name] = value # Следующие обращения не проходят через __getattr__
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY_EXPORTS))
+
+__all__ = [
+    "TEXT_EXTENSIONS", "IGNORE_DIRS", "DELTA_OFF", "DELTA_FILES", "DELTA_DIFF", "DELTA_MODES",
+    "is_likely_text_file", "sniff_is_text", "clear_classification_cache", "export_classification", "import_classification", "SNIFF_BYTES",
+    "ScanController", "CancelToken", "ScanCancelled",
+    "IgnoreRules", "IgnoreScope", "RuleSet", "parse_rules", "compile_pattern",
+    "GITIGNORE_FILE_NAME", "PROJECT_IGNORE_FILE_NAME", "IGNORE_FILE_NAMES",
+    "WalkEntry", "walk_tree", "iter_files", "is_pruned_dir_name", "is_ignored_path",
+    "TreeIndex", "NodeRow", "KIND_FILE", "KIND_DIR", "KIND_DELETED", "ROOT_ID",
+    "SelectionTrie", "SelectionRegion", "CHECKED", "UNCHECKED", "MIXED",
+    "ContentSearch", "ContentIndex", "ContentQuery", "CONTENT_INDEX_MAX_FILE_BYTES",
+    "FilterEngine", "NameIndex", "FILTER_DEBOUNCE_SECONDS",
+    "IndexStore", "SavedState", "default_cache_dir", "INDEX_SCHEMA_VERSION",
+    "ContentCache", "DEFAULT_CONTENT_CACHE_BYTES",
+    "FsWatcher", "ChangeBatch",
+    "DEFAULT_READ_WORKERS", "FileBlock", "read_file", "iter_blocks", "read_blocks", "read_file_block",
+    "format_file_block", "format_error_block", "relative_display_path", "format_size", "read_text_stripped",
+    "read_text_truncated", "format_truncated_block", "content_hash", "block_digest", "block_body", "block_line_count",
+    "BlockDeduplicator", "format_duplicate_block", "format_dedup_note",
+    "BudgetPlan", "plan_budget", "file_stamps", "file_sizes", "estimate_tokens", "format_tokens", "format_budget_note",
+    "BYTES_PER_TOKEN", "DEFAULT_FILE_CAP_BYTES", "DEFAULT_BUDGET_TOKENS", "MISSING_STAMP",
+    "DeltaTracker", "FileSnapshot", "format_diff_block", "format_deleted_block", "format_delta_note", "merge_snapshots",
+    "SNAPSHOT_CONTENT_MAX_CHARS",
+    "aiter_blocks", "run_blocking",
+    "OutputBuffer", "OutlineEntry", "page_bounds", "DEFAULT_SPILL_CHARS", "compose_output", "compose_text",
+    "Profiler", "SpanRecord", "profiler", "PERF_ENV_VAR",
+    "normalize_roots", "display_bases", "root_labels", "root_of", "build_indexes", "WORKSPACE_WORKERS",
+    "collect_files", "collect_workspace", "write_aggregate", "AggregateStats", "WorkspaceFiles",
+]
@@ -0,0 +1,80 @@
+# --- Асинхронный конвейер чтения: стадии asyncio, связанные ограниченными очередями ---
+import asyncio
+from concurrent.futures import Executor, ThreadPoolExecutor
+from pathlib import Path
+from typing import AsyncIterator, Callable, Dict, List, Optional, Sequence, TypeVar
+
+from .content_cache import ContentCache
+from .reader import DEFAULT_READ_WORKERS, READ_AHEAD_PER_WORKER, FileBlock, read_file
+from .scan_control import CancelToken
+
+T = TypeVar("T")
+
+
+async def run_blocking(func: Callable[..., T], *args, executor: Optional[Executor] = None) -> T:
+    """Блокирующая стадия (обход, классификация, план) в пуле потоков, не занимая цикл событий."""
+    return await asyncio.get_running_loop().run_in_executor(executor, func, *args)
+
+
+async def aiter_blocks(
+    files: Sequence[Path], base_path: Optional[Path], workers: int = DEFAULT_READ_WORKERS,
+    cache: Optional[ContentCache] = None, token: Optional[CancelToken] = None,
+    bases: Optional[Sequence[Optional[Path]]] = None, limits: Optional[Sequence[Optional[int]]] = None,
+    executor: Optional[Executor] = None, queue_size: Optional[int] = None,
+) -> AsyncIterator[FileBlock]:
+    """Асинхронный аналог iter_blocks: блоки строго в порядке files.
+
+    Стадии: подача позиций -> workers задач чтения (read_file в пуле потоков) -> потребитель.
+    Подача и чтение связаны очередью на queue_size позиций, а окно на столько же блоков
+    не даёт чтению уйти дальше потребителя: пока он не забрал блок, следующий не подаётся,
+    так что память не зависит от размера выбора. С token чтение прерывается ScanCancelled.
+    """
+    if not files: return
+    loop = asyncio.get_running_loop()
+    workers = max(1, min(workers, len(files)))
+    queue_size = queue_size or workers * READ_AHEAD_PER_WORKER
+    own_executor = executor is None
+    if own_executor: executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="reader")
+    jobs: "asyncio.Queue[Optional[int]]" = asyncio.Queue(maxsize=queue_size)
+    window = asyncio.Semaphore(queue_size) # Блоки, прочитанные или читающиеся, но ещё не отданные потребителю
+    results: Dict[int, FileBlock] = {}
+    changed = asyncio.Event()
+    failures: List[BaseException] = []
+
+    async def feed():
+        for position in range(len(files)):
+            await window.acquire()
+            if token is not None: token.check()
+            await jobs.put(position)
+        for _ in range(workers): await jobs.put(None)
+
+    async def read():
+        while True:
+            position = await jobs.get()
+            if position is None: return
+            results[position] = await loop.run_in_executor(
+                executor, read_file, files[position], bases[position] if bases is not None else base_path,
+                cache, limits[position] if limits is not None else None,
+            )
+            changed.set()
+
+    async def guarded(stage: Callable):
+        # Ошибка стадии (в том числе ScanCancelled) передаётся потребителю, а не теряется в задаче
+        try: await stage()
+        except asyncio.CancelledError: raise
+        except BaseException as stage_err: failures.append(stage_err); changed.set()
+
+    tasks = [asyncio.ensure_future(guarded(feed))] + [asyncio.ensure_future(guarded(read)) for _ in range(workers)]
+    try:
+        for position in range(len(files)):
+            while position not in results:
+                if failures: raise failures[0]
+                if token is not None: token.check()
+                changed.clear()
+                await changed.wait()
+            block = results.pop(position)
+            window.release()
+            yield block
+    finally:
+        for task in tasks: task.cancel()
+        if own_executor: executor.shutdown(wait=False, cancel_futures=True)
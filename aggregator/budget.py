@@ -0,0 +1,112 @@
+# --- Бюджет результата: оценка байт и токенов до чтения, лимит на файл и на весь результат ---
+from pathlib import Path
+from typing import List, Mapping, NamedTuple, Optional, Sequence, Tuple
+
+from .perf import profiler
+from .reader import format_size
+from .tree_index import TreeIndex
+from .workspace import root_of
+
+BYTES_PER_TOKEN = 4 # Грубая оценка: около 4 байт исходного текста на токен
+DEFAULT_FILE_CAP_BYTES = 1024 * 1024 # Больше - в результат идут начало и конец файла с пометкой о пропуске
+DEFAULT_BUDGET_TOKENS = 0 # 0 - общий бюджет не ограничен
+MIN_TRUNCATED_BYTES = 2048 # Меньший остаток бюджета на файл не тратится - файл и все следующие не включаются
+MISSING_STAMP = (0, 0) # stat файла не удался (например, файл удалён после обхода)
+
+
+def estimate_tokens(num_bytes: int) -> int:
+    return -(-num_bytes // BYTES_PER_TOKEN)
+
+
+def format_tokens(tokens: int) -> str:
+    if tokens < 1000: return str(tokens)
+    if tokens < 1_000_000: return f"{tokens / 1000:.1f} тыс."
+    return f"{tokens / 1_000_000:.1f} млн"
+
+
+class BudgetPlan(NamedTuple):
+    """План чтения: сколько байт брать из каждого включённого файла.
+
+    Файлы включаются по порядку, пока хватает бюджета, поэтому не включённые - всегда хвост списка.
+    """
+    limits: List[Optional[int]] # Для каждого включённого файла: больше стольких байт - обрезать (None - без лимита)
+    total_bytes: int # Размер всех выбранных файлов на диске
+    planned_bytes: int # Сколько из них попадёт в результат
+    truncated: int # Файлы, от которых берутся только начало и конец
+    skipped: int # Файлы в конце списка, на которые бюджета не хватило
+    skipped_bytes: int
+
+    @property
+    def files(self) -> int:
+        return len(self.limits)
+
+    @property
+    def tokens(self) -> int:
+        return estimate_tokens(self.planned_bytes)
+
+    def describe(self) -> str:
+        """Короткая сводка для строки состояния."""
+        text = f"≈ {format_tokens(self.tokens)} ток. · {self.files} файлов · {format_size(self.planned_bytes)}"
+        if self.truncated: text += f" · обрезано: {self.truncated}"
+        if self.skipped: text += f" · вне бюджета: {self.skipped}"
+        return text
+
+
+def file_stamps(files: Sequence[Path], indexes: Optional[Mapping[Path, TreeIndex]] = None) -> List[Tuple[int, int]]:
+    """(mtime_ns, размер) файлов из индексов (stat уже сделан при обходе); файлы вне индексов - через stat.
+
+    Stat в индексе может отставать от правок на месте, поэтому для сверки содержимого (снимок,
+    режим изменений) indexes не передаются и stat делается заново; для оценки объёма индекса достаточно.
+    """
+    stamps: List[Tuple[int, int]] = []
+    for file_path in files:
+        root = root_of(file_path, indexes) if indexes else None
+        index = indexes.get(root) if root is not None else None
+        node_id = index.id_of(file_path) if index is not None else None
+        if node_id is not None:
+            stamps.append((index.mtimes[node_id], index.sizes[node_id]))
+            continue
+        try:
+            st = file_path.stat()
+            stamps.append((st.st_mtime_ns, st.st_size))
+        except OSError: stamps.append(MISSING_STAMP)
+    return stamps
+
+
+def file_sizes(files: Sequence[Path], indexes: Optional[Mapping[Path, TreeIndex]] = None) -> List[int]:
+    return [size for _, size in file_stamps(files, indexes)]
+
+
+def plan_budget(sizes: Sequence[int], file_cap_bytes: int = DEFAULT_FILE_CAP_BYTES, budget_tokens: int = DEFAULT_BUDGET_TOKENS) -> BudgetPlan:
+    """Распределить бюджет по файлам в порядке вывода, ничего не читая.
+
+    Каждый файл ограничен file_cap_bytes (0 - без лимита), все вместе - budget_tokens (0 - без лимита).
+    Размеры берутся из индекса и могут отставать от диска, поэтому лимит меньше file_cap_bytes
+    получает только файл, который план действительно обрезает остатком бюджета; остальным
+    достаётся сам file_cap_bytes, и подросший с момента обхода файл читается целиком, пока не превысит его.
+    """
+    remaining = budget_tokens * BYTES_PER_TOKEN if budget_tokens > 0 else None
+    cap = file_cap_bytes if file_cap_bytes > 0 else None
+    limits: List[Optional[int]] = []
+    planned = truncated = 0
+    with profiler.span("plan") as span:
+        for size in sizes:
+            allowance = min(size, file_cap_bytes) if file_cap_bytes > 0 else size
+            if remaining is not None:
+                if allowance > remaining:
+                    if remaining < MIN_TRUNCATED_BYTES: break
+                    allowance = remaining
+                remaining -= allowance
+            if allowance < size: truncated += 1
+            limits.append(allowance if allowance < size else cap) # Не обрезается планом - только общий лимит на файл
+            planned += allowance
+        skipped_sizes = sizes[len(limits):]
+        plan = BudgetPlan(limits, sum(sizes), planned, truncated, len(skipped_sizes), sum(skipped_sizes))
+        span.set(files=plan.files, bytes=planned, truncated=truncated, skipped=plan.skipped)
+    return plan
+
+
+def format_budget_note(plan: BudgetPlan) -> str:
+    """Блок в конце результата о файлах, не вошедших в бюджет (пустая строка - все вошли)."""
+    if not plan.skipped: return ""
+    return f"[БЮДЖЕТ ИСЧЕРПАН: не включено файлов - {plan.skipped}, {format_size(plan.skipped_bytes)}]\n\n"
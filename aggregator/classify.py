@@ -0,0 +1,87 @@
+# --- Быстрое определение текстовых файлов по байтовому префиксу ---
+import os
+import stat
+import threading
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from .constants import TEXT_EXTENSIONS
+
+SNIFF_BYTES = 4096
+CLASSIFY_CACHE_LIMIT = 200_000
+_MAX_CONTROL_RATIO = 0.05 # Доля управляющих байтов, после которой не-UTF-8 файл считается бинарным
+
+# Сигнатуры распространённых бинарных форматов (проверяются до остальных эвристик)
+BINARY_MAGIC = (
+    b"\x89PNG", b"\xff\xd8\xff", b"GIF87a", b"GIF89a", b"II*\x00", b"MM\x00*", b"RIFF", b"OggS", b"fLaC",
+    b"%PDF", b"PK\x03\x04", b"PK\x05\x06", b"\x1f\x8b", b"BZh", b"\xfd7zXZ\x00", b"7z\xbc\xaf\x27\x1c", b"Rar!\x1a\x07",
+    b"\x7fELF", b"\xca\xfe\xba\xbe", b"\xcf\xfa\xed\xfe", b"\xce\xfa\xed\xfe", b"\x00asm",
+    b"SQLite format 3\x00", b"wOFF", b"wOF2",
+)
+_TEXT_CONTROL_BYTES = frozenset(b"\t\n\r\f\b\x1b")
+_CONTROL_BYTES = bytes(b for b in range(32) if b not in _TEXT_CONTROL_BYTES) + b"\x7f"
+
+_cache: Dict[Tuple[int, int, int], bool] = {}
+_cache_lock = threading.Lock()
+
+
+def sniff_is_text(prefix: bytes) -> bool:
+    """Классификация по первым байтам: сигнатуры, NUL, валидность UTF-8, доля управляющих символов."""
+    if not prefix: return True
+    if prefix.startswith(BINARY_MAGIC): return False
+    if b"\x00" in prefix: return False
+    try:
+        prefix.decode("utf-8")
+        return True
+    except UnicodeDecodeError as decode_err:
+        # Префикс мог оборвать многобайтовый символ в конце - это не признак бинарника
+        if decode_err.reason == "unexpected end of data" and decode_err.start >= len(prefix) - 3: return True
+    # Не UTF-8 (например, cp1251): текст, если управляющих байтов почти нет
+    control_count = len(prefix) - len(prefix.translate(None, _CONTROL_BYTES))
+    return control_count / len(prefix) <= _MAX_CONTROL_RATIO
+
+
+def is_likely_text_file(file_path: Path, st: Optional[os.stat_result] = None) -> bool:
+    """Похож ли файл на текстовый.
+
+    Путь уже прошёл политику обхода (игнорируемые и скрытые папки) у вызывающего кода,
+    поэтому здесь только stat, известные расширения и чтение небольшого байтового префикса.
+    Результат кэшируется по (устройство, inode, mtime_ns).
+    """
+    try:
+        st = st or file_path.stat()
+    except OSError:
+        return False
+    if not stat.S_ISREG(st.st_mode): return False
+    name_lower = file_path.name.lower()
+    if name_lower in TEXT_EXTENSIONS or file_path.suffix.lower() in TEXT_EXTENSIONS: return True
+    if st.st_size == 0: return True
+    key = (st.st_dev, st.st_ino, st.st_mtime_ns)
+    cached = _cache.get(key)
+    if cached is not None: return cached
+    try:
+        with open(file_path, "rb") as f: prefix = f.read(SNIFF_BYTES)
+        result = sniff_is_text(prefix)
+    except OSError:
+        return False
+    with _cache_lock:
+        if len(_cache) >= CLASSIFY_CACHE_LIMIT: _cache.clear()
+        _cache[key] = result
+    return result
+
+
+def clear_classification_cache():
+    with _cache_lock: _cache.clear()
+
+
+def export_classification() -> List[Tuple[int, int, int, bool]]:
+    """Содержимое кэша классификации: (устройство, inode, mtime_ns, текст ли) - для сохранения на диск."""
+    with _cache_lock: return [(*key, value) for key, value in _cache.items()]
+
+
+def import_classification(entries: Iterable[Tuple[int, int, int, bool]]):
+    """Загрузить ранее сохранённые решения; устаревшие по mtime записи просто не совпадут с ключом."""
+    with _cache_lock:
+        for dev, ino, mtime_ns, is_text in entries:
+            if len(_cache) >= CLASSIFY_CACHE_LIMIT: break
+            _cache[(dev, ino, mtime_ns)] = bool(is_text)
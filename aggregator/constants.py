@@ -0,0 +1,17 @@
+# --- Общие константы агрегатора (без зависимостей от UI) ---
+
+TEXT_EXTENSIONS = {
+    ".py", ".txt", ".md", ".json", ".yaml", ".yml", ".html", ".htm",
+    ".css", ".js", ".csv", ".log", ".ini", ".cfg", ".xml", ".sh", ".bat",
+    ".gitignore", ".dockerfile", "readme", ".env"
+}
+IGNORE_DIRS = {
+    ".git", ".venv", "venv", ".vscode", ".idea", "node_modules", "__pycache__",
+    "build", "dist", "target", ".pytest_cache", ".mypy_cache"
+}
+
+# Режимы вывода относительно снимка последнего копирования (см. snapshot.DeltaTracker)
+DELTA_OFF = "full" # Полный результат
+DELTA_FILES = "changed" # Только новые, изменённые и удалённые файлы
+DELTA_DIFF = "diff" # То же, изменённые - unified diff к прошлому содержимому
+DELTA_MODES = (DELTA_OFF, DELTA_FILES, DELTA_DIFF)
@@ -0,0 +1,72 @@
+# --- LRU-кэш готовых блоков вывода между повторными сканированиями ---
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Optional, Set, Tuple
+
+DEFAULT_CONTENT_CACHE_BYTES = 256 * 1024 * 1024
+
+CacheKey = Tuple[Path, int, int] # (путь, mtime_ns, размер)
+
+
+class ContentCache:
+    """Уже прочитанные, декодированные и оформленные блоки файлов.
+
+    Ключ - (путь, mtime_ns, размер): изменённый файл получает новый ключ и просто
+    перечитывается, а старая запись со временем вытесняется по LRU. Бюджет памяти
+    считается по длине хранимых строк. Потокобезопасен - в него пишут потоки чтения.
+    """
+
+    def __init__(self, max_bytes: int = DEFAULT_CONTENT_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[CacheKey, Tuple[str, str]]" = OrderedDict()
+        self._keys_by_path: Dict[Path, Set[CacheKey]] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: CacheKey, relative_path: str) -> Optional[str]:
+        """Блок для ключа, если он оформлен с тем же относительным путём."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != relative_path:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key: CacheKey, relative_path: str, block: str):
+        entry_size = len(block)
+        if entry_size > self.max_bytes: return # Не вытесняем весь кэш ради одного огромного файла
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None: self.current_bytes -= len(previous[1])
+            self._entries[key] = (relative_path, block)
+            self._keys_by_path.setdefault(key[0], set()).add(key)
+            self.current_bytes += entry_size
+            while self.current_bytes > self.max_bytes and self._entries:
+                self._drop(next(iter(self._entries)))
+
+    def invalidate(self, path: Path):
+        """Удалить все версии одного файла."""
+        with self._lock:
+            for key in list(self._keys_by_path.get(path, ())): self._drop(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear(); self._keys_by_path.clear()
+            self.current_bytes = 0
+
+    def _drop(self, key: CacheKey):
+        # Вызывается под self._lock
+        entry = self._entries.pop(key, None)
+        if entry is not None: self.current_bytes -= len(entry[1])
+        keys = self._keys_by_path.get(key[0])
+        if keys is not None:
+            keys.discard(key)
+            if not keys: del self._keys_by_path[key[0]]
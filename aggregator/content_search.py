@@ -0,0 +1,175 @@
+# --- Поиск по содержимому файлов: параллельный grep и кэш слов с проверкой по mtime ---
+import os
+import re
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Pattern, Set, Tuple
+
+from .classify import is_likely_text_file
+from .perf import profiler
+from .reader import DEFAULT_READ_WORKERS
+from .tree_index import TreeIndex, ROOT_ID
+
+SEARCH_CHUNK_BYTES = 1024 * 1024 # Файлы, которых нет в кэше слов, просматриваются кусками по строкам
+CONTENT_INDEX_MAX_FILE_BYTES = 1024 * 1024 # Файлы больше в кэш слов не попадают и всегда просматриваются
+_WORD_RE = re.compile(r"\w+")
+
+Stamp = Tuple[int, int] # (mtime_ns, размер) по os.stat на момент поиска
+
+
+class ContentQuery:
+    """Запрос поиска: /выражение/ - регулярное выражение, иначе подстрока; регистр не учитывается."""
+    __slots__ = ("text", "pattern", "words")
+
+    def __init__(self, text: str):
+        self.text = text
+        pattern: Optional[Pattern] = None
+        if len(text) > 2 and text.startswith("/") and text.endswith("/"):
+            try: pattern = re.compile(text[1:-1], re.IGNORECASE)
+            except re.error as regex_err: logging.info(f"Invalid regex '{text}', searching as text: {regex_err}")
+        self.pattern = pattern or re.compile(re.escape(text), re.IGNORECASE)
+        # Части подстроки из букв и цифр: каждая обязана входить в какое-то слово файла
+        self.words = [word.lower() for word in _WORD_RE.findall(text)] if pattern is None else []
+
+    def matches(self, text: str) -> bool:
+        return self.pattern.search(text) is not None
+
+
+class ContentIndex:
+    """Кэш слов содержимого: слово -> файлы, где оно встречается, и (mtime_ns, размер) каждого файла.
+
+    Используется только как предварительный отбор: файл, записанный с текущими mtime и размером,
+    без подходящих слов не читается. Изменённый файл просто индексируется заново; его старые
+    слова остаются в списках и дают лишь лишнюю проверку, поэтому удалять их не нужно.
+    """
+
+    def __init__(self, max_file_bytes: int = CONTENT_INDEX_MAX_FILE_BYTES):
+        self.max_file_bytes = max_file_bytes
+        self._lock = threading.Lock()
+        self._clear()
+
+    def _clear(self):
+        self._file_ids: Dict[Path, int] = {}
+        self._paths: List[Path] = []
+        self._stamps: List[Optional[Stamp]] = []
+        self._postings: Dict[str, Set[int]] = {}
+
+    def __len__(self) -> int:
+        return len(self._file_ids)
+
+    def clear(self):
+        with self._lock: self._clear()
+
+    def is_fresh(self, path: Path, stamp: Stamp) -> bool:
+        file_id = self._file_ids.get(path)
+        return file_id is not None and self._stamps[file_id] == stamp
+
+    def add(self, path: Path, stamp: Stamp, text: str):
+        """Записать слова файла (пустой текст - файл не текстовый, его можно не читать)."""
+        words = set(_WORD_RE.findall(text.lower())) if text else ()
+        with self._lock:
+            file_id = self._file_ids.get(path)
+            if file_id is None:
+                file_id = self._file_ids[path] = len(self._paths)
+                self._paths.append(path); self._stamps.append(None)
+            for word in words: self._postings.setdefault(word, set()).add(file_id)
+            self._stamps[file_id] = stamp
+
+    def candidates(self, query: ContentQuery) -> Optional[Set[Path]]:
+        """Файлы кэша, которые могут содержать запрос (None - запрос не сужается по словам)."""
+        if not query.words: return None
+        with self._lock:
+            vocabulary = list(self._postings.items())
+            result: Optional[Set[int]] = None
+            for part in sorted(set(query.words), key=len, reverse=True): # Длинные части отсекают больше
+                files: Set[int] = set()
+                for word, file_ids in vocabulary:
+                    if part in word: files |= file_ids
+                result = files if result is None else result & files
+                if not result: break
+            return {self._paths[file_id] for file_id in result or ()}
+
+
+class ContentSearch:
+    """Параллельный поиск по содержимому текстовых файлов индекса дерева.
+
+    Файлы, уже записанные в ContentIndex с теми же mtime и размером, отбираются по словам
+    без чтения; остальные читаются в пуле потоков (заодно пополняя кэш). Свежесть сверяется
+    по os.stat файла, а не по stat в индексе дерева: тот не знает о правках на месте без
+    наблюдателя, а stat всё равно на порядки дешевле чтения. Большие файлы
+    просматриваются кусками, выровненными по строкам, и целиком в память не загружаются.
+    """
+
+    def __init__(self, workers: int = DEFAULT_READ_WORKERS, index: Optional[ContentIndex] = None):
+        self.workers = workers
+        self.index = index
+
+    def search(self, tree_index: TreeIndex, query_text: str, check: Optional[Callable[[], None]] = None) -> List[int]:
+        """id файлов tree_index, содержимое которых совпадает с запросом (в порядке обхода)."""
+        query = ContentQuery(query_text)
+        file_ids = list(tree_index.iter_files(ROOT_ID))
+        with profiler.span("content_search", files=len(file_ids)) as span:
+            candidates = self.index.candidates(query) if self.index is not None else None
+            to_scan: List[Tuple[int, Optional[Stamp]]] = []
+            for file_id in file_ids:
+                path = tree_index.path_of(file_id)
+                stamp = self._stamp(path) if self.index is not None else None
+                if candidates is not None and path not in candidates and stamp is not None and self.index.is_fresh(path, stamp): continue
+                to_scan.append((file_id, stamp))
+            span.set(scanned=len(to_scan))
+            matched = self._scan_all(tree_index, to_scan, query, check)
+            span.set(matches=len(matched))
+        return [file_id for file_id, _ in to_scan if file_id in matched]
+
+    @staticmethod
+    def _stamp(path: Path) -> Optional[Stamp]:
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        return (st.st_mtime_ns, st.st_size)
+
+    def _scan_all(self, tree_index: TreeIndex, to_scan: List[Tuple[int, Optional[Stamp]]], query: ContentQuery, check: Optional[Callable[[], None]]) -> Set[int]:
+        matched: Set[int] = set()
+        if not to_scan: return matched
+        pool = ThreadPoolExecutor(max_workers=max(1, min(self.workers, len(to_scan))), thread_name_prefix="grep")
+        try:
+            futures = {pool.submit(self._scan_file, tree_index.path_of(file_id), stamp, query): file_id for file_id, stamp in to_scan}
+            pending = set(futures)
+            while pending:
+                done, pending = wait(pending, timeout=0.05, return_when=FIRST_COMPLETED)
+                if check is not None: check() # Устаревший запрос: оставшиеся задачи отменяются в finally
+                for future in done:
+                    if future.result(): matched.add(futures[future])
+        finally:
+            pool.shutdown(wait=False, cancel_futures=True)
+        return matched
+
+    def _scan_file(self, path: Path, stamp: Optional[Stamp], query: ContentQuery) -> bool:
+        try:
+            if not is_likely_text_file(path):
+                if self.index is not None and stamp is not None: self.index.add(path, stamp, "")
+                return False
+            if self.index is not None and stamp is not None and stamp[1] <= self.index.max_file_bytes:
+                with open(path, "rb") as f: text = str(f.read(self.index.max_file_bytes + 1), "utf-8", "ignore")
+                self.index.add(path, stamp, text)
+                return query.matches(text)
+            return self._scan_chunks(path, query)
+        except OSError as search_err:
+            logging.debug(f"Could not search {path}: {search_err}")
+            return False
+
+    @staticmethod
+    def _scan_chunks(path: Path, query: ContentQuery) -> bool:
+        carry = b""
+        with open(path, "rb") as f:
+            while True:
+                chunk = f.read(SEARCH_CHUNK_BYTES)
+                if not chunk: return bool(carry) and query.matches(str(carry, "utf-8", "ignore"))
+                data = carry + chunk
+                cut = data.rfind(b"\n")
+                if cut < 0: carry = data; continue # Очень длинная строка - копится до перевода строки
+                if query.matches(str(data[:cut], "utf-8", "ignore")): return True
+                carry = data[cut + 1:]
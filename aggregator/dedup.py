@@ -0,0 +1,43 @@
+# --- Дубликаты в результате: файл с уже выведенным содержимым заменяется ссылкой на первый ---
+from pathlib import Path
+from typing import Dict, Union
+
+from .reader import FileBlock, format_size
+
+
+def format_duplicate_block(relative_path: Union[Path, str], original: str) -> str:
+    return f"{relative_path}\n```\n[СОВПАДАЕТ С {original}]\n```\n\n"
+
+
+class BlockDeduplicator:
+    """Вывод каждого различного содержимого один раз, в порядке результата.
+
+    Блоки сравниваются по FileBlock.digest (хэш считается в потоке чтения); повтор заменяется
+    коротким блоком-ссылкой на первый файл с тем же текстом, если ссылка короче самого блока.
+    Обрезанные файлы и ошибки чтения (digest None) выводятся как есть.
+    """
+
+    def __init__(self):
+        self._first: Dict[str, str] = {} # Хэш содержимого -> путь первого выведенного файла
+        self.duplicates = 0
+        self.saved_bytes = 0 # Размер на диске файлов, заменённых ссылками
+
+    def process(self, block: FileBlock, relative_path: Union[Path, str]) -> str:
+        """Текст для вывода: сам блок или ссылка на ранее выведенный файл с тем же содержимым."""
+        if block.digest is None: return block.text
+        original = self._first.setdefault(block.digest, str(relative_path))
+        if original == str(relative_path): return block.text
+        reference = format_duplicate_block(relative_path, original)
+        if len(reference) >= len(block.text): return block.text # Пустые и крошечные файлы ссылкой не короче
+        self.duplicates += 1
+        self.saved_bytes += block.size
+        return reference
+
+    def summary(self) -> str:
+        return f"дубликатов: {self.duplicates} ({format_size(self.saved_bytes)})" if self.duplicates else ""
+
+
+def format_dedup_note(dedup: BlockDeduplicator) -> str:
+    """Сводка в конце результата (пустая строка - дубликатов не было)."""
+    if not dedup.duplicates: return ""
+    return f"[ДУБЛИКАТЫ: заменено ссылками на файл с тем же содержимым - {dedup.duplicates}, {format_size(dedup.saved_bytes)}]\n\n"
@@ -0,0 +1,256 @@
+# --- Правила игнорирования в синтаксисе .gitignore: вложенные .gitignore и файл проекта ---
+import os
+import re
+import logging
+from pathlib import Path
+from typing import Dict, Iterable, List, NamedTuple, Optional, Pattern, Sequence, Tuple
+
+GITIGNORE_FILE_NAME = ".gitignore"
+PROJECT_IGNORE_FILE_NAME = ".aggregatorignore" # Правила только для агрегатора, в корне проекта; сильнее .gitignore
+GIT_EXCLUDE_PATH = Path(".git") / "info" / "exclude"
+IGNORE_FILE_NAMES = frozenset({GITIGNORE_FILE_NAME, PROJECT_IGNORE_FILE_NAME})
+
+_GLOB_CHARS = frozenset("*?[\\")
+
+
+class IgnorePattern(NamedTuple):
+    regex: Pattern[str]
+    negate: bool # "!pattern" - вернуть ранее исключённое
+    dir_only: bool # "pattern/" - только папки
+    anchored: bool # В шаблоне есть "/" - сравнивается путь от папки файла правил, иначе только имя
+    literal: Optional[str] # Точное имя без подстановок - проверяется через set, без regex
+
+
+def _glob_to_regex(glob: str) -> str:
+    """Перевод шаблона gitignore в регулярное выражение: "*" и "?" не пересекают "/", "**" - любые уровни."""
+    out: List[str] = []
+    i, n = 0, len(glob)
+    while i < n:
+        c = glob[i]
+        if c == "*":
+            if glob.startswith("**", i):
+                i += 2
+                if i < n and glob[i] == "/": out.append("(?:.*/)?"); i += 1 # "**/" - ноль или больше папок
+                else: out.append(".*")
+                continue
+            out.append("[^/]*")
+        elif c == "?":
+            out.append("[^/]")
+        elif c == "[":
+            end = glob.find("]", i + 2 if glob.startswith("[!", i) or glob.startswith("[^", i) else i + 1)
+            if end == -1:
+                out.append(re.escape(c))
+            else:
+                body = glob[i + 1:end]
+                if body[:1] in ("!", "^"): body = "^" + body[1:]
+                out.append("[" + body.replace("\\", "\\\\") + "]")
+                i = end
+        elif c == "\\" and i + 1 < n:
+            i += 1
+            out.append(re.escape(glob[i]))
+        else:
+            out.append(re.escape(c))
+        i += 1
+    return "".join(out)
+
+
+def compile_pattern(line: str) -> Optional[IgnorePattern]:
+    """Одна строка файла правил -> шаблон (None для пустых строк и комментариев)."""
+    line = line.rstrip("\r\n")
+    if line.endswith("\\ "): line = line[:-2].rstrip(" ") + "\\ "
+    else: line = line.rstrip(" ")
+    if not line or line.startswith("#"): return None
+    negate = line.startswith("!")
+    if negate: line = line[1:]
+    elif line.startswith(("\\!", "\\#")): line = line[1:]
+    dir_only = line.endswith("/")
+    line = line.rstrip("/")
+    if not line: return None
+    anchored = "/" in line
+    line = line.lstrip("/")
+    literal = line if not anchored and not _GLOB_CHARS & set(line) else None
+    return IgnorePattern(re.compile(f"^{_glob_to_regex(line)}$"), negate, dir_only, anchored, literal)
+
+
+class RuleSet:
+    """Правила одного файла, заданные относительно его папки base.
+
+    Как в git, побеждает последнее совпавшее правило. Если отрицаний нет (обычный случай),
+    правила заранее склеиваются: точные имена - в множества, шаблоны - в одно регулярное
+    выражение на вид сравнения, так что проверка элемента стоит пару обращений к set/regex.
+    """
+    __slots__ = ("base", "_prefix", "patterns", "_ordered", "_names", "_dir_names", "_name_re", "_dir_name_re", "_path_re", "_dir_path_re")
+
+    def __init__(self, base: str, patterns: Sequence[IgnorePattern]):
+        self.base = base
+        self._prefix = base.rstrip(os.sep) + os.sep
+        self.patterns = list(patterns)
+        self._ordered = any(p.negate for p in self.patterns)
+        self._names: set = set(); self._dir_names: set = set()
+        groups: Dict[Tuple[bool, bool], List[str]] = {}
+        if not self._ordered:
+            for p in self.patterns:
+                if p.literal is not None: (self._dir_names if p.dir_only else self._names).add(p.literal)
+                else: groups.setdefault((p.anchored, p.dir_only), []).append(p.regex.pattern[1:-1])
+        def combined(key):
+            return re.compile("^(?:" + "|".join(groups[key]) + ")$") if key in groups else None
+        self._name_re, self._dir_name_re = combined((False, False)), combined((False, True))
+        self._path_re, self._dir_path_re = combined((True, False)), combined((True, True))
+
+    def relative(self, path: str) -> Optional[str]:
+        if not path.startswith(self._prefix): return None
+        relative = path[len(self._prefix):]
+        return relative if os.sep == "/" else relative.replace(os.sep, "/")
+
+    def match(self, path: str, name: str, is_dir: bool) -> Optional[bool]:
+        """True - исключить, False - явно вернуть ("!"), None - правила файла об этом пути молчат."""
+        if self._ordered:
+            relative = self.relative(path)
+            for p in reversed(self.patterns):
+                if p.dir_only and not is_dir: continue
+                if p.anchored:
+                    if relative is not None and p.regex.match(relative): return not p.negate
+                elif p.regex.match(name):
+                    return not p.negate
+            return None
+        if name in self._names or is_dir and name in self._dir_names: return True
+        if self._name_re is not None and self._name_re.match(name): return True
+        if is_dir and self._dir_name_re is not None and self._dir_name_re.match(name): return True
+        if self._path_re is not None or is_dir and self._dir_path_re is not None:
+            relative = self.relative(path)
+            if relative is None: return None
+            if self._path_re is not None and self._path_re.match(relative): return True
+            if is_dir and self._dir_path_re is not None and self._dir_path_re.match(relative): return True
+        return None
+
+
+def parse_rules(base: str, lines: Iterable[str]) -> RuleSet:
+    return RuleSet(base, [p for p in map(compile_pattern, lines) if p is not None])
+
+
+class IgnoreScope:
+    """Правила, действующие внутри одной папки: цепочка .gitignore от корня до неё и файлы проекта.
+
+    Порядок приоритета: файл проекта, затем .gitignore от самого глубокого к корневому,
+    затем .git/info/exclude. Первое непустое решение побеждает.
+    """
+    __slots__ = ("project", "chain", "fallback")
+
+    def __init__(self, project: Optional[RuleSet], chain: Tuple[RuleSet, ...], fallback: Optional[RuleSet]):
+        self.project = project
+        self.chain = chain # От корня к текущей папке
+        self.fallback = fallback
+
+    def extended(self, rule_set: RuleSet) -> "IgnoreScope":
+        return IgnoreScope(self.project, self.chain + (rule_set,), self.fallback)
+
+    def is_ignored(self, path: str, name: str, is_dir: bool) -> bool:
+        if self.project is not None:
+            decision = self.project.match(path, name, is_dir)
+            if decision is not None: return decision
+        for rule_set in reversed(self.chain):
+            decision = rule_set.match(path, name, is_dir)
+            if decision is not None: return decision
+        if self.fallback is not None:
+            decision = self.fallback.match(path, name, is_dir)
+            if decision is not None: return decision
+        return False
+
+
+class IgnoreRules:
+    """Скомпилированные правила игнорирования проекта root.
+
+    Вложенные .gitignore подхватываются при обходе: walk_tree вызывает enter() для каждой
+    папки, и файл правил читается, только если он есть среди уже полученных записей scandir -
+    в папках без .gitignore лишних обращений к диску нет. Разобранные файлы кэшируются по
+    (mtime_ns, размер), поэтому повторные обходы и обновления папок их не перечитывают.
+    Встроенный слой IGNORE_DIRS (скрытые и служебные папки) проверяется отдельно, до этих правил.
+    """
+
+    def __init__(self, root: Path, use_gitignore: bool = True, project_file: Optional[str] = PROJECT_IGNORE_FILE_NAME):
+        self.root = root
+        self.use_gitignore = use_gitignore
+        self.project_file = project_file
+        self._cache: Dict[str, Tuple[int, int, Optional[RuleSet]]] = {}
+        self._adopted: Dict[str, Tuple[int, int]] = {} # Проверенная сигнатура из кэша индекса (файлы могли ещё не читаться)
+        root_str = str(root)
+        project = self._load(os.path.join(root_str, project_file), root_str) if project_file else None
+        fallback = self._load(str(root / GIT_EXCLUDE_PATH), root_str) if use_gitignore else None
+        self.base_scope = IgnoreScope(project, (), fallback)
+
+    def _load(self, file_path: str, base: str, st: Optional[os.stat_result] = None) -> Optional[RuleSet]:
+        try:
+            if st is None: st = os.stat(file_path)
+        except OSError:
+            return None
+        cached = self._cache.get(file_path)
+        if cached is not None and cached[0] == st.st_mtime_ns and cached[1] == st.st_size: return cached[2]
+        try:
+            with open(file_path, encoding="utf-8", errors="replace") as f:
+                rule_set = parse_rules(base, f)
+        except OSError as read_err:
+            logging.warning(f"Could not read ignore file {file_path}: {read_err}")
+            rule_set = None
+        if rule_set is not None and not rule_set.patterns: rule_set = None
+        self._cache[file_path] = (st.st_mtime_ns, st.st_size, rule_set)
+        if rule_set is not None: logging.debug(f"Loaded {len(rule_set.patterns)} ignore rules from {file_path}")
+        return rule_set
+
+    def signature(self) -> Dict[str, Tuple[int, int]]:
+        """(mtime_ns, размер) всех прочитанных файлов правил - чтобы потом понять, не изменились ли правила."""
+        signature = dict(self._adopted)
+        signature.update((file_path, (mtime_ns, size)) for file_path, (mtime_ns, size, _) in self._cache.items())
+        return signature
+
+    def adopt_signature(self, signature: Dict[str, Tuple[int, int]]):
+        """Принять сигнатуру, уже сверенную changed_since: индекс из кэша не перечитывает
+        .gitignore неизменившихся папок, но при следующем сохранении они должны остаться в ней."""
+        self._adopted = dict(signature)
+
+    def changed_since(self, signature: Dict[str, Tuple[int, int]]) -> bool:
+        """Изменились ли правила относительно signature: правка или удаление известных файлов, появление корневых."""
+        for file_path, (mtime_ns, size) in signature.items():
+            try:
+                st = os.stat(file_path)
+            except OSError:
+                return True
+            if (st.st_mtime_ns, st.st_size) != (mtime_ns, size): return True
+        root_str = str(self.root)
+        root_files = [os.path.join(root_str, GITIGNORE_FILE_NAME), str(self.root / GIT_EXCLUDE_PATH)] if self.use_gitignore else []
+        if self.project_file: root_files.append(os.path.join(root_str, self.project_file))
+        return any(file_path not in signature and os.path.isfile(file_path) for file_path in root_files)
+
+    def enter(self, dir_path: str, entries: Sequence[os.DirEntry], parent: IgnoreScope) -> IgnoreScope:
+        """Область правил для папки, содержимое которой уже прочитано scandir."""
+        if not self.use_gitignore: return parent
+        for entry in entries:
+            if entry.name == GITIGNORE_FILE_NAME:
+                try:
+                    if not entry.is_file(): return parent
+                    rule_set = self._load(entry.path, dir_path, entry.stat())
+                except OSError:
+                    return parent
+                return parent.extended(rule_set) if rule_set is not None else parent
+        return parent
+
+    def scope_for(self, dir_path: Path, include_self: bool = True) -> IgnoreScope:
+        """Область правил произвольной папки проекта (для обновления отдельных папок и обхода поддеревьев)."""
+        scope = self.base_scope
+        try:
+            relative_parts = dir_path.relative_to(self.root).parts
+        except ValueError:
+            return scope
+        if not self.use_gitignore: return scope
+        ancestors = [self.root]
+        for part in relative_parts: ancestors.append(ancestors[-1] / part)
+        if not include_self: ancestors.pop()
+        for ancestor in ancestors:
+            ancestor_str = str(ancestor)
+            rule_set = self._load(os.path.join(ancestor_str, GITIGNORE_FILE_NAME), ancestor_str)
+            if rule_set is not None: scope = scope.extended(rule_set)
+        return scope
+
+    def is_ignored(self, path: Path, is_dir: bool) -> bool:
+        """Исключён ли сам путь правилами своей папки (предки не проверяются)."""
+        if path == self.root: return False
+        return self.scope_for(path.parent).is_ignored(str(path), path.name, is_dir)
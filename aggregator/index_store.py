@@ -0,0 +1,206 @@
+# --- Постоянный кэш индекса на диске (SQLite в пользовательской папке кэша) ---
+import os
+import sys
+import json
+import time
+import sqlite3
+import zlib
+import hashlib
+import logging
+import threading
+from pathlib import Path
+from typing import Dict, Iterable, List, Mapping, NamedTuple, Optional, Set
+
+from .ignore_rules import IgnoreRules
+from .snapshot import FileSnapshot
+from .tree_index import TreeIndex
+
+APP_CACHE_DIR_NAME = "file-content-aggregator"
+INDEX_SCHEMA_VERSION = 2 # 2: классификация текст/бинарный хранится в узлах, а не общей таблицей
+_INSERT_BATCH = 10000
+
+
+def default_cache_dir() -> Path:
+    """Папка кэша пользователя: %LOCALAPPDATA%, ~/Library/Caches или $XDG_CACHE_HOME (~/.cache)."""
+    if sys.platform.startswith("win"):
+        base = Path(os.environ.get("LOCALAPPDATA") or Path.home() / "AppData" / "Local")
+    elif sys.platform == "darwin":
+        base = Path.home() / "Library" / "Caches"
+    else:
+        base = Path(os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache")
+    return base / APP_CACHE_DIR_NAME
+
+
+class SavedState(NamedTuple):
+    """Состояние интерфейса для корня: выбранные, исключённые из выбора и развёрнутые пути."""
+    selected: Set[Path]
+    expanded: Set[Path]
+    excluded: Set[Path]
+
+
+class IndexStore:
+    """Кэш индексов по корням: отдельный файл SQLite на каждую директорию проекта.
+
+    Хранит узлы дерева со stat-метаданными и решениями классификатора текст/бинарный,
+    сигнатуру файлов правил игнорирования, (по желанию) выбор и развёрнутые папки
+    и снимок последнего скопированного результата для режима изменений.
+    Загруженный индекс сразу пригоден для отрисовки и затем сверяется с диском через
+    TreeIndex.revalidate. Любая ошибка кэша только логируется - тогда индекс строится заново.
+    """
+
+    def __init__(self, cache_dir: Optional[Path] = None):
+        self.cache_dir = (cache_dir or default_cache_dir()) / "index"
+        self._lock = threading.Lock() # Сохранение идёт из фоновых потоков
+
+    def db_path(self, root: Path) -> Path:
+        digest = hashlib.sha1(str(root.resolve()).encode("utf-8", "surrogatepass")).hexdigest()[:20]
+        return self.cache_dir / f"{digest}.sqlite3"
+
+    def _connect(self, root: Path, create: bool) -> Optional[sqlite3.Connection]:
+        path = self.db_path(root)
+        if not create and not path.exists(): return None
+        if create: path.parent.mkdir(parents=True, exist_ok=True)
+        connection = sqlite3.connect(path, timeout=5)
+        connection.executescript("""
+            PRAGMA journal_mode=WAL;
+            PRAGMA synchronous=NORMAL;
+            CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+            CREATE TABLE IF NOT EXISTS nodes (id INTEGER PRIMARY KEY, parent INTEGER, name TEXT, kind INTEGER, size INTEGER, mtime_ns INTEGER, is_text INTEGER);
+            DROP TABLE IF EXISTS classify;
+            CREATE TABLE IF NOT EXISTS state (kind TEXT, path TEXT, PRIMARY KEY (kind, path));
+            CREATE TABLE IF NOT EXISTS snapshot (path TEXT PRIMARY KEY, mtime_ns INTEGER, size INTEGER, digest TEXT, content BLOB);
+        """)
+        if "is_text" not in {column[1] for column in connection.execute("PRAGMA table_info(nodes)")}: # Кэш схемы 1
+            connection.executescript("DROP TABLE nodes; CREATE TABLE nodes (id INTEGER PRIMARY KEY, parent INTEGER, name TEXT, kind INTEGER, size INTEGER, mtime_ns INTEGER, is_text INTEGER);")
+        return connection
+
+    # --- Индекс ---
+    def load(self, root: Path, rules: Optional[IgnoreRules] = None) -> Optional[TreeIndex]:
+        """Сохранённый индекс root или None (нет кэша, другая версия схемы, изменились правила игнорирования)."""
+        started = time.perf_counter()
+        try:
+            with self._lock:
+                connection = self._connect(root, create=False)
+                if connection is None: return None
+                try:
+                    meta = dict(connection.execute("SELECT key, value FROM meta"))
+                    if meta.get("schema") != str(INDEX_SCHEMA_VERSION) or meta.get("root") != str(root): return None
+                    rules_signature = json.loads(meta.get("ignore_signature", "null"))
+                    if rules is not None:
+                        signature = {file_path: tuple(state) for file_path, state in (rules_signature or {}).items()}
+                        if rules_signature is None or rules.changed_since(signature):
+                            logging.info(f"Ignore rules changed since {root} was cached, full rebuild needed.")
+                            return None
+                        rules.adopt_signature(signature)
+                    index = TreeIndex.from_rows(root, connection.execute("SELECT id, parent, name, kind, size, mtime_ns, is_text FROM nodes ORDER BY id"), rules)
+                finally:
+                    connection.close()
+        except (sqlite3.Error, OSError, ValueError, KeyError, IndexError) as load_err:
+            logging.warning(f"Could not load cached index for {root}: {load_err}")
+            return None
+        logging.info(f"Loaded cached index for {root}: {len(index)} nodes in {time.perf_counter() - started:.3f}s")
+        return index
+
+    def save(self, index: TreeIndex):
+        started = time.perf_counter()
+        rows = list(index.export_rows()) # С классификацией файлов только этого корня
+        signature = index.rules.signature() if index.rules is not None else None
+        try:
+            with self._lock:
+                connection = self._connect(index.root, create=True)
+                try:
+                    with connection:
+                        connection.execute("DELETE FROM nodes")
+                        for offset in range(0, len(rows), _INSERT_BATCH):
+                            connection.executemany("INSERT INTO nodes VALUES (?, ?, ?, ?, ?, ?, ?)", rows[offset:offset + _INSERT_BATCH])
+                        connection.executemany("INSERT OR REPLACE INTO meta VALUES (?, ?)", [
+                            ("schema", str(INDEX_SCHEMA_VERSION)), ("root", str(index.root)),
+                            ("saved_at", str(time.time())), ("ignore_signature", json.dumps(signature)),
+                        ])
+                finally:
+                    connection.close()
+        except (sqlite3.Error, OSError) as save_err:
+            logging.warning(f"Could not save index cache for {index.root}: {save_err}")
+            return
+        logging.info(f"Saved index cache for {index.root}: {len(rows)} nodes in {time.perf_counter() - started:.3f}s")
+
+    # --- Состояние интерфейса ---
+    def load_state(self, root: Path) -> SavedState:
+        state = SavedState(set(), set(), set())
+        try:
+            with self._lock:
+                connection = self._connect(root, create=False)
+                if connection is None: return state
+                try:
+                    for kind, relative in connection.execute("SELECT kind, path FROM state"):
+                        target = {"selected": state.selected, "excluded": state.excluded}.get(kind, state.expanded)
+                        target.add(root / relative)
+                finally:
+                    connection.close()
+        except (sqlite3.Error, OSError) as load_err:
+            logging.warning(f"Could not load saved selection for {root}: {load_err}")
+        return state
+
+    def save_state(self, root: Path, selected: Iterable[Path], expanded: Iterable[Path], excluded: Iterable[Path] = ()):
+        def relative_rows(kind: str, paths: Iterable[Path]) -> List[tuple]:
+            rows = []
+            for path in paths:
+                try: rows.append((kind, str(path.relative_to(root))))
+                except ValueError: pass
+            return rows
+        rows = relative_rows("selected", selected) + relative_rows("expanded", expanded) + relative_rows("excluded", excluded)
+        try:
+            with self._lock:
+                connection = self._connect(root, create=True)
+                try:
+                    with connection:
+                        connection.execute("DELETE FROM state")
+                        connection.executemany("INSERT OR REPLACE INTO state VALUES (?, ?)", rows)
+                finally:
+                    connection.close()
+        except (sqlite3.Error, OSError) as save_err:
+            logging.warning(f"Could not save selection for {root}: {save_err}")
+
+    # --- Снимок последнего копирования ---
+    def load_snapshot(self, root: Path) -> Dict[Path, FileSnapshot]:
+        snapshot: Dict[Path, FileSnapshot] = {}
+        try:
+            with self._lock:
+                connection = self._connect(root, create=False)
+                if connection is None: return snapshot
+                try:
+                    for relative, mtime_ns, size, digest, content in connection.execute("SELECT path, mtime_ns, size, digest, content FROM snapshot"):
+                        block = zlib.decompress(content).decode("utf-8", "surrogatepass") if content is not None else None
+                        snapshot[root / relative] = FileSnapshot(mtime_ns, size, digest, block)
+                finally:
+                    connection.close()
+        except (sqlite3.Error, OSError, zlib.error, UnicodeDecodeError) as load_err:
+            logging.warning(f"Could not load snapshot for {root}: {load_err}")
+            return {}
+        logging.info(f"Loaded snapshot for {root}: {len(snapshot)} files")
+        return snapshot
+
+    def save_snapshot(self, root: Path, entries: Mapping[Path, FileSnapshot], removed: Iterable[Path] = ()):
+        """Дописать снимок: записи entries заменяются, removed удаляются, остальные файлы снимка не трогаются."""
+        rows, gone = [], []
+        for path, entry in entries.items():
+            try: relative = str(path.relative_to(root))
+            except ValueError: continue
+            content = zlib.compress(entry.block.encode("utf-8", "surrogatepass")) if entry.block is not None else None
+            rows.append((relative, entry.mtime_ns, entry.size, entry.digest, content))
+        for path in removed:
+            try: gone.append((str(path.relative_to(root)),))
+            except ValueError: pass
+        try:
+            with self._lock:
+                connection = self._connect(root, create=True)
+                try:
+                    with connection:
+                        connection.executemany("DELETE FROM snapshot WHERE path = ?", gone)
+                        connection.executemany("INSERT OR REPLACE INTO snapshot VALUES (?, ?, ?, ?, ?)", rows)
+                finally:
+                    connection.close()
+        except (sqlite3.Error, OSError) as save_err:
+            logging.warning(f"Could not save snapshot for {root}: {save_err}")
+            return
+        logging.info(f"Saved snapshot for {root}: {len(rows)} files, {len(gone)} removed")
@@ -0,0 +1,204 @@
+# --- Буфер результата: части без склейки, вытеснение во временный файл, ограниченный предпросмотр ---
+import logging
+import tempfile
+import bisect
+import threading
+from typing import IO, Iterator, List, NamedTuple, Optional, Sequence, TextIO
+
+DEFAULT_SPILL_CHARS = 16 * 1024 * 1024 # Больше этого результат уходит из памяти во временный файл
+
+
+def _leading_space(text: str) -> int:
+    count = 0
+    for char in text:
+        if not char.isspace(): break
+        count += 1
+    return count
+
+
+def _trailing_space(text: str) -> int:
+    count = 0
+    for char in reversed(text):
+        if not char.isspace(): break
+        count += 1
+    return count
+
+
+class OutlineEntry(NamedTuple):
+    """Помеченная часть результата (блок файла) для оглавления предпросмотра."""
+    label: str
+    start: int # Смещение в символах в обрезанном результате
+    length: int
+    size: int # Размер файла на диске
+    lines: int
+
+
+def page_bounds(total: int, starts: Sequence[int], page_chars: int) -> List[int]:
+    """Начала страниц результата длины total: страница по возможности начинается с начала блока
+    (starts, по возрастанию) и не длиннее page_chars; блок длиннее страницы режется по page_chars."""
+    bounds = [0]
+    previous = 0
+    for start in list(starts) + [total]:
+        if start - bounds[-1] > page_chars:
+            if previous > bounds[-1]: bounds.append(previous)
+            while start - bounds[-1] > page_chars: bounds.append(bounds[-1] + page_chars)
+        previous = start
+    return bounds if total > 0 else []
+
+
+class OutputBuffer:
+    """Результат сборки как последовательность частей (блоков файлов, промптов, сообщений).
+
+    Части не склеиваются: размер считается на лету, а пробельные символы в начале и конце
+    всего результата отбрасываются при чтении (как у "".join(parts).strip(), но без копий).
+    Пока объём меньше spill_chars, части лежат в памяти (обычно это те же строки, что в
+    ContentCache); дальше всё пишется во временный файл в UTF-8 и читается по смещениям.
+    Буфер пишется из потока сканирования и читается из UI, поэтому операции под блокировкой.
+    """
+
+    def __init__(self, spill_chars: int = DEFAULT_SPILL_CHARS):
+        self.spill_chars = spill_chars
+        self._parts: List[str] = []
+        self._char_offsets: List[int] = [0] # Начало каждой части в символах (и конец последней)
+        self._byte_offsets: List[int] = [0] # То же в байтах временного файла (после вытеснения)
+        self._file: Optional[IO[bytes]] = None
+        self._leading = 0 # Пробельные символы в начале результата (ещё не встретился непробельный)
+        self._trailing = 0 # Пробельные символы в конце результата
+        self._outline: List[OutlineEntry] = [] # Смещения здесь - в необрезанном тексте
+        self._lock = threading.Lock()
+
+    # --- Запись ---
+    def append(self, text: str, label: Optional[str] = None, size: int = 0, lines: int = 0):
+        """Добавить часть; с label она попадает в оглавление (путь файла, размер, число строк)."""
+        if not text: return
+        with self._lock:
+            if label is not None: self._outline.append(OutlineEntry(label, self._char_offsets[-1], len(text), size, lines))
+            if self._leading == self._char_offsets[-1]: self._leading += _leading_space(text)
+            trailing = _trailing_space(text)
+            self._trailing = self._trailing + trailing if trailing == len(text) else trailing
+            if self._file is None:
+                self._parts.append(text)
+                self._char_offsets.append(self._char_offsets[-1] + len(text))
+                if self._char_offsets[-1] > self.spill_chars: self._spill()
+            else:
+                self._write(text)
+
+    def _write(self, text: str):
+        data = text.encode("utf-8", "surrogatepass")
+        self._file.seek(0, 2) # Чтение частей сдвигает позицию файла - пишем всегда в конец
+        self._file.write(data)
+        self._char_offsets.append(self._char_offsets[-1] + len(text))
+        self._byte_offsets.append(self._byte_offsets[-1] + len(data))
+
+    def _spill(self):
+        self._file = tempfile.TemporaryFile(prefix="aggregator-output-")
+        parts, self._parts = self._parts, []
+        self._char_offsets = [0]
+        for part in parts: self._write(part)
+        logging.info(f"Output exceeded {self.spill_chars} chars, spilled {self._byte_offsets[-1]} bytes to a temporary file.")
+
+    def close(self):
+        with self._lock:
+            if self._file is not None: self._file.close(); self._file = None
+            self._parts = []; self._char_offsets = [0]; self._byte_offsets = [0]; self._outline = []
+            self._leading = self._trailing = 0
+
+    # --- Размеры ---
+    def __len__(self) -> int:
+        """Длина результата в символах (без крайних пробельных символов)."""
+        return max(0, self._char_offsets[-1] - self._leading - self._trailing)
+
+    @property
+    def part_count(self) -> int:
+        return len(self._char_offsets) - 1
+
+    @property
+    def spilled(self) -> bool:
+        return self._file is not None
+
+    def outline(self) -> List[OutlineEntry]:
+        """Оглавление в координатах обрезанного результата."""
+        with self._lock:
+            total = len(self)
+            return [
+                entry._replace(start=min(total, max(0, entry.start - self._leading)))
+                for entry in self._outline
+            ]
+
+    def pages(self, page_chars: int) -> List[int]:
+        """Начала страниц по page_chars символов, выровненные по блокам оглавления."""
+        return page_bounds(len(self), [entry.start for entry in self.outline()], page_chars)
+
+    @staticmethod
+    def page_of(bounds: Sequence[int], position: int) -> int:
+        """Номер страницы, на которую попадает символ position."""
+        return max(0, bisect.bisect_right(bounds, position) - 1)
+
+    # --- Чтение ---
+    def _read_part(self, index: int) -> str:
+        if self._file is None: return self._parts[index]
+        self._file.seek(self._byte_offsets[index])
+        return self._file.read(self._byte_offsets[index + 1] - self._byte_offsets[index]).decode("utf-8", "surrogatepass")
+
+    def _iter_range(self, start: int, end: int) -> Iterator[str]:
+        """Куски результата в символьном диапазоне [start, end) сырого (необрезанного) текста."""
+        offsets = self._char_offsets
+        for index in range(self.part_count):
+            part_start, part_end = offsets[index], offsets[index + 1]
+            if part_end <= start: continue
+            if part_start >= end: break
+            part = self._read_part(index)
+            if part_start < start or part_end > end: part = part[max(0, start - part_start):min(len(part), end - part_start)]
+            yield part
+
+    def iter_chunks(self) -> Iterator[str]:
+        """Весь результат кусками (по частям); держит блокировку, пока итерация не закончена."""
+        with self._lock:
+            yield from self._iter_range(self._leading, self._char_offsets[-1] - self._trailing)
+
+    def read(self, start: int, length: int) -> str:
+        """Фрагмент результата: length символов с позиции start (в координатах обрезанного текста)."""
+        with self._lock:
+            begin = self._leading + max(0, start)
+            end = min(begin + max(0, length), self._char_offsets[-1] - self._trailing)
+            return "".join(self._iter_range(begin, end)) if end > begin else ""
+
+    def preview(self, max_chars: int) -> str:
+        return self.read(0, max_chars)
+
+    def write_to(self, out: TextIO) -> int:
+        """Потоковая запись всего результата в out без сборки в одну строку. Возвращает число символов."""
+        written = 0
+        for chunk in self.iter_chunks():
+            out.write(chunk); written += len(chunk)
+        return written
+
+    def getvalue(self) -> str:
+        return "".join(self.iter_chunks())
+
+
+def _compose_pieces(start_prompt: str, body: Optional[OutputBuffer], end_prompt: str, body_text: str) -> Iterator[str]:
+    separator = ""
+    for part in (start_prompt.strip(), body if body is not None else body_text.strip(), end_prompt.strip()):
+        if not len(part): continue
+        if separator: yield separator
+        if isinstance(part, OutputBuffer): yield from part.iter_chunks()
+        else: yield part
+        separator = "\n\n"
+
+
+def compose_output(out: TextIO, start_prompt: str, body: Optional[OutputBuffer], end_prompt: str, body_text: str = "") -> int:
+    """Промпты и результат через пустую строку, как в буфере обмена, потоком в out.
+
+    body_text используется, когда буфера нет (в поле вывода - сообщение, а не результат).
+    Возвращает число записанных символов.
+    """
+    written = 0
+    for piece in _compose_pieces(start_prompt, body, end_prompt, body_text):
+        out.write(piece); written += len(piece)
+    return written
+
+
+def compose_text(start_prompt: str, body: Optional[OutputBuffer], end_prompt: str, body_text: str = "") -> str:
+    """То же одной строкой (буфер обмена принимает только str): куски склеиваются один раз."""
+    return "".join(_compose_pieces(start_prompt, body, end_prompt, body_text))
@@ -0,0 +1,140 @@
+# --- Замеры горячих путей: спаны с длительностью и счётчиками, экспорт в JSON и trace-event ---
+import os
+import json
+import time
+import threading
+from collections import deque
+from pathlib import Path
+from typing import Any, Deque, Dict, List, NamedTuple
+
+PERF_ENV_VAR = "AGGREGATOR_PROFILE" # AGGREGATOR_PROFILE=1 включает замеры с самого старта
+MAX_SPAN_RECORDS = 10000 # Кольцевой буфер: старые спаны вытесняются
+
+
+class SpanRecord(NamedTuple):
+    name: str
+    start: float # time.perf_counter() в секундах
+    duration: float
+    thread: str
+    counts: Dict[str, Any]
+
+
+class _Span:
+    """Открытый спан; счётчики можно добавлять по ходу работы."""
+    __slots__ = ("_profiler", "name", "counts", "_start")
+
+    def __init__(self, profiler: "Profiler", name: str, counts: Dict[str, Any]):
+        self._profiler = profiler
+        self.name = name
+        self.counts = counts
+        self._start = 0.0
+
+    def add(self, **counts):
+        for key, value in counts.items(): self.counts[key] = self.counts.get(key, 0) + value
+
+    def set(self, **counts):
+        self.counts.update(counts)
+
+    def __enter__(self) -> "_Span":
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        duration = time.perf_counter() - self._start
+        if exc_type is not None: self.counts["error"] = exc_type.__name__
+        self._profiler._record(SpanRecord(self.name, self._start, duration, threading.current_thread().name, self.counts))
+        return False
+
+
+class _NullSpan:
+    """Спан выключенного профайлера: ничего не меряет и не выделяет память."""
+    __slots__ = ()
+
+    def add(self, **counts): pass
+
+    def set(self, **counts): pass
+
+    def __enter__(self) -> "_NullSpan":
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class Profiler:
+    """Сборщик спанов горячих путей (фильтр, построение дерева, сбор и чтение файлов, сборка текста,
+    обновление UI, копирование).
+
+    Выключенный профайлер возвращает из span() общий пустой объект, так что цена замера в
+    горячем пути - один вызов и проверка флага. Записи пишутся из любых потоков.
+    """
+
+    def __init__(self, enabled: bool = False, max_records: int = MAX_SPAN_RECORDS):
+        self.enabled = enabled
+        self._records: Deque[SpanRecord] = deque(maxlen=max_records)
+        self._origin = time.perf_counter()
+
+    def span(self, name: str, **counts):
+        if not self.enabled: return _NULL_SPAN
+        return _Span(self, name, counts)
+
+    def _record(self, record: SpanRecord):
+        self._records.append(record) # deque.append атомарен, отдельная блокировка не нужна
+
+    def clear(self):
+        self._records.clear()
+        self._origin = time.perf_counter()
+
+    def records(self) -> List[SpanRecord]:
+        return list(self._records)
+
+    def summary(self) -> Dict[str, Dict[str, Any]]:
+        """Сводка по именам спанов: число вызовов, суммарное/максимальное/последнее время и сумма счётчиков."""
+        summary: Dict[str, Dict[str, Any]] = {}
+        for record in self.records():
+            entry = summary.setdefault(record.name, {"calls": 0, "total_seconds": 0.0, "max_seconds": 0.0, "last_seconds": 0.0, "counts": {}})
+            entry["calls"] += 1
+            entry["total_seconds"] += record.duration
+            entry["max_seconds"] = max(entry["max_seconds"], record.duration)
+            entry["last_seconds"] = record.duration
+            for key, value in record.counts.items():
+                if isinstance(value, (int, float)) and not isinstance(value, bool): entry["counts"][key] = entry["counts"].get(key, 0) + value
+        return summary
+
+    def to_json(self) -> Dict[str, Any]:
+        return {
+            "summary": self.summary(),
+            "spans": [
+                {"name": r.name, "start_seconds": r.start - self._origin, "duration_seconds": r.duration, "thread": r.thread, "counts": r.counts}
+                for r in self.records()
+            ],
+        }
+
+    def to_trace_events(self) -> Dict[str, Any]:
+        """Формат Trace Event (chrome://tracing, Perfetto, speedscope): полные события "X" в микросекундах."""
+        pid = os.getpid()
+        thread_ids: Dict[str, int] = {}
+        events: List[Dict[str, Any]] = []
+        for record in self.records():
+            tid = thread_ids.setdefault(record.thread, len(thread_ids) + 1)
+            events.append({
+                "name": record.name, "ph": "X", "pid": pid, "tid": tid,
+                "ts": round((record.start - self._origin) * 1e6, 3), "dur": round(record.duration * 1e6, 3),
+                "args": record.counts,
+            })
+        for thread_name, tid in thread_ids.items():
+            events.append({"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": thread_name}})
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def export_json(self, path: Path):
+        path.write_text(json.dumps(self.to_json(), indent=2, ensure_ascii=False, default=str), encoding="utf-8")
+
+    def export_trace(self, path: Path):
+        path.write_text(json.dumps(self.to_trace_events(), ensure_ascii=False, default=str), encoding="utf-8")
+
+
+# Общий профайлер процесса: ядро и UI пишут в него, панель статистики и CLI читают
+profiler = Profiler(enabled=os.environ.get(PERF_ENV_VAR, "") not in ("", "0"))
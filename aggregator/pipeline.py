@@ -0,0 +1,195 @@
+# --- Конвейер агрегации: сбор файлов -> чтение -> оформление (общий для GUI и CLI) ---
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import TYPE_CHECKING, Iterable, List, Mapping, NamedTuple, Optional, Sequence, TextIO, Tuple, Union
+
+from .budget import DEFAULT_BUDGET_TOKENS, DEFAULT_FILE_CAP_BYTES, file_stamps, format_budget_note, plan_budget
+from .classify import is_likely_text_file
+from .constants import DELTA_OFF
+from .content_cache import ContentCache
+from .dedup import BlockDeduplicator, format_dedup_note
+from .ignore_rules import IgnoreRules
+from .perf import profiler
+from .reader import DEFAULT_READ_WORKERS, iter_blocks, relative_display_path
+from .scan_control import CancelToken, ScanCancelled
+from .selection import SelectionTrie
+from .tree_index import TreeIndex
+from .walker import iter_files, is_ignored_path
+from .workspace import WORKSPACE_WORKERS, display_bases, normalize_roots, root_of
+
+if TYPE_CHECKING: # IndexStore (SQLite) и снимки нужны только режиму изменений - импортируются в write_aggregate
+    from .index_store import IndexStore
+
+
+class AggregateStats(NamedTuple):
+    files: int
+    bytes_read: int
+    chars_written: int
+
+
+class WorkspaceFiles(NamedTuple):
+    """Файлы выбора по всем корням рабочего пространства и база относительного пути каждого файла."""
+    files: List[Path]
+    bases: List[Path]
+    error_blocks: List[str]
+
+
+def format_dir_error_block(relative_path, label: str, dir_err: Exception) -> str:
+    return f"{relative_path} (ДИРЕКТОРИЯ)\n```\n[{label}: {dir_err}]\n```\n\n"
+
+
+def collect_files(
+    paths_to_scan: Union[Iterable[Path], SelectionTrie], base_path: Optional[Path], index: Optional[TreeIndex] = None,
+    token: Optional[CancelToken] = None, rules: Optional[IgnoreRules] = None, display_base: Optional[Path] = None,
+) -> Tuple[List[Path], List[str]]:
+    """Фаза 1: текстовые файлы выбранных путей в детерминированном порядке и блоки ошибок по папкам.
+
+    Выбор (SelectionTrie или список путей) сводится к непересекающимся регионам, так что каждое
+    выбранное поддерево обходится ровно один раз, а исключённые части не посещаются вовсе.
+    Пути, известные индексу, раскрываются по индексу без обращений к диску, остальные -
+    обходом walk_tree с той же политикой отсечения (правила берутся из rules или из индекса).
+    Явно переданные пути берутся как есть, даже если их исключает .gitignore.
+    Отсечение считается от base_path (корня), подписи блоков ошибок - от display_base (по умолчанию тот же).
+    """
+    if display_base is None: display_base = base_path
+    if rules is None and index is not None: rules = index.rules
+    selection = paths_to_scan if isinstance(paths_to_scan, SelectionTrie) else SelectionTrie(paths_to_scan)
+    files_to_process: List[Path] = []
+    error_blocks: List[str] = []
+
+    def add(file_path: Path):
+        if is_likely_text_file(file_path): files_to_process.append(file_path)
+
+    with profiler.span("collect") as span:
+        for region in selection.regions():
+            item_path = region.path
+            if token is not None: token.check()
+            if is_ignored_path(item_path, base_path): continue
+            span.add(regions=1)
+            node_id = index.id_of(item_path) if index is not None else None
+            if node_id is not None: # Путь есть в индексе - диск не трогаем (классификация тоже запомнена в узлах)
+                if not index.is_dir(node_id):
+                    if index.is_text(node_id): files_to_process.append(item_path)
+                    continue
+                for file_id in index.iter_files(node_id, region.skip):
+                    if token is not None: token.check()
+                    if index.is_text(file_id): files_to_process.append(index.path_of(file_id))
+            elif item_path.is_file():
+                add(item_path)
+            elif item_path.is_dir():
+                try:
+                    skip = frozenset(map(str, region.skip))
+                    for sub_item in iter_files(item_path, token=token, rules=rules, skip=skip): add(sub_item.path)
+                except ScanCancelled: raise
+                except PermissionError as dir_perm_err:
+                    logging.warning(f"Permission denied scanning directory {item_path}: {dir_perm_err}")
+                    error_blocks.append(format_dir_error_block(relative_display_path(item_path, display_base), "ОШИБКА ДОСТУПА", dir_perm_err))
+                except Exception as dir_scan_err:
+                    logging.warning(f"Error scanning directory {item_path}: {dir_scan_err}")
+                    error_blocks.append(format_dir_error_block(relative_display_path(item_path, display_base), "ОШИБКА СКАНИРОВАНИЯ ПАПКИ", dir_scan_err))
+        span.set(files=len(files_to_process), dir_errors=len(error_blocks))
+    return files_to_process, error_blocks
+
+
+def collect_workspace(
+    selection: SelectionTrie, roots: Sequence[Path], indexes: Optional[Mapping[Path, TreeIndex]] = None,
+    token: Optional[CancelToken] = None, rules: Optional[Mapping[Path, Optional[IgnoreRules]]] = None,
+    workers: int = WORKSPACE_WORKERS,
+) -> WorkspaceFiles:
+    """Файлы выбора по всем корням: каждый корень собирается по своему индексу (или обходом) параллельно.
+
+    Порядок результата - порядок корней, внутри корня - как у collect_files. Отсечение игнорируемых
+    папок считается от самого корня (корень с именем dist или .x не отсекается), а база путей
+    в выводе - display_bases (родитель корня, когда корней несколько).
+    """
+    bases = display_bases(roots)
+
+    def collect_root(root: Path) -> Tuple[List[Path], List[str]]:
+        index = indexes.get(root) if indexes is not None else None
+        return collect_files(
+            selection.restricted(root), root, index=index, token=token,
+            rules=rules.get(root) if rules is not None else None, display_base=bases[root],
+        )
+
+    if len(roots) <= 1 or workers <= 1:
+        per_root = [collect_root(root) for root in roots]
+    else:
+        with ThreadPoolExecutor(max_workers=min(workers, len(roots)), thread_name_prefix="collect") as pool:
+            per_root = list(pool.map(collect_root, roots))
+    result = WorkspaceFiles([], [], [])
+    for root, (files, error_blocks) in zip(roots, per_root):
+        result.files.extend(files); result.bases.extend([bases[root]] * len(files)); result.error_blocks.extend(error_blocks)
+    if len(roots) > 1: logging.info(f"Workspace of {len(roots)} roots: {len(result.files)} files")
+    return result
+
+
+def write_aggregate(
+    out: TextIO, root: Path, paths_to_scan: Optional[Iterable[Path]] = None,
+    start_prompt: str = "", end_prompt: str = "", workers: int = DEFAULT_READ_WORKERS,
+    cache: Optional[ContentCache] = None, token: Optional[CancelToken] = None, use_ignore_files: bool = True,
+    extra_roots: Sequence[Path] = (), file_cap_bytes: int = DEFAULT_FILE_CAP_BYTES, budget_tokens: int = DEFAULT_BUDGET_TOKENS,
+    delta: str = DELTA_OFF, store: Optional["IndexStore"] = None, record_snapshot: bool = False, dedup: bool = True,
+) -> AggregateStats:
+    """Потоковая запись результата в out: промпты и блоки файлов в том же виде, что копирует GUI.
+
+    Блоки пишутся по мере чтения, весь результат в памяти не собирается. С extra_roots
+    собирается рабочее пространство из нескольких корней (пути в выводе начинаются с имени корня).
+    Файлы больше file_cap_bytes обрезаются; файлы сверх budget_tokens не читаются (0 - без лимита).
+    С delta выводятся только изменения относительно снимка в store (режимы snapshot.DELTA_*),
+    с record_snapshot снимок после записи обновляется. С dedup повторы уже выведенного
+    содержимого заменяются ссылками на первый файл.
+    """
+    roots = normalize_roots([root, *extra_roots]) if extra_roots else [root]
+    selection = SelectionTrie(paths_to_scan or roots)
+    rules = {r: IgnoreRules(r) if use_ignore_files else None for r in roots}
+    files, bases, error_blocks = collect_workspace(selection, roots, token=token, rules=rules)
+    collected = set(files)
+    stamps = file_stamps(files)
+    tracker = None # DeltaTracker, если нужен режим изменений или запись снимка
+    if delta != DELTA_OFF or record_snapshot:
+        from .index_store import IndexStore
+        from .snapshot import DeltaTracker, merge_snapshots
+        store = store or IndexStore()
+        tracker = DeltaTracker(merge_snapshots(store.load_snapshot(r) for r in roots) if delta != DELTA_OFF else None, delta)
+        files, bases, stamps = tracker.select_reads(files, bases, stamps)
+    plan = plan_budget([size for _, size in stamps], file_cap_bytes, budget_tokens)
+    logging.info(f"Total text files to read: {plan.files} of {len(files)}, ~{plan.tokens} tokens ({plan.truncated} truncated)")
+    chars_written = 0
+    separator = ""
+
+    def emit(text: str):
+        # Части разделяются пустой строкой, хвостовые переводы строк блоков не дублируются
+        nonlocal chars_written, separator
+        if not text: return
+        out.write(separator); out.write(text)
+        chars_written += len(separator) + len(text)
+        separator = "\n\n"
+
+    emit(start_prompt.strip())
+    for error_block in error_blocks: emit(error_block.rstrip("\n"))
+    files_done = 0; bytes_read = 0
+    deduplicator = BlockDeduplicator() if dedup else None
+    with profiler.span("read", workers=workers) as span: # Включает запись в out: чтение и вывод идут вперемешку
+        for position, block in enumerate(iter_blocks(files[:plan.files], root, workers=workers, cache=cache, token=token, bases=bases, limits=plan.limits)):
+            relative_path = relative_display_path(block.path, bases[position])
+            text = tracker.record(block, stamps[position], relative_path) if tracker is not None else block.text
+            if deduplicator is not None and text is block.text: text = deduplicator.process(block, relative_path) # Diff-блоки не сравниваются
+            if text is not None: emit(text.rstrip("\n"))
+            files_done += 1; bytes_read += block.size
+        span.set(files=files_done, bytes=bytes_read, chars=chars_written, duplicates=deduplicator.duplicates if deduplicator is not None else 0)
+    if tracker is not None:
+        from .snapshot import format_deleted_block, format_delta_note
+        display = display_bases(roots)
+        for file_path in tracker.deleted(selection.is_selected, collected):
+            emit(format_deleted_block(relative_display_path(file_path, display[root_of(file_path, roots)])).rstrip("\n"))
+        emit(format_delta_note(tracker).rstrip("\n"))
+        if record_snapshot:
+            for r in roots: store.save_snapshot(r, *tracker.for_root(r))
+    if deduplicator is not None:
+        emit(format_dedup_note(deduplicator).rstrip("\n"))
+        if deduplicator.duplicates: logging.info(f"Deduplicated {deduplicator.duplicates} files ({deduplicator.saved_bytes} bytes)")
+    emit(format_budget_note(plan).rstrip("\n"))
+    emit(end_prompt.strip())
+    if chars_written: out.write("\n"); chars_written += 1
+    return AggregateStats(files_done, bytes_read, chars_written)
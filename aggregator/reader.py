@@ -0,0 +1,200 @@
+# --- Чтение выбранных файлов и форматирование блоков вывода ---
+import os
+import hashlib
+import logging
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Deque, Iterator, List, NamedTuple, Optional, Sequence, Tuple, Union
+
+from .content_cache import ContentCache
+from .scan_control import CancelToken
+
+DEFAULT_READ_WORKERS = min(16, (os.cpu_count() or 1) * 2) # Чтение упирается в I/O, поэтому потоков больше, чем ядер
+READ_AHEAD_PER_WORKER = 4
+_EDGE_SPACE_BYTES = frozenset(b" \t\n\r\x0b\x0c\x1c\x1d\x1e\x1f") # ASCII-символы, которые срезает str.strip()
+TAIL_SHARE = 0.25 # Доля лимита обрезаемого файла, которая отдаётся его концу (остальное - началу)
+
+
+def format_size(num_bytes: float) -> str:
+    """Человекочитаемый размер для индикаторов прогресса."""
+    for unit in ("Б", "КБ", "МБ"):
+        if num_bytes < 1024: return f"{num_bytes:.0f} {unit}" if unit == "Б" else f"{num_bytes:.1f} {unit}"
+        num_bytes /= 1024
+    return f"{num_bytes:.1f} ГБ"
+
+
+def relative_display_path(file_path: Path, base_path: Optional[Path]) -> Union[Path, str]:
+    return file_path.relative_to(base_path) if base_path else file_path.name
+
+
+def read_text_stripped(file_path: Path) -> str:
+    """Текст файла (UTF-8, ошибки пропускаются, переводы строк как у read_text) без крайних пробельных символов.
+
+    Края обрезаются ещё в байтах, а декодируется срез memoryview - так содержимое не копируется
+    лишний раз ради strip(), и format_file_block получает уже готовую строку.
+    """
+    with open(file_path, "rb") as f: data = f.read()
+    start, end = 0, len(data)
+    while start < end and data[start] in _EDGE_SPACE_BYTES: start += 1
+    while end > start and data[end - 1] in _EDGE_SPACE_BYTES: end -= 1
+    text = _decode(memoryview(data)[start:end])
+    del data
+    return text.strip() # Без копии, если по краям нет не-ASCII пробелов
+
+
+def _decode(data) -> str:
+    text = str(data, "utf-8", "ignore")
+    if "\r" in text: text = text.replace("\r\n", "\n").replace("\r", "\n")
+    return text
+
+
+def read_text_truncated(file_path: Path, limit: int, tail_share: float = TAIL_SHARE) -> str:
+    """Начало и конец файла, вместе не больше limit байт, с пометкой о пропущенной середине.
+
+    Читаются только два ограниченных среза (seek), файл в память целиком не загружается.
+    Срезы выравниваются по переводам строк; обрезанный по краю символ UTF-8 отбрасывается.
+    """
+    return _read_truncated(file_path, limit, tail_share)[0]
+
+
+def _read_truncated(file_path: Path, limit: int, tail_share: float = TAIL_SHARE) -> Tuple[str, int]:
+    """read_text_truncated и число байт файла, попавших в текст."""
+    with open(file_path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if size <= limit: return read_text_stripped(file_path), size
+        tail_bytes = int(limit * tail_share)
+        head = f.read(limit - tail_bytes)
+        f.seek(size - tail_bytes)
+        tail = f.read(tail_bytes) if tail_bytes else b""
+    cut = head.rfind(b"\n")
+    if cut > 0: head = head[:cut]
+    cut = tail.find(b"\n")
+    if 0 <= cut < len(tail) - 1: tail = tail[cut + 1:]
+    omitted = size - len(head) - len(tail)
+    marker = f"[... пропущено {format_size(omitted)} из {format_size(size)} ...]"
+    return f"{_decode(head).strip()}\n\n{marker}\n\n{_decode(tail).strip()}".strip(), len(head) + len(tail)
+
+
+def content_hash(text: str) -> str:
+    return hashlib.blake2b(text.encode("utf-8", "surrogatepass"), digest_size=16).hexdigest()
+
+
+def block_digest(block: str) -> str:
+    """Хэш содержимого оформленного блока без строки заголовка (пути) - одинаков у файлов с одним текстом."""
+    return content_hash(block[block.find("\n") + 1:])
+
+
+def format_file_block(relative_path: Union[Path, str], file_content: str) -> str:
+    return f"{relative_path}\n```\n{file_content.strip()}\n```\n\n"
+
+
+def block_body(block: str) -> str:
+    """Содержимое оформленного блока между оградами - без строки с путём и самих оград."""
+    start = block.find("\n", block.find("```")) + 1
+    end = block.rfind("\n```")
+    return block[start:end] if 0 < start <= end else ""
+
+
+def block_line_count(block: str) -> int:
+    """Число строк содержимого блока (пустой файл - 0 строк)."""
+    body = block_body(block)
+    return body.count("\n") + 1 if body else 0
+
+
+def format_truncated_block(relative_path: Union[Path, str], file_content: str) -> str:
+    return f"{relative_path} (ОБРЕЗАН)\n```\n{file_content}\n```\n\n"
+
+
+def format_error_block(relative_path: Union[Path, str], read_err: Exception) -> str:
+    return f"{relative_path}\n```\n[НЕ УДАЛОСЬ ПРОЧИТАТЬ ФАЙЛ: {read_err}]\n```\n\n"
+
+
+class FileBlock(NamedTuple):
+    """Оформленный блок одного файла и сведения для прогресса."""
+    path: Path
+    text: str
+    size: int # Прочитано байт: размер файла на диске, у обрезанного - сумма срезов (0, если прочитать не удалось)
+    cached: bool
+    digest: Optional[str] = None # Хэш полного содержимого (block_digest); у обрезанных и ошибок - None
+
+    @property
+    def lines(self) -> int:
+        """Число строк содержимого (без заголовка и оград блока)."""
+        return block_line_count(self.text)
+
+
+def read_file(file_path: Path, base_path: Optional[Path], cache: Optional[ContentCache] = None, limit: Optional[int] = None) -> FileBlock:
+    """Прочитать и оформить один файл; ошибка чтения превращается в блок с ошибкой.
+
+    С кэшем файл читается только если его (mtime_ns, размер) изменились с прошлого раза.
+    Файл больше limit байт обрезается (начало и конец) и в кэш не попадает.
+    Хэш содержимого считается здесь же, в потоке чтения, чтобы потребитель мог убрать дубликаты.
+    """
+    try:
+        relative_path = relative_display_path(file_path, base_path)
+        st = file_path.stat()
+        if limit is not None and st.st_size > limit:
+            text, used = _read_truncated(file_path, limit)
+            return FileBlock(file_path, format_truncated_block(relative_path, text), used, False)
+        if cache is None:
+            block = format_file_block(relative_path, read_text_stripped(file_path))
+            return FileBlock(file_path, block, st.st_size, False, block_digest(block))
+        key = (file_path, st.st_mtime_ns, st.st_size)
+        block = cache.get(key, str(relative_path))
+        if block is not None: return FileBlock(file_path, block, st.st_size, True, block_digest(block))
+        block = format_file_block(relative_path, read_text_stripped(file_path))
+        cache.put(key, str(relative_path), block)
+        return FileBlock(file_path, block, st.st_size, False, block_digest(block))
+    except Exception as read_err:
+        logging.warning(f"Could not read file {file_path}: {read_err}")
+        return FileBlock(file_path, format_error_block(relative_display_path(file_path, base_path), read_err), 0, False)
+
+
+def read_file_block(file_path: Path, base_path: Optional[Path], cache: Optional[ContentCache] = None) -> str:
+    return read_file(file_path, base_path, cache).text
+
+
+def iter_blocks(
+    files: Sequence[Path], base_path: Optional[Path], workers: int = DEFAULT_READ_WORKERS,
+    cache: Optional[ContentCache] = None, token: Optional[CancelToken] = None,
+    bases: Optional[Sequence[Optional[Path]]] = None, limits: Optional[Sequence[Optional[int]]] = None,
+) -> Iterator[FileBlock]:
+    """Блоки файлов по мере готовности, строго в порядке files.
+
+    workers <= 1 - последовательное чтение (для сравнения и отладки). В пуле одновременно
+    находится не больше workers * READ_AHEAD_PER_WORKER задач, так что память не растёт,
+    если потребитель (UI) отстаёт от чтения. С token чтение прерывается ScanCancelled.
+    bases - своя база относительного пути для каждого файла (файлы нескольких корней в одном пуле),
+    limits - лимит байт для каждого файла из плана бюджета (BudgetPlan.limits).
+    """
+    base_of = (lambda position: bases[position]) if bases is not None else (lambda position: base_path)
+    limit_of = (lambda position: limits[position]) if limits is not None else (lambda position: None)
+    if workers <= 1 or len(files) <= 1:
+        for position, file_path in enumerate(files):
+            if token is not None: token.check()
+            yield read_file(file_path, base_of(position), cache, limit_of(position))
+        return
+    workers = min(workers, len(files))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="reader") as pool:
+        pending: Deque[Future] = deque()
+        files_iter = iter(files)
+        try:
+            for position, file_path in enumerate(files_iter):
+                if token is not None: token.check()
+                pending.append(pool.submit(read_file, file_path, base_of(position), cache, limit_of(position)))
+                if len(pending) >= workers * READ_AHEAD_PER_WORKER: yield pending.popleft().result()
+            while pending:
+                if token is not None: token.check()
+                yield pending.popleft().result()
+        finally:
+            # Потребитель прекратил итерацию досрочно - не дочитываем оставшееся
+            for future in pending: future.cancel()
+
+
+def read_blocks(
+    files: Sequence[Path], base_path: Optional[Path], workers: int = DEFAULT_READ_WORKERS,
+    cache: Optional[ContentCache] = None,
+) -> List[str]:
+    """Все блоки файлов списком, в порядке files."""
+    return [block.text for block in iter_blocks(files, base_path, workers, cache)]
@@ -0,0 +1,61 @@
+# --- Отмена и вытеснение сканирований через токены поколений ---
+import threading
+from typing import Optional
+
+
+class ScanCancelled(Exception):
+    """Сканирование отменено пользователем или вытеснено более новым."""
+
+
+class CancelToken:
+    """Токен одного сканирования; циклы обхода и чтения периодически вызывают check()."""
+    __slots__ = ("generation", "_event")
+
+    def __init__(self, generation: int):
+        self.generation = generation
+        self._event = threading.Event()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def cancel(self):
+        self._event.set()
+
+    def check(self):
+        if self._event.is_set(): raise ScanCancelled()
+
+
+class ScanController:
+    """Раздаёт токены сканирований: новый запуск отменяет предыдущий,
+    а публиковать результат в UI может только токен последнего поколения."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._current: Optional[CancelToken] = None
+
+    @property
+    def running(self) -> bool:
+        return self._current is not None
+
+    def start(self) -> CancelToken:
+        with self._lock:
+            if self._current is not None: self._current.cancel()
+            self._generation += 1
+            self._current = CancelToken(self._generation)
+            return self._current
+
+    def cancel(self) -> bool:
+        """Отменить текущее сканирование (Esc). True, если было что отменять."""
+        with self._lock:
+            if self._current is None: return False
+            self._current.cancel()
+            return True
+
+    def is_current(self, token: CancelToken) -> bool:
+        return token.generation == self._generation
+
+    def finish(self, token: CancelToken):
+        with self._lock:
+            if self._current is token: self._current = None
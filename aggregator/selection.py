@@ -0,0 +1,146 @@
+# --- Выбор как дерево префиксов путей: включения, исключения и три состояния отметки ---
+from pathlib import Path
+from typing import Dict, FrozenSet, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+UNCHECKED = False
+CHECKED = True
+MIXED = None # Значение ft.Checkbox(tristate=True) для частично выбранной папки
+
+
+class _TrieNode:
+    __slots__ = ("children", "rule")
+
+    def __init__(self):
+        self.children: Dict[str, "_TrieNode"] = {}
+        self.rule: Optional[bool] = None # True - включить поддерево, False - исключить, None - правила нет
+
+
+class SelectionRegion(NamedTuple):
+    """Включённое поддерево для сбора файлов: корень и пути ниже него, которые надо пропустить
+    (исключённые или выбранные отдельно - они сами образуют свой регион)."""
+    path: Path
+    skip: FrozenSet[Path]
+
+
+class SelectionTrie:
+    """Выбор файлов и папок в виде дерева префиксов путей.
+
+    В узлах хранятся правила "включить" или "исключить" поддерево; решение для пути даёт
+    ближайшее правило на нём самом или на предке (по умолчанию путь не выбран). После каждого
+    изменения дерево нормализуется: правило хранится, только если оно отличается от
+    унаследованного, а правила потомков отметки папки перекрываются. Поэтому выбор папки вместе
+    со всеми вложенными путями - одно правило, а регионы для сбора файлов не пересекаются.
+    """
+
+    def __init__(self, paths: Iterable[Path] = ()):
+        self._root = _TrieNode()
+        for path in sorted(paths, key=lambda p: p.parts): self.set(path, True)
+
+    @classmethod
+    def from_rules(cls, rules: Iterable[Tuple[Path, bool]]) -> "SelectionTrie":
+        """Восстановить выбор из правил (например, сохранённых rules())."""
+        trie = cls()
+        trie.update(rules)
+        return trie
+
+    # --- Изменение ---
+    def set(self, path: Path, selected: bool):
+        """Отметить или снять путь вместе со всем поддеревом."""
+        chain = [self._root]
+        inherited = False
+        for part in path.parts:
+            if chain[-1].rule is not None: inherited = chain[-1].rule
+            chain.append(chain[-1].children.setdefault(part, _TrieNode()))
+        node = chain[-1]
+        node.children.clear() # Отметка папки перекрывает правила внутри неё
+        node.rule = None if selected == inherited else selected
+        self._prune(path.parts, chain)
+
+    def remove(self, path: Path):
+        """Забыть правила пути и его поддерева (путь удалён с диска), не меняя решения предков."""
+        chain = [self._root]
+        for part in path.parts:
+            node = chain[-1].children.get(part)
+            if node is None: return
+            chain.append(node)
+        chain[-1].children.clear(); chain[-1].rule = None
+        self._prune(path.parts, chain)
+
+    def _prune(self, parts: Tuple[str, ...], chain: List[_TrieNode]):
+        for depth in range(len(parts), 0, -1):
+            node = chain[depth]
+            if node.rule is not None or node.children: break
+            del chain[depth - 1].children[parts[depth - 1]]
+
+    def update(self, rules: Iterable[Tuple[Path, bool]]):
+        """Применить правила (путь, включить) в порядке путей: сначала папки, затем вложенные исключения."""
+        for path, selected in sorted(rules, key=lambda rule: rule[0].parts): self.set(path, selected)
+
+    def clear(self):
+        self._root = _TrieNode()
+
+    def copy(self) -> "SelectionTrie":
+        return SelectionTrie.from_rules(self.rules())
+
+    def restricted(self, root: Path) -> "SelectionTrie":
+        """Выбор только внутри root (для сбора по одному корню рабочего пространства)."""
+        trie = SelectionTrie()
+        node, decision = self._lookup(root)
+        if decision: trie.set(root, True) # Корень выбран правилом на нём самом или на предке
+        if node is not None:
+            trie.update((path, selected) for path, selected in self.rules() if path != root and path.is_relative_to(root))
+        return trie
+
+    # --- Запросы ---
+    def __bool__(self) -> bool:
+        return bool(self._root.children) # После нормализации любое правило означает хотя бы одно включение
+
+    def _lookup(self, path: Path) -> Tuple[Optional[_TrieNode], bool]:
+        """Узел пути (None, если правил на нём и ниже нет) и решение для самого пути."""
+        node = self._root
+        decision = False
+        for part in path.parts:
+            node = node.children.get(part)
+            if node is None: return None, decision
+            if node.rule is not None: decision = node.rule
+        return node, decision
+
+    def is_selected(self, path: Path) -> bool:
+        return self._lookup(path)[1]
+
+    def state(self, path: Path) -> Optional[bool]:
+        """CHECKED, UNCHECKED или MIXED (внутри папки есть правила, отличные от её собственного решения)."""
+        node, decision = self._lookup(path)
+        return MIXED if node is not None and node.children else decision
+
+    def rules(self) -> List[Tuple[Path, bool]]:
+        """Все правила (путь, включить) в порядке обхода дерева."""
+        result: List[Tuple[Path, bool]] = []
+        stack: List[Tuple[Tuple[str, ...], _TrieNode]] = [((), self._root)]
+        while stack:
+            parts, node = stack.pop()
+            if node.rule is not None: result.append((Path(*parts), node.rule))
+            for name in sorted(node.children, reverse=True): stack.append((parts + (name,), node.children[name]))
+        return result
+
+    def included(self) -> List[Path]:
+        return [path for path, selected in self.rules() if selected]
+
+    def excluded(self) -> List[Path]:
+        return [path for path, selected in self.rules() if not selected]
+
+    def regions(self) -> Iterator[SelectionRegion]:
+        """Непересекающиеся включённые поддеревья в порядке путей - каждое обходится ровно один раз."""
+        stack: List[Tuple[Tuple[str, ...], _TrieNode]] = [((), self._root)]
+        while stack:
+            parts, node = stack.pop()
+            if node.rule:
+                skip = []
+                below = [((), node)]
+                while below: # Правила ниже региона: их поддеревья либо исключены, либо станут своими регионами
+                    relative, current = below.pop()
+                    for name, child in current.children.items():
+                        if child.rule is not None: skip.append(Path(*parts, *relative, name))
+                        else: below.append((relative + (name,), child))
+                yield SelectionRegion(Path(*parts), frozenset(skip))
+            for name in sorted(node.children, reverse=True): stack.append((parts + (name,), node.children[name]))
@@ -0,0 +1,114 @@
+# --- Снимки скопированного результата и режим "только изменения с последнего копирования" ---
+import difflib
+from pathlib import Path
+from typing import AbstractSet, Dict, Iterable, List, Mapping, NamedTuple, Optional, Sequence, Set, Tuple, Union
+
+from .budget import MISSING_STAMP
+from .constants import DELTA_OFF, DELTA_DIFF
+from .reader import FileBlock, block_body, content_hash
+
+SNAPSHOT_CONTENT_MAX_CHARS = 256 * 1024 # Блоки длиннее не сохраняются для diff (только хэш)
+
+
+class FileSnapshot(NamedTuple):
+    """Файл в снимке: stat на момент чтения, хэш оформленного блока и сам блок (для diff, если не слишком длинный)."""
+    mtime_ns: int
+    size: int
+    digest: str
+    block: Optional[str]
+
+
+def format_diff_block(relative_path: Union[Path, str], previous_block: str, block: str) -> str:
+    diff = difflib.unified_diff(
+        block_body(previous_block).splitlines(), block_body(block).splitlines(),
+        fromfile=f"a/{relative_path}", tofile=f"b/{relative_path}", lineterm="",
+    )
+    return f"{relative_path} (ИЗМЕНЁН)\n```diff\n" + "\n".join(diff) + "\n```\n\n"
+
+
+def format_deleted_block(relative_path: Union[Path, str]) -> str:
+    return f"{relative_path} (УДАЛЁН)\n```\n[ФАЙЛ УДАЛЁН С ПОСЛЕДНЕГО КОПИРОВАНИЯ]\n```\n\n"
+
+
+class DeltaTracker:
+    """Сравнение сборки с прошлым снимком и накопление нового снимка.
+
+    Файл с теми же (mtime_ns, размер), что в снимке, не читается вовсе (needs_read); stat должен быть
+    свежим (file_stamps без индексов), а не из индекса дерева, который не видит правок на месте. Прочитанный
+    сверяется по хэшу блока: совпал - не выводится, отличается - выводится целиком или diff-ом.
+    В режиме DELTA_OFF выводится всё, но снимок всё равно копится, чтобы записать его при копировании.
+    entries и removed - изменения снимка для IndexStore.save_snapshot (прочие записи не трогаются).
+    """
+
+    def __init__(self, previous: Optional[Mapping[Path, FileSnapshot]] = None, mode: str = DELTA_OFF):
+        self.previous = previous or {}
+        self.mode = mode
+        self.entries: Dict[Path, FileSnapshot] = {}
+        self.removed: List[Path] = []
+        self._vanished: Set[Path] = set() # Собраны по индексу дерева, но на диске их уже нет
+        self.added = self.modified = self.unchanged = 0
+
+    @property
+    def active(self) -> bool:
+        return self.mode != DELTA_OFF
+
+    def needs_read(self, path: Path, stamp: Tuple[int, int]) -> bool:
+        """False - файл не менялся с прошлого снимка (по stat) или исчез (тогда он попадёт в deleted)."""
+        if self.active and stamp == MISSING_STAMP and not path.exists():
+            self._vanished.add(path)
+            return False
+        previous = self.previous.get(path)
+        if not self.active or previous is None or (previous.mtime_ns, previous.size) != stamp: return True
+        self.entries[path] = previous
+        self.unchanged += 1
+        return False
+
+    def select_reads(self, files: Sequence[Path], bases: Sequence, stamps: Sequence[Tuple[int, int]]) -> Tuple[List[Path], list, List[Tuple[int, int]]]:
+        """Файлы (с базами путей и stat), которые надо читать: в режиме изменений - без нетронутых по stat."""
+        keep = [position for position, path in enumerate(files) if self.needs_read(path, stamps[position])]
+        return [files[p] for p in keep], [bases[p] for p in keep], [stamps[p] for p in keep]
+
+    def record(self, block: FileBlock, stamp: Tuple[int, int], relative_path: Union[Path, str]) -> Optional[str]:
+        """Запомнить прочитанный блок; вернуть текст для вывода (None - содержимое не изменилось)."""
+        digest = block.digest or content_hash(block.text)
+        self.entries[block.path] = FileSnapshot(stamp[0], stamp[1], digest, block.text if len(block.text) <= SNAPSHOT_CONTENT_MAX_CHARS else None)
+        previous = self.previous.get(block.path)
+        if not self.active: return block.text
+        if previous is None:
+            self.added += 1
+            return block.text
+        if previous.digest == digest:
+            self.unchanged += 1
+            return None
+        self.modified += 1
+        if self.mode == DELTA_DIFF and previous.block is not None: return format_diff_block(relative_path, previous.block, block.text)
+        return block.text
+
+    def deleted(self, is_selected, current: AbstractSet[Path]) -> List[Path]:
+        """Файлы прошлого снимка внутри выбора, которых больше нет на диске (запоминаются для снимка)."""
+        if not self.active: return []
+        gone = [path for path in sorted(self.previous, key=lambda p: p.parts) if (path not in current or path in self._vanished) and is_selected(path) and not path.exists()]
+        self.removed.extend(gone)
+        return gone
+
+    def summary(self) -> str:
+        if not self.active: return ""
+        return f"новых: {self.added} · изменено: {self.modified} · удалено: {len(self.removed)} · без изменений: {self.unchanged}"
+
+    def for_root(self, root: Path) -> Tuple[Dict[Path, FileSnapshot], List[Path]]:
+        """Изменения снимка, относящиеся к одному корню."""
+        return ({path: entry for path, entry in self.entries.items() if path.is_relative_to(root)},
+                [path for path in self.removed if path.is_relative_to(root)])
+
+
+def format_delta_note(tracker: DeltaTracker) -> str:
+    """Сводка режима изменений в конце результата (пустая строка - режим выключен)."""
+    if not tracker.active: return ""
+    if not (tracker.added or tracker.modified or tracker.removed): return "[С ПОСЛЕДНЕГО КОПИРОВАНИЯ ИЗМЕНЕНИЙ НЕТ]\n\n"
+    return f"[ИЗМЕНЕНИЯ С ПОСЛЕДНЕГО КОПИРОВАНИЯ: {tracker.summary()}]\n\n"
+
+
+def merge_snapshots(snapshots: Iterable[Mapping[Path, FileSnapshot]]) -> Dict[Path, FileSnapshot]:
+    merged: Dict[Path, FileSnapshot] = {}
+    for snapshot in snapshots: merged.update(snapshot)
+    return merged
@@ -0,0 +1,190 @@
+# --- Фильтр дерева: индекс имён, уточнение результата, debounce и отмена устаревших запросов ---
+import time
+import logging
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Set
+
+from .content_search import ContentSearch
+from .perf import profiler
+from .tree_index import TreeIndex, ROOT_ID, KIND_DELETED
+
+FILTER_DEBOUNCE_SECONDS = 0.15
+_CANCEL_CHECK_EVERY = 4096 # Как часто (в элементах) рабочий поток проверяет, не устарел ли запрос
+_RESULT_MEMO_SIZE = 8
+
+
+class FilterCancelled(Exception):
+    """Запрос фильтра вытеснен более новым нажатием клавиши."""
+
+
+class NameIndex:
+    """Lowercase-имена узлов TreeIndex и триграммный индекс по ним."""
+
+    def __init__(self, index: TreeIndex):
+        # Удалённые узлы получают пустое имя и не совпадают ни с одним запросом
+        self.lower_names: List[str] = [name.lower() if kind != KIND_DELETED else "" for name, kind in zip(index.names, index.kinds)]
+        self._trigrams: Optional[Dict[str, List[int]]] = None
+        self._lock = threading.Lock()
+
+    def _get_trigrams(self) -> Dict[str, List[int]]:
+        # Строится лениво при первом запросе длиной от 3 символов (в рабочем потоке фильтра)
+        with self._lock:
+            if self._trigrams is None:
+                started = time.perf_counter()
+                trigrams: Dict[str, List[int]] = {}
+                for node_id, name in enumerate(self.lower_names):
+                    if node_id == ROOT_ID: continue
+                    for gram in {name[i:i + 3] for i in range(len(name) - 2)}:
+                        trigrams.setdefault(gram, []).append(node_id)
+                self._trigrams = trigrams
+                logging.info(f"Name trigram index built: {len(trigrams)} grams in {time.perf_counter() - started:.3f}s")
+            return self._trigrams
+
+    def candidates(self, query: str) -> List[int]:
+        """Узлы, которые могут содержать query: пересечение списков триграмм (или все узлы для коротких запросов)."""
+        if len(query) < 3: return list(range(1, len(self.lower_names)))
+        trigrams = self._get_trigrams()
+        postings = []
+        for gram in {query[i:i + 3] for i in range(len(query) - 2)}:
+            posting = trigrams.get(gram)
+            if not posting: return []
+            postings.append(posting)
+        postings.sort(key=len)
+        result = postings[0]
+        for posting in postings[1:]:
+            posting_set = set(posting)
+            result = [node_id for node_id in result if node_id in posting_set]
+            if not result: break
+        return result
+
+
+class FilterEngine:
+    """Асинхронный фильтр дерева.
+
+    submit() вызывается на каждое нажатие клавиши: запросы склеиваются по таймеру (debounce),
+    вычисление видимого множества (совпадения + предки) идёт в фоновом потоке, а более новый
+    запрос отменяет устаревший. Если новый запрос сужает предыдущий ("ma" -> "mai"),
+    уточняется предыдущий список совпадений, а не весь индекс. В режиме поиска по содержимому
+    (set_content_mode) совпадения - файлы, в которых встречается запрос (ContentSearch).
+    """
+
+    def __init__(
+        self, on_result: Callable[[str, Optional[Set[int]]], None], debounce: float = FILTER_DEBOUNCE_SECONDS,
+        content_search: Optional[ContentSearch] = None,
+    ):
+        self.on_result = on_result
+        self.debounce = debounce
+        self.content_search = content_search or ContentSearch()
+        self.content_mode = False
+        self._index: Optional[TreeIndex] = None
+        self._names: Optional[NameIndex] = None
+        self._generation = 0
+        self._timer: Optional[threading.Timer] = None
+        self._lock = threading.Lock()
+        self._last_query = ""
+        self._last_matches: Optional[List[int]] = None
+        self._memo: "OrderedDict[str, List[int]]" = OrderedDict()
+
+    def set_index(self, index: Optional[TreeIndex]):
+        """Новый индекс (выбор директории, обновление) - сбрасывает всё вычисленное ранее."""
+        with self._lock:
+            self._generation += 1
+            if self._timer: self._timer.cancel(); self._timer = None
+            self._index = index
+            self._names = NameIndex(index) if index is not None else None
+            self._last_query = ""; self._last_matches = None
+            self._memo.clear()
+
+    def set_content_mode(self, enabled: bool):
+        """Переключить поиск по именам / по содержимому; вычисленное в другом режиме не переиспользуется."""
+        with self._lock:
+            self._generation += 1
+            if self._timer: self._timer.cancel(); self._timer = None
+            self.content_mode = enabled
+            self._last_query = ""; self._last_matches = None
+            self._memo.clear()
+
+    def submit(self, query: str):
+        """Поставить запрос в очередь с debounce; предыдущий таймер и вычисление становятся устаревшими."""
+        with self._lock:
+            self._generation += 1
+            generation = self._generation
+            if self._timer: self._timer.cancel()
+            self._timer = threading.Timer(self.debounce, self._run, args=(query, generation))
+            self._timer.daemon = True
+            self._timer.start()
+
+    def cancel(self):
+        with self._lock:
+            self._generation += 1
+            if self._timer: self._timer.cancel(); self._timer = None
+
+    def compute(self, query: str) -> Optional[Set[int]]:
+        """Синхронное вычисление видимого множества (None - видно всё)."""
+        return self._compute(query, None)
+
+    def _check(self, generation: Optional[int]):
+        if generation is not None and generation != self._generation: raise FilterCancelled()
+
+    def _run(self, query: str, generation: int):
+        try:
+            visible_ids = self._compute(query, generation)
+        except FilterCancelled:
+            logging.debug(f"Filter '{query}' superseded")
+            return
+        except Exception as filter_err:
+            logging.error(f"Error computing filter '{query}': {filter_err}")
+            return
+        if generation != self._generation: return
+        self.on_result(query, visible_ids)
+
+    def _compute(self, query: str, generation: Optional[int]) -> Optional[Set[int]]:
+        index, names = self._index, self._names
+        if not query or index is None or names is None: return None if index is not None else set()
+        with profiler.span("filter") as span:
+            if self.content_mode: visible_ids = self._compute_content(query, generation, index)
+            else: visible_ids = self._compute_visible(query, generation, index, names)
+            span.set(query_length=len(query), visible=len(visible_ids), content=int(self.content_mode))
+        return visible_ids
+
+    def _compute_content(self, query: str, generation: Optional[int], index: TreeIndex) -> Set[int]:
+        # Содержимое файлов меняется без смены индекса, поэтому результаты не запоминаются
+        started = time.perf_counter()
+        matches = self.content_search.search(index, query, check=lambda: self._check(generation))
+        visible_ids = self._with_ancestors(matches, generation, index)
+        logging.info(f"Content search '{query}': {len(matches)} files, {len(visible_ids)} visible in {time.perf_counter() - started:.3f}s")
+        return visible_ids
+
+    def _with_ancestors(self, matches: List[int], generation: Optional[int], index: TreeIndex) -> Set[int]:
+        visible_ids: Set[int] = set()
+        parents = index.parents
+        for n, node_id in enumerate(matches):
+            if n % _CANCEL_CHECK_EVERY == 0: self._check(generation)
+            while node_id != -1 and node_id not in visible_ids:
+                visible_ids.add(node_id)
+                node_id = parents[node_id]
+        self._check(generation)
+        return visible_ids
+
+    def _compute_visible(self, query: str, generation: Optional[int], index: TreeIndex, names: NameIndex) -> Set[int]:
+        started = time.perf_counter()
+        matches = self._memo.get(query)
+        if matches is None:
+            if self._last_matches is not None and self._last_query and self._last_query in query:
+                source = self._last_matches # Уточнение: новый запрос сужает предыдущий
+            else:
+                source = names.candidates(query)
+            lower_names = names.lower_names
+            matches = []
+            for n, node_id in enumerate(source):
+                if n % _CANCEL_CHECK_EVERY == 0: self._check(generation)
+                if query in lower_names[node_id]: matches.append(node_id)
+        visible_ids = self._with_ancestors(matches, generation, index)
+        with self._lock:
+            self._last_query, self._last_matches = query, matches
+            self._memo[query] = matches
+            self._memo.move_to_end(query)
+            while len(self._memo) > _RESULT_MEMO_SIZE: self._memo.popitem(last=False)
+        logging.info(f"Filter '{query}': {len(matches)} matches, {len(visible_ids)} visible in {time.perf_counter() - started:.3f}s")
+        return visible_ids
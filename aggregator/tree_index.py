@@ -0,0 +1,295 @@
+# --- Компактный индекс дерева проекта в памяти ---
+import os
+import time
+import logging
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, AbstractSet
+
+from .classify import is_likely_text_file
+from .constants import IGNORE_DIRS
+from .ignore_rules import IgnoreRules
+from .perf import profiler
+from .scan_control import CancelToken
+from .walker import walk_tree, is_pruned_dir_name
+
+KIND_FILE = 0
+KIND_DIR = 1
+KIND_DELETED = -1 # Узел удалён инкрементальным обновлением; id не переиспользуются
+
+ROOT_ID = 0
+
+NodeRow = Tuple[int, int, str, int, int, int, Optional[bool]] # (id, id родителя, имя, тип, размер, mtime_ns, текст ли)
+
+
+class TreeIndex:
+    """Индекс выбранной директории, построенный одним проходом walk_tree.
+
+    Узлы хранятся в параллельных массивах (id = позиция): имя, id родителя, тип,
+    размер, mtime_ns и заранее отсортированные дети (папки первыми, затем по имени).
+    Все запросы дерева, фильтра и сканирования идут в индекс, а не на диск.
+    Решение классификатора текст/бинарный запоминается в узле файла при первом запросе (is_text).
+
+    Размер и mtime файлов - подсказка, а не ключ свежести: они обновляются при обходе, при
+    перечитывании изменившейся папки (refresh_dir, revalidate) и от наблюдателя. Правка файла
+    на месте mtime папки не меняет, поэтому без наблюдателя его stat в индексе может отставать;
+    там, где важна свежесть содержимого (чтение, снимок, кэш поиска), нужен собственный os.stat.
+    """
+    __slots__ = ("root", "rules", "names", "parents", "kinds", "sizes", "mtimes", "texts", "children", "_paths", "_ids_by_path")
+
+    def __init__(self, root: Path, rules: Optional[IgnoreRules] = None):
+        self.root = root
+        self.rules = rules # .gitignore и правила проекта; None - только встроенный IGNORE_DIRS
+        self.names: List[str] = [root.name or str(root)]
+        self.parents: List[int] = [-1]
+        self.kinds: List[int] = [KIND_DIR]
+        self.sizes: List[int] = [0]
+        self.mtimes: List[int] = [0]
+        self.texts: List[Optional[bool]] = [None] # None - файл ещё не классифицирован (или его stat изменился)
+        self.children: List[Optional[List[int]]] = [[]]
+        self._paths: List[Path] = [root]
+        self._ids_by_path: Optional[Dict[Path, int]] = None
+
+    @classmethod
+    def build(cls, root: Path, ignore_dirs: AbstractSet[str] = IGNORE_DIRS, use_ignore_files: bool = True) -> "TreeIndex":
+        started = time.perf_counter()
+        index = cls(root, IgnoreRules(root) if use_ignore_files else None)
+        with profiler.span("tree_build") as span:
+            try:
+                root_stat = root.stat()
+                index.mtimes[ROOT_ID] = root_stat.st_mtime_ns
+            except OSError: pass
+            index._populate(ROOT_ID, root, ignore_dirs)
+            span.set(nodes=len(index))
+        logging.info(f"Tree index built for {root}: {len(index)} nodes in {time.perf_counter() - started:.3f}s")
+        return index
+
+    @classmethod
+    def from_rows(cls, root: Path, rows: Iterable[NodeRow], rules: Optional[IgnoreRules] = None) -> "TreeIndex":
+        """Индекс из строк export_rows (например, из сохранённого кэша); дети уже идут в порядке отображения."""
+        index = cls(root, rules)
+        paths = index._paths
+        for node_id, parent_id, name, kind, size, mtime_ns, is_text in rows:
+            if node_id == ROOT_ID:
+                index.mtimes[ROOT_ID] = mtime_ns
+                continue
+            new_id = index._append(paths[parent_id] / name, name, parent_id, kind)
+            index.sizes[new_id] = size; index.mtimes[new_id] = mtime_ns
+            index.texts[new_id] = None if is_text is None else bool(is_text)
+        return index
+
+    def export_rows(self) -> Iterator[NodeRow]:
+        """Живые узлы в порядке отображения с уплотнёнными id (удалённые узлы не попадают)."""
+        new_ids = {ROOT_ID: ROOT_ID}
+        yield (ROOT_ID, -1, self.names[ROOT_ID], KIND_DIR, 0, self.mtimes[ROOT_ID], None)
+        for node_id in self.iter_subtree(ROOT_ID):
+            new_id = new_ids[node_id] = len(new_ids)
+            yield (new_id, new_ids[self.parents[node_id]], self.names[node_id], self.kinds[node_id], self.sizes[node_id], self.mtimes[node_id], self.texts[node_id])
+
+    def _populate(self, dir_id: int, dir_path: Path, ignore_dirs: AbstractSet[str]):
+        """Добавить в индекс всё поддерево dir_path (одним проходом walk_tree) и отсортировать детей."""
+        first_new_id = len(self.names)
+        dir_ids: Dict[str, int] = {str(dir_path): dir_id}
+        for item in walk_tree(dir_path, ignore_dirs, rules=self.rules):
+            parent_id = dir_ids.get(os.path.dirname(item.entry.path))
+            if parent_id is None: continue # Родитель отсечён (не должно случаться при обходе сверху вниз)
+            node_id = self._append(item.path, item.entry.name, parent_id, KIND_DIR if item.is_dir else KIND_FILE)
+            self._set_stat(node_id, item.entry)
+            if item.is_dir: dir_ids[item.entry.path] = node_id
+        for node_id in (dir_id, *range(first_new_id, len(self.names))):
+            child_ids = self.children[node_id]
+            if child_ids: self._sort_children(child_ids)
+
+    def _append(self, path: Path, name: str, parent_id: int, kind: int, attach: bool = True) -> int:
+        node_id = len(self.names)
+        self.names.append(name)
+        self.parents.append(parent_id)
+        self.kinds.append(kind)
+        self.sizes.append(0)
+        self.mtimes.append(0)
+        self.texts.append(None)
+        self.children.append([] if kind == KIND_DIR else None)
+        self._paths.append(path)
+        if attach: self.children[parent_id].append(node_id)
+        if self._ids_by_path is not None: self._ids_by_path[path] = node_id
+        return node_id
+
+    def _set_stat(self, node_id: int, entry: os.DirEntry):
+        try:
+            st = entry.stat()
+            self._update_stamp(node_id, 0 if self.kinds[node_id] == KIND_DIR else st.st_size, st.st_mtime_ns)
+        except OSError: pass
+
+    def _update_stamp(self, node_id: int, size: int, mtime_ns: int):
+        if (self.sizes[node_id], self.mtimes[node_id]) != (size, mtime_ns): self.texts[node_id] = None # Файл изменился - классифицировать заново
+        self.sizes[node_id] = size; self.mtimes[node_id] = mtime_ns
+
+    def _sort_children(self, child_ids: List[int]):
+        child_ids.sort(key=lambda i: (self.kinds[i] != KIND_DIR, self.names[i].lower()))
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    # --- Запросы ---
+    def id_of(self, path: Path) -> Optional[int]:
+        if self._ids_by_path is None:
+            kinds = self.kinds
+            self._ids_by_path = {p: i for i, p in enumerate(self._paths) if kinds[i] != KIND_DELETED}
+        return self._ids_by_path.get(path)
+
+    def is_alive(self, node_id: int) -> bool:
+        return self.kinds[node_id] != KIND_DELETED
+
+    def iter_alive(self) -> Iterator[int]:
+        kinds = self.kinds
+        return (node_id for node_id in range(len(kinds)) if kinds[node_id] != KIND_DELETED)
+
+    def path_of(self, node_id: int) -> Path:
+        return self._paths[node_id]
+
+    def is_dir(self, node_id: int) -> bool:
+        return self.kinds[node_id] == KIND_DIR
+
+    def is_text(self, node_id: int) -> bool:
+        """Похож ли файл на текстовый: классификатор вызывается один раз, дальше ответ берётся из узла без stat."""
+        is_text = self.texts[node_id]
+        if is_text is None: is_text = self.texts[node_id] = is_likely_text_file(self._paths[node_id])
+        return is_text
+
+    def children_of(self, node_id: int) -> List[int]:
+        return self.children[node_id] or []
+
+    def iter_ancestors(self, node_id: int) -> Iterator[int]:
+        """Предки узла от ближайшего к корню (сам узел не включается)."""
+        parent_id = self.parents[node_id]
+        while parent_id != -1:
+            yield parent_id
+            parent_id = self.parents[parent_id]
+
+    def iter_subtree(self, node_id: int, skip: AbstractSet[Path] = frozenset()) -> Iterator[int]:
+        """Узлы поддерева в порядке отображения (без самого node_id); пути из skip пропускаются вместе с поддеревьями."""
+        paths = self._paths
+        stack = [child_id for child_id in reversed(self.children_of(node_id)) if not skip or paths[child_id] not in skip]
+        while stack:
+            current = stack.pop()
+            yield current
+            child_ids = self.children[current]
+            if child_ids: stack.extend(child_id for child_id in reversed(child_ids) if not skip or paths[child_id] not in skip)
+
+    def iter_files(self, node_id: int, skip: AbstractSet[Path] = frozenset()) -> Iterator[int]:
+        for current in self.iter_subtree(node_id, skip):
+            if self.kinds[current] != KIND_DIR: yield current
+
+    def flatten(self, visible_ids: Optional[AbstractSet[int]], expanded_ids: AbstractSet[int]) -> List[Tuple[int, int]]:
+        """Плоский список видимых строк дерева (id, глубина) в порядке отображения.
+
+        visible_ids=None - видны все узлы; в детей спускаемся только у развёрнутых папок.
+        """
+        rows: List[Tuple[int, int]] = []
+        stack = [(child_id, 0) for child_id in reversed(self.children_of(ROOT_ID)) if visible_ids is None or child_id in visible_ids]
+        while stack:
+            node_id, depth = stack.pop()
+            rows.append((node_id, depth))
+            if node_id in expanded_ids and self.children[node_id]:
+                stack.extend((child_id, depth + 1) for child_id in reversed(self.children[node_id]) if visible_ids is None or child_id in visible_ids)
+        return rows
+
+    # --- Инкрементальные обновления (наблюдатель за файловой системой) ---
+    def refresh_dir(self, dir_path: Path, ignore_dirs: AbstractSet[str] = IGNORE_DIRS) -> Tuple[List[Path], List[Path]]:
+        """Перечитать состав одной папки (без рекурсии по уже известным подпапкам).
+
+        Новые папки индексируются целиком, исчезнувшие узлы помечаются удалёнными вместе
+        с поддеревом. Возвращает (добавленные пути, удалённые пути, включая потомков).
+        """
+        dir_id = self.id_of(dir_path)
+        if dir_id is None or self.kinds[dir_id] != KIND_DIR: return [], []
+        try:
+            with os.scandir(dir_path) as it: entries = list(it)
+            self.mtimes[dir_id] = dir_path.stat().st_mtime_ns
+        except OSError:
+            return [], [] # Папка исчезла - её удалит обновление родителя
+        scope = self.rules.scope_for(dir_path) if self.rules is not None else None
+        existing = {self.names[child_id]: child_id for child_id in self.children_of(dir_id)}
+        new_children: List[int] = []
+        added: List[Path] = []
+        removed: List[Path] = []
+        for entry in entries:
+            try:
+                is_dir = entry.is_dir()
+            except OSError:
+                is_dir = False
+            if is_dir and is_pruned_dir_name(entry.name, ignore_dirs): continue
+            if scope is not None and scope.is_ignored(entry.path, entry.name, is_dir): continue
+            kind = KIND_DIR if is_dir else KIND_FILE
+            child_id = existing.pop(entry.name, None)
+            if child_id is not None and self.kinds[child_id] == kind:
+                self._set_stat(child_id, entry)
+                new_children.append(child_id)
+                continue
+            if child_id is not None: removed.extend(self._detach(child_id)) # Файл стал папкой или наоборот
+            child_path = Path(entry.path)
+            child_id = self._append(child_path, entry.name, dir_id, kind, attach=False)
+            self._set_stat(child_id, entry)
+            new_children.append(child_id)
+            added.append(child_path)
+            if is_dir and not entry.is_symlink():
+                first_new_id = len(self.names)
+                self._populate(child_id, child_path, ignore_dirs)
+                added.extend(self._paths[first_new_id:])
+        for child_id in existing.values(): removed.extend(self._detach(child_id))
+        self._sort_children(new_children)
+        self.children[dir_id] = new_children # Замена целиком: читатели в других потоках видят старый или новый список
+        return added, removed
+
+    def revalidate(self, token: Optional[CancelToken] = None) -> Tuple[List[Path], List[Path]]:
+        """Сверить индекс (например, загруженный из кэша) с диском по mtime папок.
+
+        mtime папки меняется при добавлении, удалении и переименовании элементов, поэтому
+        перечитываются только изменившиеся папки (новые подпапки - целиком, у остальных файлов
+        обновляется stat), а остальное дерево обходится одним stat на папку. Файлы, изменённые
+        на месте в неизменившихся папках, сохраняют прежний stat (см. описание класса).
+        Возвращает (добавленные, удалённые) пути.
+        """
+        started = time.perf_counter()
+        added: List[Path] = []; removed: List[Path] = []
+        dirs_checked = dirs_changed = 0
+        stack = [ROOT_ID]
+        while stack:
+            if token is not None: token.check()
+            dir_id = stack.pop()
+            if self.kinds[dir_id] != KIND_DIR: continue # Удалена обновлением родителя
+            dir_path = self._paths[dir_id]
+            dirs_checked += 1
+            try:
+                mtime_ns = os.stat(dir_path).st_mtime_ns
+            except OSError:
+                mtime_ns = None # Исчезла - её уберёт обновление родителя
+            if mtime_ns is not None and mtime_ns != self.mtimes[dir_id]:
+                dirs_changed += 1
+                known_children = set(self.children_of(dir_id))
+                dir_added, dir_removed = self.refresh_dir(dir_path)
+                added.extend(dir_added); removed.extend(dir_removed)
+                # Новые подпапки уже проиндексированы целиком, проверять их не нужно
+                stack.extend(child_id for child_id in self.children_of(dir_id) if child_id in known_children and self.kinds[child_id] == KIND_DIR)
+            else:
+                stack.extend(child_id for child_id in self.children_of(dir_id) if self.kinds[child_id] == KIND_DIR)
+        logging.info(f"Tree index revalidated: {dirs_changed}/{dirs_checked} dirs changed, +{len(added)} -{len(removed)} in {time.perf_counter() - started:.3f}s")
+        return added, removed
+
+    def refresh_stat(self, path: Path) -> bool:
+        """Обновить размер и mtime файла. False, если узла нет или файл недоступен."""
+        node_id = self.id_of(path)
+        if node_id is None: return False
+        try:
+            st = path.stat()
+        except OSError:
+            return False
+        self._update_stamp(node_id, st.st_size if self.kinds[node_id] != KIND_DIR else self.sizes[node_id], st.st_mtime_ns)
+        return True
+
+    def _detach(self, node_id: int) -> List[Path]:
+        removed_ids = [node_id, *self.iter_subtree(node_id)]
+        for removed_id in removed_ids:
+            self.kinds[removed_id] = KIND_DELETED
+            self.children[removed_id] = None
+            if self._ids_by_path is not None: self._ids_by_path.pop(self._paths[removed_id], None)
+        return [self._paths[removed_id] for removed_id in removed_ids]
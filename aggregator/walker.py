@@ -0,0 +1,99 @@
+# --- Обход директорий на os.scandir с отсечением игнорируемых веток ---
+import os
+import logging
+from pathlib import Path
+from typing import Iterator, NamedTuple, Optional, AbstractSet
+
+from .constants import IGNORE_DIRS
+from .ignore_rules import IgnoreRules
+from .scan_control import CancelToken
+
+
+class WalkEntry(NamedTuple):
+    """Элемент обхода: путь, тип (из DirEntry, без повторного stat) и глубина от корня."""
+    path: Path
+    is_dir: bool
+    depth: int
+    entry: os.DirEntry
+
+
+def is_pruned_dir_name(name: str, ignore_dirs: AbstractSet[str] = IGNORE_DIRS) -> bool:
+    """Папка скрытая или из списка игнорируемых - в неё не спускаемся."""
+    return name.startswith('.') or name.lower() in ignore_dirs
+
+
+def is_ignored_path(path: Path, base_path: Optional[Path], ignore_dirs: AbstractSet[str] = IGNORE_DIRS) -> bool:
+    """Лежит ли путь внутри отсекаемой папки (та же политика, что у walk_tree, без обращений к диску).
+
+    Проверяются только папки-предки относительно base_path, сам элемент - нет.
+    """
+    if base_path is None: return False
+    try:
+        relative_parts = path.relative_to(base_path).parts
+    except ValueError:
+        return False
+    return any(is_pruned_dir_name(part, ignore_dirs) for part in relative_parts[:-1])
+
+
+def walk_tree(
+    root: Path, ignore_dirs: AbstractSet[str] = IGNORE_DIRS, token: Optional[CancelToken] = None,
+    rules: Optional[IgnoreRules] = None, skip: AbstractSet[str] = frozenset(),
+) -> Iterator[WalkEntry]:
+    """Однопроходный обход дерева: игнорируемые и скрытые папки отсекаются до спуска в них.
+
+    Тип элемента берётся из DirEntry (обычно без отдельного stat). Символические ссылки
+    на папки отдаются как папки, но внутрь них обход не идёт (как у Path.rglob).
+    С token обход прерывается ScanCancelled перед чтением очередной папки.
+    С rules дополнительно применяются .gitignore и файл правил проекта: исключённые
+    файлы не отдаются, в исключённые папки обход не спускается.
+    Пути из skip (строки, как DirEntry.path) пропускаются вместе с поддеревьями.
+    Порядок детерминирован и совпадает с деревом GUI: папка, затем её содержимое,
+    внутри папки - сначала подпапки, потом файлы, по имени без учёта регистра.
+    """
+    def scan(current_dir: Path, depth: int, parent_scope):
+        """Элементы папки после отсечения в порядке дерева GUI: папки, затем файлы, по имени без учёта регистра."""
+        if token is not None: token.check()
+        try:
+            with os.scandir(current_dir) as it:
+                entries = list(it)
+        except PermissionError:
+            logging.warning(f"Permission denied while walking: {current_dir}")
+            return iter(()), depth + 1, parent_scope
+        except OSError as walk_err:
+            logging.warning(f"Error walking {current_dir}: {walk_err}")
+            return iter(()), depth + 1, parent_scope
+        scope = rules.enter(str(current_dir), entries, parent_scope) if rules is not None else None
+        items = []
+        for entry in entries:
+            try:
+                is_dir = entry.is_dir()
+            except OSError:
+                is_dir = False
+            if is_dir and is_pruned_dir_name(entry.name, ignore_dirs): continue
+            if scope is not None and scope.is_ignored(entry.path, entry.name, is_dir): continue
+            if skip and entry.path in skip: continue
+            items.append((entry, is_dir))
+        items.sort(key=lambda item: (not item[1], item[0].name.lower())) # Ключ TreeIndex._sort_children
+        return iter(items), depth + 1, scope
+
+    # Обход в глубину с выдачей папки перед её содержимым - тот же порядок, что у TreeIndex.iter_subtree
+    stack = [scan(root, 0, rules.scope_for(root, include_self=False) if rules is not None else None)]
+    while stack:
+        items, depth, scope = stack[-1]
+        item = next(items, None)
+        if item is None:
+            stack.pop()
+            continue
+        entry, is_dir = item
+        entry_path = Path(entry.path)
+        yield WalkEntry(entry_path, is_dir, depth, entry)
+        if is_dir and not entry.is_symlink(): stack.append(scan(entry_path, depth, scope))
+
+
+def iter_files(
+    root: Path, ignore_dirs: AbstractSet[str] = IGNORE_DIRS, token: Optional[CancelToken] = None,
+    rules: Optional[IgnoreRules] = None, skip: AbstractSet[str] = frozenset(),
+) -> Iterator[WalkEntry]:
+    """Только файлы из walk_tree."""
+    for item in walk_tree(root, ignore_dirs, token, rules, skip):
+        if not item.is_dir: yield item
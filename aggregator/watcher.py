@@ -0,0 +1,215 @@
+# --- Наблюдение за файловой системой: inotify (Linux) с запасным вариантом на опросе ---
+import os
+import sys
+import time
+import errno
+import select
+import struct
+import logging
+import threading
+import ctypes
+import ctypes.util
+from pathlib import Path
+from typing import AbstractSet, Callable, Dict, NamedTuple, Optional, Set, Tuple
+
+from .constants import IGNORE_DIRS
+from .ignore_rules import IgnoreRules
+from .walker import walk_tree, is_pruned_dir_name
+
+WATCH_DEBOUNCE_SECONDS = 0.5 # Тишина, после которой накопленные события отдаются пачкой
+WATCH_MAX_LATENCY_SECONDS = 2.0 # При непрерывном потоке событий пачка отдаётся не реже этого
+POLL_INTERVAL_SECONDS = 2.0
+
+# Константы inotify из <sys/inotify.h>
+_IN_MODIFY = 0x00000002
+_IN_ATTRIB = 0x00000004
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_FROM = 0x00000040
+_IN_MOVED_TO = 0x00000080
+_IN_CREATE = 0x00000100
+_IN_DELETE = 0x00000200
+_IN_DELETE_SELF = 0x00000400
+_IN_MOVE_SELF = 0x00000800
+_IN_Q_OVERFLOW = 0x00004000
+_IN_IGNORED = 0x00008000
+_IN_ONLYDIR = 0x01000000
+_IN_ISDIR = 0x40000000
+_IN_NONBLOCK = 0o4000
+_IN_CLOEXEC = 0o2000000
+_WATCH_MASK = (_IN_MODIFY | _IN_ATTRIB | _IN_CLOSE_WRITE | _IN_MOVED_FROM | _IN_MOVED_TO
+               | _IN_CREATE | _IN_DELETE | _IN_DELETE_SELF | _IN_MOVE_SELF | _IN_ONLYDIR)
+_STRUCTURE_EVENTS = _IN_CREATE | _IN_DELETE | _IN_MOVED_FROM | _IN_MOVED_TO
+_EVENT_HEADER = struct.Struct("iIII")
+
+
+class ChangeBatch(NamedTuple):
+    """Накопленные изменения за одно окно debounce."""
+    dirs: Set[Path] # Папки, у которых изменился состав
+    files: Set[Path] # Файлы с изменённым содержимым или метаданными
+    overflow: bool # События потеряны (переполнение очереди) - нужен полный пересчёт
+
+
+class FsWatcher:
+    """Фоновый наблюдатель за деревом root.
+
+    На Linux использует inotify (через ctypes, без внешних зависимостей) с подпиской на
+    каждую неотсечённую папку; если inotify недоступен или закончился лимит подписок -
+    периодически сравнивает снимки (mtime_ns, размер). События склеиваются и отдаются
+    в on_changes пачками из фонового потока.
+    """
+
+    def __init__(
+        self, root: Path, on_changes: Callable[[ChangeBatch], None],
+        ignore_dirs: AbstractSet[str] = IGNORE_DIRS, debounce: float = WATCH_DEBOUNCE_SECONDS,
+        poll_interval: float = POLL_INTERVAL_SECONDS, use_inotify: bool = True, rules: Optional[IgnoreRules] = None,
+    ):
+        self.root = root
+        self.on_changes = on_changes
+        self.ignore_dirs = ignore_dirs
+        self.rules = rules # Исключённые .gitignore папки не отслеживаются
+        self.debounce = debounce
+        self.poll_interval = poll_interval
+        self.use_inotify = use_inotify and sys.platform.startswith("linux")
+        self.backend = ""
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._pending_dirs: Set[Path] = set()
+        self._pending_files: Set[Path] = set()
+        self._pending_overflow = False
+        self._first_pending = 0.0
+        self._last_event = 0.0
+
+    def start(self):
+        if self._thread is not None: return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="fs-watcher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread = None
+
+    # --- Накопление и отдача пачек ---
+    def _note(self, dirs=(), files=(), overflow: bool = False):
+        now = time.monotonic()
+        if not (self._pending_dirs or self._pending_files or self._pending_overflow): self._first_pending = now
+        self._pending_dirs.update(dirs)
+        self._pending_files.update(files)
+        self._pending_overflow = self._pending_overflow or overflow
+        self._last_event = now
+
+    def _maybe_flush(self):
+        if not (self._pending_dirs or self._pending_files or self._pending_overflow): return
+        now = time.monotonic()
+        if now - self._last_event < self.debounce and now - self._first_pending < WATCH_MAX_LATENCY_SECONDS: return
+        batch = ChangeBatch(self._pending_dirs, self._pending_files - self._pending_dirs, self._pending_overflow)
+        self._pending_dirs, self._pending_files, self._pending_overflow = set(), set(), False
+        logging.info(f"FS changes: {len(batch.dirs)} dirs, {len(batch.files)} files{' (overflow)' if batch.overflow else ''}")
+        try:
+            self.on_changes(batch)
+        except Exception as callback_err:
+            logging.error(f"Error applying FS changes: {callback_err}")
+
+    def _run(self):
+        if self.use_inotify:
+            try:
+                self._run_inotify()
+                return
+            except OSError as inotify_err:
+                logging.warning(f"inotify unavailable ({inotify_err}), falling back to polling")
+        self._run_polling()
+
+    # --- inotify ---
+    def _run_inotify(self):
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        fd = libc.inotify_init1(_IN_NONBLOCK | _IN_CLOEXEC)
+        if fd < 0: raise OSError(ctypes.get_errno(), os.strerror(ctypes.get_errno()))
+        watches: Dict[int, Path] = {}
+
+        def add_watch(dir_path: Path):
+            wd = libc.inotify_add_watch(fd, os.fsencode(dir_path), _WATCH_MASK)
+            if wd < 0:
+                err = ctypes.get_errno()
+                if err == errno.ENOSPC: raise OSError(err, "inotify watch limit reached (fs.inotify.max_user_watches)")
+                return # Папка успела исчезнуть или нет прав - пропускаем
+            watches[wd] = dir_path
+
+        def add_tree(dir_path: Path):
+            add_watch(dir_path)
+            for item in walk_tree(dir_path, self.ignore_dirs, rules=self.rules):
+                if item.is_dir and not item.entry.is_symlink(): add_watch(item.path)
+
+        try:
+            add_tree(self.root)
+            self.backend = "inotify"
+            logging.info(f"Watching {self.root} via inotify ({len(watches)} directories)")
+            while not self._stop.is_set():
+                readable, _, _ = select.select([fd], [], [], self.debounce / 2)
+                if readable:
+                    try:
+                        data = os.read(fd, 64 * 1024)
+                    except BlockingIOError:
+                        data = b""
+                    offset = 0
+                    while offset + _EVENT_HEADER.size <= len(data):
+                        wd, mask, _cookie, name_len = _EVENT_HEADER.unpack_from(data, offset)
+                        raw_name = data[offset + _EVENT_HEADER.size:offset + _EVENT_HEADER.size + name_len].rstrip(b"\0")
+                        offset += _EVENT_HEADER.size + name_len
+                        self._handle_inotify_event(watches, wd, mask, os.fsdecode(raw_name), add_tree)
+                self._maybe_flush()
+        finally:
+            os.close(fd)
+
+    def _handle_inotify_event(self, watches: Dict[int, Path], wd: int, mask: int, name: str, add_tree: Callable[[Path], None]):
+        if mask & _IN_Q_OVERFLOW:
+            self._note(overflow=True)
+            return
+        dir_path = watches.get(wd)
+        if dir_path is None: return
+        if mask & _IN_IGNORED:
+            watches.pop(wd, None)
+            return
+        if mask & (_IN_DELETE_SELF | _IN_MOVE_SELF):
+            self._note(dirs=[dir_path.parent] if dir_path != self.root else [dir_path])
+            return
+        if not name: return
+        item_path = dir_path / name
+        if mask & _STRUCTURE_EVENTS:
+            if mask & _IN_ISDIR and (is_pruned_dir_name(name, self.ignore_dirs) or self.rules is not None and self.rules.is_ignored(item_path, True)): return
+            self._note(dirs=[dir_path])
+            if mask & (_IN_CREATE | _IN_MOVED_TO) and mask & _IN_ISDIR: add_tree(item_path)
+        elif not mask & _IN_ISDIR:
+            self._note(files=[item_path])
+
+    # --- Опрос ---
+    def _snapshot(self) -> Dict[Path, Tuple[int, int, bool]]:
+        snapshot: Dict[Path, Tuple[int, int, bool]] = {}
+        for item in walk_tree(self.root, self.ignore_dirs, rules=self.rules):
+            if self._stop.is_set(): break
+            try:
+                st = item.entry.stat()
+            except OSError:
+                continue
+            snapshot[item.path] = (st.st_mtime_ns, 0 if item.is_dir else st.st_size, item.is_dir)
+        return snapshot
+
+    def _run_polling(self):
+        self.backend = "polling"
+        logging.info(f"Watching {self.root} by polling every {self.poll_interval}s")
+        previous = self._snapshot()
+        while not self._stop.wait(self.poll_interval):
+            current = self._snapshot()
+            if self._stop.is_set(): break
+            dirs: Set[Path] = set(); files: Set[Path] = set()
+            for path in previous.keys() - current.keys(): dirs.add(path.parent)
+            for path in current.keys() - previous.keys(): dirs.add(path.parent)
+            for path, state in current.items():
+                old_state = previous.get(path)
+                if old_state is not None and old_state != state:
+                    if state[2] or old_state[2] != state[2]: dirs.add(path if state[2] == old_state[2] else path.parent)
+                    else: files.add(path)
+            previous = current
+            if dirs or files:
+                self._note(dirs, files)
+                self._last_event = 0.0 # Снимок уже выровнен по интервалу опроса - отдаём сразу
+                self._maybe_flush()
@@ -0,0 +1,65 @@
+# --- Рабочее пространство из нескольких корней: подписи корней и параллельное построение индексов ---
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from .perf import profiler
+from .tree_index import TreeIndex
+
+WORKSPACE_WORKERS = 4 # Корни индексируются и собираются одновременно; чтение файлов - в общем пуле reader
+
+
+def normalize_roots(roots: Iterable[Path]) -> List[Path]:
+    """Абсолютные корни без повторов и без вложенных в другой корень (их файлы попали бы в результат дважды)."""
+    result: List[Path] = []
+    for root in (Path(r).resolve() for r in roots):
+        if root in result or any(root.is_relative_to(other) for other in result): continue
+        result = [other for other in result if not other.is_relative_to(root)] + [root]
+    return result
+
+
+def display_bases(roots: Sequence[Path]) -> Dict[Path, Path]:
+    """База относительных путей в выводе для каждого корня.
+
+    Один корень - он сам (вывод как раньше). Несколько - родитель корня, так что путь в выводе
+    начинается с имени корня; при одинаковых именах база отодвигается к дальним предкам до различия.
+    """
+    if len(roots) == 1: return {roots[0]: roots[0]}
+    depth = {root: 1 for root in roots}
+    while True:
+        groups: Dict[Tuple[str, ...], List[Path]] = {}
+        for root in roots: groups.setdefault(root.parts[-depth[root]:], []).append(root)
+        progressed = False
+        for group in groups.values():
+            if len(group) < 2: continue
+            for root in group:
+                if depth[root] < len(root.parents): depth[root] += 1; progressed = True
+        if not progressed: break
+    return {root: root.parents[depth[root] - 1] for root in roots}
+
+
+def root_labels(roots: Sequence[Path]) -> Dict[Path, str]:
+    """Короткие различимые подписи корней (префиксы путей в выводе)."""
+    bases = display_bases(roots)
+    return {root: str(root.relative_to(bases[root])) if bases[root] != root else root.name or str(root) for root in roots}
+
+
+def root_of(path: Path, roots: Iterable[Path]) -> Optional[Path]:
+    """Корень рабочего пространства, которому принадлежит путь."""
+    for root in roots:
+        if path == root or path.is_relative_to(root): return root
+    return None
+
+
+def build_indexes(
+    roots: Sequence[Path], load: Optional[Callable[[Path], Optional[TreeIndex]]] = None, workers: int = WORKSPACE_WORKERS,
+) -> Dict[Path, Tuple[TreeIndex, bool]]:
+    """Индексы всех корней параллельно: (индекс, загружен ли из кэша). load - попытка взять индекс из кэша."""
+    def open_root(root: Path) -> Tuple[TreeIndex, bool]:
+        index = load(root) if load is not None else None
+        return (index, True) if index is not None else (TreeIndex.build(root), False)
+
+    if len(roots) <= 1 or workers <= 1: return {root: open_root(root) for root in roots}
+    with profiler.span("workspace_index", roots=len(roots)):
+        with ThreadPoolExecutor(max_workers=min(workers, len(roots)), thread_name_prefix="index") as pool:
+            return dict(zip(roots, pool.map(open_root, roots)))
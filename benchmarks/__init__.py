@@ -0,0 +1 @@
+# Бенчмарки агрегатора: генератор синтетических деревьев и замер стадий (python -m benchmarks.run)
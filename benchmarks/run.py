@@ -0,0 +1,229 @@
+# --- Бенчмарк стадий агрегатора на синтетических деревьях ---
+# Запуск: python -m benchmarks.run [-o results.json] [--compare baseline.json] [--scale 0.5]
+# Стадии GUI (populate_tree_view, scan_and_display_content_sync) меряются по их ядру без Flet:
+# построение индекса, фильтр, плоская модель дерева, классификация, сбор и чтение файлов.
+import io
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import builtins
+import platform
+import tempfile
+import threading
+import statistics
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from aggregator import (
+    TreeIndex, ROOT_ID, FilterEngine, ContentCache, walk_tree, collect_files, iter_blocks, write_aggregate,
+    is_likely_text_file, clear_classification_cache, DEFAULT_READ_WORKERS,
+)
+from .synth import LAYOUTS, generate
+
+DEFAULT_REPEAT = 3
+DEFAULT_THRESHOLD = 1.25 # Во сколько раз стадия может замедлиться, прежде чем --compare сочтёт это регрессией
+MIN_REGRESSION_SECONDS = 0.005 # Более мелкие разницы - шум таймера, а не регрессия
+FILTER_QUERIES = ("m", "mod", "mod_1", "test_", "readme", "zzz_no_match")
+
+
+class SyscallCounter:
+    """Считает вызовы stat/scandir/open, подменяя функции модулей os и builtins на время замера.
+
+    DirEntry.stat() и is_dir() реализованы в C и здесь не видны - для них в результат
+    добавляется число системных вызовов чтения из /proc/self/io (syscr), если оно доступно.
+    """
+
+    _TARGETS = ((os, "stat"), (os, "lstat"), (os, "scandir"), (os, "open"), (builtins, "open"), (io, "open"))
+
+    def __init__(self):
+        self.counts: Counter = Counter()
+        self._lock = threading.Lock()
+
+    def _wrap(self, name: str, func: Callable) -> Callable:
+        def counted(*args, **kwargs):
+            with self._lock: self.counts[name] += 1
+            return func(*args, **kwargs)
+        return counted
+
+    @contextmanager
+    def active(self):
+        syscr_before = _read_syscr()
+        originals = [(module, attr, getattr(module, attr)) for module, attr in self._TARGETS]
+        wrappers: Dict[tuple, Callable] = {}
+        for module, attr, func in originals:
+            # builtins.open и io.open - один объект: одна обёртка, один счётчик "open"
+            name = f"os.{attr}" if module is os else "open"
+            key = (name, id(func))
+            if key not in wrappers: wrappers[key] = self._wrap(name, func)
+            setattr(module, attr, wrappers[key])
+        try:
+            yield self
+        finally:
+            for module, attr, func in originals: setattr(module, attr, func)
+            syscr_after = _read_syscr()
+            if syscr_before is not None and syscr_after is not None: self.counts["read_syscalls"] += syscr_after - syscr_before
+
+
+def _read_syscr() -> Optional[int]:
+    try:
+        with open("/proc/self/io", encoding="ascii") as f:
+            for line in f:
+                if line.startswith("syscr:"): return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def measure(func: Callable[[], Any], repeat: int) -> Dict[str, Any]:
+    """Время (лучшее и медиана из repeat прогонов), затем отдельный прогон для счётчиков вызовов и пика памяти."""
+    timings: List[float] = []
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - started)
+    counter = SyscallCounter()
+    tracemalloc.start()
+    try:
+        with counter.active(): func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    stage = {"seconds": min(timings), "median_seconds": statistics.median(timings), "calls": dict(counter.counts), "peak_memory_bytes": peak}
+    if isinstance(result, dict): stage["info"] = result
+    return stage
+
+
+def bench_layout(root: Path, repeat: int, workers: int) -> Dict[str, Dict[str, Any]]:
+    stages: Dict[str, Dict[str, Any]] = {}
+    index = TreeIndex.build(root)
+
+    def walk():
+        entries = sum(1 for _ in walk_tree(root))
+        return {"entries": entries}
+    stages["walk"] = measure(walk, repeat)
+
+    def build_index():
+        built = TreeIndex.build(root)
+        return {"nodes": len(built.names)}
+    stages["index_build"] = measure(build_index, repeat)
+
+    def filter_queries():
+        engine = FilterEngine(on_result=lambda query, ids: None)
+        engine.set_index(index)
+        visible = {query: len(engine.compute(query) or ()) for query in FILTER_QUERIES}
+        return {"visible": visible}
+    stages["filter"] = measure(filter_queries, repeat)
+
+    all_dirs = {node_id for node_id in index.iter_alive() if index.is_dir(node_id)}
+    def flatten():
+        collapsed = index.flatten(None, set())
+        expanded = index.flatten(None, all_dirs)
+        return {"rows_collapsed": len(collapsed), "rows_expanded": len(expanded)}
+    stages["tree_model"] = measure(flatten, repeat)
+
+    candidate_files = [index.path_of(node_id) for node_id in index.iter_files(ROOT_ID)]
+    def classify_cold():
+        clear_classification_cache()
+        return {"files": len(candidate_files), "text": sum(1 for path in candidate_files if is_likely_text_file(path))}
+    stages["classify_cold"] = measure(classify_cold, repeat)
+    stages["classify_warm"] = measure(lambda: {"text": sum(1 for path in candidate_files if is_likely_text_file(path))}, repeat)
+
+    def collect():
+        files, errors = collect_files([root], root, index=index)
+        return {"files": len(files), "errors": len(errors)}
+    stages["collect"] = measure(collect, repeat)
+
+    files, _ = collect_files([root], root, index=index)
+    def read(read_workers: int, cache: Optional[ContentCache] = None):
+        def run():
+            total = 0
+            for block in iter_blocks(files, root, workers=read_workers, cache=cache): total += block.size
+            return {"bytes": total}
+        return run
+    stages["read_sequential"] = measure(read(1), repeat)
+    stages["read_parallel"] = measure(read(workers), repeat)
+    warm_cache = ContentCache()
+    read(workers, warm_cache)()
+    stages["read_cached"] = measure(read(workers, warm_cache), repeat)
+
+    def aggregate():
+        out = io.StringIO()
+        stats = write_aggregate(out, root, [root], "start", "end", workers=workers)
+        return {"files": stats.files, "chars": stats.chars_written}
+    stages["aggregate_cli"] = measure(aggregate, repeat)
+    return stages
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> List[str]:
+    """Стадии, которые стали медленнее baseline более чем в threshold раз."""
+    regressions = []
+    for layout, stages in current["layouts"].items():
+        for stage, data in stages.items():
+            old = baseline.get("layouts", {}).get(layout, {}).get(stage)
+            if not old or old["seconds"] <= 0: continue
+            ratio = data["seconds"] / old["seconds"]
+            regressed = ratio > threshold and data["seconds"] - old["seconds"] > MIN_REGRESSION_SECONDS
+            marker = "  <-- REGRESSION" if regressed else ""
+            print(f"{layout:12} {stage:16} {old['seconds']:9.4f}s -> {data['seconds']:9.4f}s  x{ratio:5.2f}{marker}")
+            if regressed: regressions.append(f"{layout}/{stage}")
+    return regressions
+
+
+def build_arg_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.run", description="Бенчмарк стадий агрегатора на синтетических деревьях.")
+    parser.add_argument("--layouts", nargs="*", choices=sorted(LAYOUTS), default=sorted(LAYOUTS), help="Какие деревья генерировать")
+    parser.add_argument("--scale", type=float, default=1.0, help="Множитель размера деревьев")
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT, help="Число замеров времени на стадию")
+    parser.add_argument("--workers", type=int, default=DEFAULT_READ_WORKERS, help="Потоки чтения для параллельных стадий")
+    parser.add_argument("-o", "--output", type=Path, help="Куда записать JSON с результатами")
+    parser.add_argument("--compare", type=Path, help="JSON предыдущего прогона для сравнения")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="Допустимое замедление при --compare")
+    parser.add_argument("--keep", type=Path, help="Сгенерировать деревья в эту папку и не удалять их")
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = build_arg_parser().parse_args(argv)
+    results: Dict[str, Any] = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"), "python": platform.python_version(),
+            "platform": platform.platform(), "cpu_count": os.cpu_count(), "scale": args.scale,
+            "repeat": args.repeat, "workers": args.workers,
+        },
+        "layouts": {},
+    }
+    work_dir = args.keep or Path(tempfile.mkdtemp(prefix="aggregator-bench-"))
+    try:
+        for layout in args.layouts:
+            root = work_dir / layout
+            if not root.exists():
+                started = time.perf_counter()
+                counts = generate(layout, root, args.scale)
+                print(f"Generated {layout} in {time.perf_counter() - started:.2f}s: {counts}", file=sys.stderr)
+            stages = bench_layout(root, args.repeat, args.workers)
+            results["layouts"][layout] = stages
+            for stage, data in stages.items():
+                print(f"{layout:12} {stage:16} {data['seconds']:9.4f}s  peak {data['peak_memory_bytes'] / 1024 / 1024:7.2f} MiB  {data['calls']}", file=sys.stderr)
+    finally:
+        if args.keep is None: shutil.rmtree(work_dir, ignore_errors=True)
+
+    if args.output:
+        args.output.write_text(json.dumps(results, indent=2, ensure_ascii=False), encoding="utf-8")
+    if args.compare:
+        baseline = json.loads(args.compare.read_text(encoding="utf-8"))
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"Regressions over x{args.threshold}: {', '.join(regressions)}", file=sys.stderr)
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
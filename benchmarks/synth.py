@@ -0,0 +1,116 @@
+# --- Генератор синтетических репозиториев для бенчмарков ---
+import random
+from pathlib import Path
+from typing import Callable, Dict
+
+PNG_HEADER = b"\x89PNG\r\n\x1a\n\x00\x00\x00\rIHDR"
+ELF_HEADER = b"\x7fELF\x02\x01\x01\x00" + b"\x00" * 8
+SQLITE_HEADER = b"SQLite format 3\x00"
+
+_PY_SNIPPET = "def func_{n}(x):\n    \"\"\"Synthetic function {n}.\"\"\"\n    return x * {n} + len(str(x))\n\n"
+_MD_SNIPPET = "## Section {n}\n\nLorem ipsum dolor sit amet, consectetur adipiscing elit {n}.\n\n"
+
+
+class TreeBuilder:
+    """Создаёт файлы с детерминированным содержимым и считает, что создано."""
+
+    def __init__(self, root: Path, seed: int = 42):
+        self.root = root
+        self.rng = random.Random(seed)
+        self.counts: Dict[str, int] = {"dirs": 0, "text": 0, "unknown_text": 0, "binary": 0, "huge": 0, "ignored": 0}
+
+    def mkdir(self, rel: str) -> Path:
+        path = self.root / rel
+        path.mkdir(parents=True, exist_ok=True)
+        self.counts["dirs"] += 1
+        return path
+
+    def text(self, path: Path, lines: int = 20):
+        snippet = _PY_SNIPPET if path.suffix == ".py" else _MD_SNIPPET
+        path.write_text("".join(snippet.format(n=i) for i in range(lines)), encoding="utf-8")
+        self.counts["text" if path.suffix in (".py", ".md", ".txt", ".json") else "unknown_text"] += 1
+
+    def binary(self, path: Path, size: int = 4096):
+        header = {".png": PNG_HEADER, ".so": ELF_HEADER, ".db": SQLITE_HEADER}.get(path.suffix, b"\x00\x01")
+        path.write_bytes(header + self.rng.randbytes(max(0, size - len(header))))
+        self.counts["binary"] += 1
+
+    def huge(self, path: Path, size_mb: float):
+        line = "2024-01-01 12:00:00 INFO synthetic log line with some payload 0123456789\n"
+        repeat = int(size_mb * 1024 * 1024 / len(line)) or 1
+        with path.open("w", encoding="utf-8") as f:
+            for _ in range(repeat // 1000): f.write(line * 1000)
+            f.write(line * (repeat % 1000))
+        self.counts["huge"] += 1
+
+    def ignored_subtree(self, rel: str, dirs: int, files_per_dir: int):
+        """Большая игнорируемая ветка (node_modules, .git) - её не должно быть видно в замерах обхода."""
+        base = self.mkdir(rel)
+        for d in range(dirs):
+            sub = base / f"pkg_{d}"
+            sub.mkdir(exist_ok=True)
+            for f in range(files_per_dir):
+                (sub / f"file_{f}.js").write_text(f"module.exports = {d * files_per_dir + f};\n")
+                self.counts["ignored"] += 1
+
+
+def wide_flat(root: Path, scale: float = 1.0) -> Dict[str, int]:
+    builder = TreeBuilder(root)
+    base = builder.mkdir("flat")
+    for i in range(int(5000 * scale)):
+        kind = i % 50
+        if kind == 0: builder.binary(base / f"image_{i}.png")
+        elif kind == 1: builder.text(base / f"Makefile_{i}", lines=5)
+        else: builder.text(base / f"module_{i}.py", lines=5)
+    return builder.counts
+
+
+def deep_nested(root: Path, scale: float = 1.0) -> Dict[str, int]:
+    builder = TreeBuilder(root)
+    for branch in range(max(1, int(20 * scale))):
+        rel = f"branch_{branch}"
+        for depth in range(40):
+            rel = f"{rel}/level_{depth}"
+            level = builder.mkdir(rel)
+            builder.text(level / "node.py", lines=3)
+            if depth % 10 == 0: builder.text(level / "README.md", lines=3)
+    return builder.counts
+
+
+def monorepo(root: Path, scale: float = 1.0) -> Dict[str, int]:
+    builder = TreeBuilder(root)
+    builder.ignored_subtree("node_modules", dirs=int(400 * scale) or 1, files_per_dir=50)
+    builder.ignored_subtree(".git/objects", dirs=int(256 * scale) or 1, files_per_dir=20)
+    for pkg in range(max(1, int(60 * scale))):
+        src = builder.mkdir(f"packages/pkg_{pkg}/src")
+        tests = builder.mkdir(f"packages/pkg_{pkg}/tests")
+        for i in range(20): builder.text(src / f"mod_{i}.py", lines=15)
+        for i in range(5): builder.text(tests / f"test_{i}.py", lines=10)
+        builder.text(src.parent / "README.md", lines=10)
+        builder.text(src.parent / "pyproject.toml", lines=3)
+        builder.binary(src / "native.so", size=64 * 1024)
+        builder.binary(src.parent / "logo.png", size=16 * 1024)
+        builder.ignored_subtree(f"packages/pkg_{pkg}/node_modules", dirs=5, files_per_dir=10)
+    # Сгенерированное и собранное, исключённое через .gitignore (а не встроенный IGNORE_DIRS)
+    (root / ".gitignore").write_text("coverage/\n*.min.js\n/generated\n", encoding="utf-8")
+    builder.ignored_subtree("coverage", dirs=int(50 * scale) or 1, files_per_dir=20)
+    builder.ignored_subtree("generated", dirs=int(50 * scale) or 1, files_per_dir=20)
+    bundles = builder.mkdir("web/static")
+    for i in range(max(1, int(20 * scale))):
+        (bundles / f"bundle_{i}.min.js").write_text("var a=1;" * 2000, encoding="utf-8"); builder.counts["ignored"] += 1
+    data = builder.mkdir("data")
+    builder.binary(data / "cache.db", size=1024 * 1024)
+    for i in range(max(1, int(3 * scale))): builder.huge(data / f"server_{i}.log", size_mb=4)
+    return builder.counts
+
+
+LAYOUTS: Dict[str, Callable[[Path, float], Dict[str, int]]] = {
+    "wide_flat": wide_flat,
+    "deep_nested": deep_nested,
+    "monorepo": monorepo,
+}
+
+
+def generate(layout: str, root: Path, scale: float = 1.0) -> Dict[str, int]:
+    root.mkdir(parents=True, exist_ok=True)
+    return LAYOUTS[layout](root, scale)
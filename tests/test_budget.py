@@ -0,0 +1,48 @@
+# --- План бюджета и обрезка файлов при чтении ---
+from aggregator.budget import BYTES_PER_TOKEN, MIN_TRUNCATED_BYTES, format_budget_note, plan_budget
+from aggregator.reader import read_file
+
+
+def test_no_limits():
+    plan = plan_budget([10, 20], file_cap_bytes=0, budget_tokens=0)
+    assert plan.limits == [None, None]
+    assert (plan.planned_bytes, plan.truncated, plan.skipped) == (30, 0, 0)
+    assert format_budget_note(plan) == ""
+
+
+def test_file_cap_truncates_only_big_files():
+    plan = plan_budget([100, 5000], file_cap_bytes=1000)
+    assert plan.limits == [1000, 1000] # Маленький файл не обрезается: лимит - сам cap, а не его размер
+    assert (plan.planned_bytes, plan.truncated) == (1100, 1)
+
+
+def test_budget_truncates_then_skips_the_tail():
+    budget_bytes = 10_000
+    plan = plan_budget([6000, 6000, 6000], file_cap_bytes=0, budget_tokens=budget_bytes // BYTES_PER_TOKEN)
+    assert plan.limits == [None, 4000] # Второй обрезан остатком бюджета, третий не влез
+    assert (plan.files, plan.truncated, plan.skipped, plan.skipped_bytes) == (2, 1, 1, 6000)
+    assert plan.planned_bytes == budget_bytes
+    assert "не включено файлов - 1" in format_budget_note(plan)
+
+
+def test_small_remainder_is_not_spent():
+    plan = plan_budget([4000, 4000], file_cap_bytes=0, budget_tokens=(4000 + MIN_TRUNCATED_BYTES - 1) // BYTES_PER_TOKEN)
+    assert plan.files == 1 and plan.skipped == 1
+
+
+def test_file_grown_since_indexing_is_read_whole(tmp_path):
+    path = tmp_path / "a.txt"
+    path.write_text("line1\nline2\n")
+    plan = plan_budget([path.stat().st_size], file_cap_bytes=1024) # Размер из индекса
+    path.write_text("line1\nline2\nline3 with a lot more text\n")
+    block = read_file(path, tmp_path, limit=plan.limits[0])
+    assert "ОБРЕЗАН" not in block.text and "line3" in block.text
+    assert block.size == path.stat().st_size
+
+
+def test_truncated_block_reports_bytes_read(tmp_path):
+    path = tmp_path / "big.txt"
+    path.write_text("".join(f"line {i}\n" for i in range(1000)))
+    block = read_file(path, tmp_path, limit=200)
+    assert "(ОБРЕЗАН)" in block.text and "пропущено" in block.text
+    assert 0 < block.size <= 200
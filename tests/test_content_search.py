@@ -0,0 +1,26 @@
+# --- Поиск по содержимому и кэш слов ---
+from aggregator.content_search import ContentIndex, ContentSearch
+from aggregator.tree_index import TreeIndex
+
+
+def found(search, index, query):
+    return sorted(index.path_of(file_id).name for file_id in search.search(index, query))
+
+
+def test_literal_and_regex_queries(tmp_path):
+    (tmp_path / "a.py").write_text("def Needle():\n    pass\n")
+    (tmp_path / "b.py").write_text("haystack = 1\n")
+    index = TreeIndex.build(tmp_path, use_ignore_files=False)
+    search = ContentSearch(workers=2, index=ContentIndex())
+    assert found(search, index, "needle") == ["a.py"] # Без учёта регистра
+    assert found(search, index, "/hay.*= 1/") == ["b.py"]
+    assert found(search, index, "missing") == []
+
+
+def test_in_place_edit_is_found_with_stale_tree_index(tmp_path):
+    (tmp_path / "a.py").write_text("nothing here\n")
+    index = TreeIndex.build(tmp_path, use_ignore_files=False)
+    search = ContentSearch(workers=1, index=ContentIndex())
+    assert found(search, index, "needle") == [] # Кэш слов запомнил старое содержимое
+    (tmp_path / "a.py").write_text("now with a needle inside\n") # Индекс дерева об этом не знает
+    assert found(search, index, "needle") == ["a.py"]
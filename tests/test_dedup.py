@@ -0,0 +1,49 @@
+# --- Замена повторов содержимого ссылками на первый файл ---
+from aggregator.dedup import BlockDeduplicator, format_dedup_note
+from aggregator.pipeline import write_aggregate
+from aggregator.reader import read_file
+
+BODY = "".join(f"value_{i} = {i}\n" for i in range(50))
+
+
+def test_duplicate_becomes_reference_to_first(tmp_path):
+    for name in ("a.py", "b.py", "c.py"): (tmp_path / name).write_text(BODY)
+    dedup = BlockDeduplicator()
+    texts = [dedup.process(read_file(tmp_path / name, tmp_path), name) for name in ("a.py", "b.py", "c.py")]
+    assert texts[0].startswith("a.py\n```\nvalue_0")
+    assert texts[1] == "b.py\n```\n[СОВПАДАЕТ С a.py]\n```\n\n"
+    assert texts[2] == "c.py\n```\n[СОВПАДАЕТ С a.py]\n```\n\n"
+    assert dedup.duplicates == 2 and dedup.saved_bytes == 2 * len(BODY)
+    assert "- 2," in format_dedup_note(dedup)
+
+
+def test_digest_ignores_path_and_distinguishes_content(tmp_path):
+    (tmp_path / "a.py").write_text(BODY)
+    (tmp_path / "sub").mkdir(); (tmp_path / "sub" / "a.py").write_text(BODY)
+    (tmp_path / "other.py").write_text(BODY + "extra = 1\n")
+    first, same, other = (read_file(tmp_path / name, tmp_path) for name in ("a.py", "sub/a.py", "other.py"))
+    assert first.digest == same.digest != other.digest
+
+
+def test_small_files_and_unhashed_blocks_are_kept(tmp_path):
+    (tmp_path / "__init__.py").write_text("")
+    (tmp_path / "pkg").mkdir(); (tmp_path / "pkg" / "__init__.py").write_text("")
+    (tmp_path / "big.txt").write_text(BODY * 10)
+    (tmp_path / "big2.txt").write_text(BODY * 10)
+    dedup = BlockDeduplicator()
+    empty = [read_file(tmp_path / name, tmp_path) for name in ("__init__.py", "pkg/__init__.py")]
+    assert [dedup.process(block, block.path.relative_to(tmp_path)) for block in empty] == [block.text for block in empty] # Ссылка не короче
+    truncated = [read_file(tmp_path / name, tmp_path, limit=100) for name in ("big.txt", "big2.txt")]
+    assert all(block.digest is None for block in truncated) # Одинаковые срезы не значат одинаковые файлы
+    assert [dedup.process(block, block.path.name) for block in truncated] == [block.text for block in truncated]
+    assert dedup.duplicates == 0 and format_dedup_note(dedup) == ""
+
+
+def test_write_aggregate_dedup_switch(tmp_path):
+    (tmp_path / "a.py").write_text(BODY); (tmp_path / "b.py").write_text(BODY)
+    out = tmp_path.parent / "out.txt"
+    with out.open("w") as f: write_aggregate(f, tmp_path)
+    deduplicated = out.read_text()
+    assert deduplicated.count("value_0") == 1 and "[СОВПАДАЕТ С a.py]" in deduplicated and "[ДУБЛИКАТЫ:" in deduplicated
+    with out.open("w") as f: write_aggregate(f, tmp_path, dedup=False)
+    assert out.read_text().count("value_0") == 2
@@ -0,0 +1,105 @@
+# --- Правила игнорирования: синтаксис .gitignore, вложенные файлы правил и файл проекта ---
+import os
+from pathlib import Path
+
+from aggregator.ignore_rules import IgnoreRules, compile_pattern, parse_rules
+from aggregator.walker import iter_files
+
+BASE = os.sep + "proj"
+
+
+def ignored(lines, relative, is_dir=False):
+    rule_set = parse_rules(BASE, lines)
+    path = os.path.join(BASE, *relative.split("/"))
+    return rule_set.match(path, os.path.basename(path), is_dir)
+
+
+def test_comments_and_blank_lines_are_skipped():
+    assert compile_pattern("") is None
+    assert compile_pattern("   ") is None
+    assert compile_pattern("# comment") is None
+    assert compile_pattern("\\#hash").regex.match("#hash")
+
+
+def test_unanchored_pattern_matches_name_at_any_depth():
+    assert ignored(["*.log"], "app.log")
+    assert ignored(["*.log"], "a/b/app.log")
+    assert ignored(["*.log"], "app.txt") is None
+
+
+def test_anchored_pattern_matches_only_from_base():
+    assert ignored(["/build"], "build", is_dir=True)
+    assert ignored(["/build"], "src/build", is_dir=True) is None
+    assert ignored(["doc/*.txt"], "doc/a.txt")
+    assert ignored(["doc/*.txt"], "doc/sub/a.txt") is None # "*" не пересекает "/"
+
+
+def test_double_star():
+    assert ignored(["**/cache"], "cache", is_dir=True)
+    assert ignored(["**/cache"], "a/b/cache", is_dir=True)
+    assert ignored(["a/**/b.txt"], "a/b.txt")
+    assert ignored(["a/**/b.txt"], "a/x/y/b.txt")
+    assert ignored(["logs/**"], "logs/x/y.log")
+    assert ignored(["logs/**"], "other/y.log") is None
+
+
+def test_dir_only_rule_skips_files():
+    assert ignored(["out/"], "out", is_dir=True)
+    assert ignored(["out/"], "out") is None
+    assert ignored(["/gen/"], "gen", is_dir=True)
+    assert ignored(["/gen/"], "gen") is None
+
+
+def test_negation_last_match_wins():
+    lines = ["*.log", "!keep.log"]
+    assert ignored(lines, "x.log")
+    assert ignored(lines, "keep.log") is False
+    assert ignored(["!keep.log", "*.log"], "keep.log") # Отрицание раньше исключения не действует
+
+
+def test_character_class_and_escape():
+    assert ignored(["file[0-9].txt"], "file7.txt")
+    assert ignored(["file[!0-9].txt"], "file7.txt") is None
+    assert ignored(["\\!important"], "!important")
+
+
+def write(root: Path, relative: str, text: str = ""):
+    path = root / relative
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(text)
+
+
+def collected(root: Path, **kwargs):
+    return sorted(p.relative_to(root).as_posix() for p in (item.path for item in iter_files(root, rules=IgnoreRules(root, **kwargs))))
+
+
+def test_nested_gitignore_applies_below_its_folder(tmp_path):
+    write(tmp_path, ".gitignore", "*.tmp\n")
+    write(tmp_path, "a.py"); write(tmp_path, "a.tmp")
+    write(tmp_path, "sub/.gitignore", "*.py\n!keep.py\n")
+    write(tmp_path, "sub/b.py"); write(tmp_path, "sub/keep.py"); write(tmp_path, "sub/c.tmp")
+    assert collected(tmp_path) == [".gitignore", "a.py", "sub/.gitignore", "sub/keep.py"]
+
+
+def test_ignored_directory_is_pruned(tmp_path):
+    write(tmp_path, ".gitignore", "vendor/\n")
+    write(tmp_path, "vendor/lib.py"); write(tmp_path, "src/vendor.py")
+    assert collected(tmp_path) == [".gitignore", "src/vendor.py"]
+
+
+def test_project_file_overrides_gitignore(tmp_path):
+    write(tmp_path, ".gitignore", "*.md\n")
+    write(tmp_path, ".aggregatorignore", "!README.md\nsecret.py\n")
+    write(tmp_path, "README.md"); write(tmp_path, "NOTES.md"); write(tmp_path, "secret.py"); write(tmp_path, "main.py")
+    assert collected(tmp_path) == [".aggregatorignore", ".gitignore", "README.md", "main.py"]
+    assert collected(tmp_path, use_gitignore=False) == [".aggregatorignore", ".gitignore", "NOTES.md", "README.md", "main.py"]
+
+
+def test_changed_since_detects_edited_rules(tmp_path):
+    write(tmp_path, ".gitignore", "*.tmp\n")
+    rules = IgnoreRules(tmp_path)
+    rules.scope_for(tmp_path)
+    signature = rules.signature()
+    assert not IgnoreRules(tmp_path).changed_since(signature)
+    write(tmp_path, ".gitignore", "*.tmp\n*.bak\n")
+    assert IgnoreRules(tmp_path).changed_since(signature)
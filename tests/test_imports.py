@@ -0,0 +1,18 @@
+# --- Ленивая загрузка тяжёлых модулей ядра ---
+import subprocess
+import sys
+
+HEAVY_MODULES = ("asyncio", "sqlite3", "ctypes", "difflib")
+
+
+def loaded_after(code: str) -> list:
+    script = f"import sys\n{code}\nprint(' '.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))"
+    return subprocess.run([sys.executable, "-c", script], capture_output=True, text=True, check=True).stdout.split()
+
+
+def test_core_import_skips_heavy_modules():
+    assert loaded_after("import aggregator\nfrom aggregator import write_aggregate, DELTA_OFF") == []
+
+
+def test_lazy_names_resolve_on_access():
+    assert loaded_after("from aggregator import IndexStore, run_blocking") == ["asyncio", "sqlite3", "difflib"]
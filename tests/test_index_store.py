@@ -0,0 +1,55 @@
+# --- Кэш индекса на диске: узлы с классификацией, схема и сверка с диском ---
+import sqlite3
+from pathlib import Path
+
+from aggregator.index_store import IndexStore
+from aggregator.tree_index import TreeIndex
+
+
+def make_tree(root: Path):
+    (root / "src").mkdir(parents=True)
+    (root / "src" / "a.py").write_text("print(1)\n")
+    (root / "blob.dat").write_bytes(b"\x00\x01binary")
+
+
+def test_roundtrip_keeps_classification_of_this_root_only(tmp_path):
+    first, second = tmp_path / "one", tmp_path / "two"
+    make_tree(first); make_tree(second)
+    store = IndexStore(tmp_path / "cache")
+    index = TreeIndex.build(first, use_ignore_files=False)
+    for node_id in index.iter_files(0): index.is_text(node_id)
+    TreeIndex.build(second, use_ignore_files=False).is_text(1) # Классификация другого корня не должна попасть в кэш first
+    store.save(index)
+    loaded = store.load(first)
+    texts = {loaded.path_of(node_id).name: loaded.texts[node_id] for node_id in loaded.iter_files(0)}
+    assert texts == {"a.py": True, "blob.dat": False}
+    with sqlite3.connect(store.db_path(first)) as connection:
+        assert connection.execute("SELECT count(*) FROM nodes").fetchone()[0] == len(loaded)
+        assert "classify" not in {row[0] for row in connection.execute("SELECT name FROM sqlite_master")}
+
+
+def test_schema_1_cache_is_rebuilt(tmp_path):
+    make_tree(tmp_path / "root")
+    store = IndexStore(tmp_path / "cache")
+    path = store.db_path(tmp_path / "root")
+    path.parent.mkdir(parents=True)
+    with sqlite3.connect(path) as connection:
+        connection.execute("CREATE TABLE nodes (id INTEGER PRIMARY KEY, parent INTEGER, name TEXT, kind INTEGER, size INTEGER, mtime_ns INTEGER)")
+        connection.execute("CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT)")
+        connection.execute("INSERT INTO meta VALUES ('schema', '1')")
+    assert store.load(tmp_path / "root") is None
+    store.save(TreeIndex.build(tmp_path / "root", use_ignore_files=False))
+    assert store.load(tmp_path / "root") is not None
+
+
+def test_revalidate_restats_files_of_changed_folder(tmp_path):
+    make_tree(tmp_path)
+    index = TreeIndex.build(tmp_path, use_ignore_files=False)
+    a_id = index.id_of(tmp_path / "src" / "a.py")
+    assert index.is_text(a_id)
+    (tmp_path / "src" / "a.py").write_text("print(1)\nprint(2)\n")
+    (tmp_path / "src" / "b.py").write_text("x\n") # Меняет mtime папки src
+    added, removed = index.revalidate()
+    assert added == [tmp_path / "src" / "b.py"] and removed == []
+    assert index.sizes[a_id] == len("print(1)\nprint(2)\n")
+    assert index.texts[a_id] is None # stat изменился - классификация будет заново
@@ -0,0 +1,29 @@
+# --- Буфер результата и вытеснение во временный файл ---
+from aggregator.output_buffer import OutputBuffer
+
+
+def test_strips_outer_whitespace_without_joining():
+    buffer = OutputBuffer()
+    for part in ("\n  ", "abc", "\n\n", "def", " \n"): buffer.append(part)
+    assert buffer.getvalue() == "abc\n\ndef"
+    assert len(buffer) == len("abc\n\ndef")
+    assert buffer.read(2, 4) == "c\n\nd"
+
+
+def test_spilled_buffer_reads_back_parts():
+    buffer = OutputBuffer(spill_chars=10)
+    buffer.append("A" * 10, label="a.py", size=10, lines=1)
+    buffer.append("Б" * 10, label="b.py", size=20, lines=1)
+    assert buffer.spilled
+    assert buffer.getvalue() == "A" * 10 + "Б" * 10
+    assert [(entry.label, entry.start) for entry in buffer.outline()] == [("a.py", 0), ("b.py", 10)]
+    buffer.close()
+
+
+def test_append_after_read_on_spilled_buffer():
+    buffer = OutputBuffer(spill_chars=10)
+    buffer.append("A" * 10); buffer.append("B" * 10)
+    assert buffer.read(0, 5) == "AAAAA"
+    buffer.append("C" * 10)
+    assert buffer.getvalue() == "A" * 10 + "B" * 10 + "C" * 10
+    buffer.close()
@@ -0,0 +1,46 @@
+# --- Сбор файлов рабочего пространства из нескольких корней ---
+import io
+
+from aggregator.pipeline import collect_files, collect_workspace, write_aggregate
+from aggregator.selection import SelectionTrie
+from aggregator.tree_index import TreeIndex
+
+
+def make_workspace(tmp_path):
+    for root in ("app", "dist"):
+        (tmp_path / root / "src").mkdir(parents=True)
+        (tmp_path / root / "src" / "main.py").write_text(f"print('{root}')\n")
+        (tmp_path / root / "build").mkdir()
+        (tmp_path / root / "build" / "gen.py").write_text("pass\n")
+    return tmp_path / "app", tmp_path / "dist"
+
+
+def test_roots_with_ignored_names_keep_subfolder_selection(tmp_path):
+    app, dist = make_workspace(tmp_path)
+    result = collect_workspace(SelectionTrie([app / "src", dist / "src"]), [app, dist])
+    assert result.files == [app / "src" / "main.py", dist / "src" / "main.py"]
+    assert result.bases == [tmp_path, tmp_path]
+
+
+def test_pruning_is_relative_to_each_root(tmp_path):
+    app, dist = make_workspace(tmp_path)
+    result = collect_workspace(SelectionTrie([app, dist]), [app, dist])
+    assert result.files == [app / "src" / "main.py", dist / "src" / "main.py"] # build/ внутри корней отсекается
+
+
+def test_write_aggregate_labels_files_with_root_names(tmp_path):
+    app, dist = make_workspace(tmp_path)
+    out = io.StringIO()
+    stats = write_aggregate(out, app, [app / "src", dist / "src"], extra_roots=[dist])
+    assert stats.files == 2
+    assert "app/src/main.py" in out.getvalue() and "dist/src/main.py" in out.getvalue()
+
+
+def test_walk_order_matches_tree_index(tmp_path):
+    for relative in ("b.py", "A.py", "zeta/x.py", "Beta/y.py", "Beta/inner/z.py", "alpha/w.py"):
+        (tmp_path / relative).parent.mkdir(parents=True, exist_ok=True)
+        (tmp_path / relative).write_text("pass\n")
+    walked, _ = collect_files([tmp_path], tmp_path)
+    indexed, _ = collect_files([tmp_path], tmp_path, index=TreeIndex.build(tmp_path, use_ignore_files=False))
+    assert [p.relative_to(tmp_path).as_posix() for p in walked] == ["alpha/w.py", "Beta/inner/z.py", "Beta/y.py", "zeta/x.py", "A.py", "b.py"]
+    assert walked == indexed
@@ -0,0 +1,22 @@
+# --- Чтение и оформление блоков файлов ---
+from aggregator.reader import block_body, block_line_count, format_error_block, format_file_block, format_truncated_block, read_file
+
+
+def test_line_count_of_file_blocks():
+    assert block_line_count(format_file_block("a.py", "")) == 0
+    assert block_line_count(format_file_block("a.py", "x")) == 1
+    assert block_line_count(format_file_block("a.py", "a\nb\nc")) == 3
+    assert block_line_count(format_truncated_block("a.py", "head\n\n[...]\n\ntail")) == 5
+    assert block_line_count(format_error_block("a.py", OSError("boom"))) == 1
+
+
+def test_block_body_strips_header_and_fences():
+    assert block_body(format_file_block("dir/a.py", "line1\nline2")) == "line1\nline2"
+    assert block_body("a.py (ИЗМЕНЁН)\n```diff\n-a\n+b\n```\n\n") == "-a\n+b"
+
+
+def test_read_file_reports_lines(tmp_path):
+    (tmp_path / "a.py").write_text("one\ntwo\nthree\n")
+    (tmp_path / "empty.py").write_text("")
+    assert read_file(tmp_path / "a.py", tmp_path).lines == 3
+    assert read_file(tmp_path / "empty.py", tmp_path).lines == 0
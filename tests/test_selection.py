@@ -0,0 +1,94 @@
+# --- Выбор как дерево префиксов: нормализация правил, три состояния, регионы для сбора ---
+from pathlib import Path
+
+from aggregator.selection import CHECKED, MIXED, UNCHECKED, SelectionRegion, SelectionTrie
+
+ROOT = Path("/proj")
+
+
+def p(relative: str) -> Path:
+    return ROOT / relative
+
+
+def test_empty_selection():
+    trie = SelectionTrie()
+    assert not trie
+    assert trie.rules() == []
+    assert list(trie.regions()) == []
+    assert trie.state(p("a")) == UNCHECKED
+
+
+def test_folder_rule_covers_subtree_and_overrides_nested_rules():
+    trie = SelectionTrie([p("src/a.py"), p("src/b.py")])
+    trie.set(p("src"), True)
+    assert trie.rules() == [(p("src"), True)] # Отметки файлов внутри перекрыты отметкой папки
+    assert trie.is_selected(p("src/deep/x.py"))
+    assert not trie.is_selected(p("docs/x.md"))
+
+
+def test_redundant_rules_are_not_stored():
+    trie = SelectionTrie([p("src")])
+    trie.set(p("src/a.py"), True) # Уже выбран через папку
+    assert trie.rules() == [(p("src"), True)]
+    trie.set(p("docs"), False) # Не выбран и так
+    assert trie.rules() == [(p("src"), True)]
+
+
+def test_exclusion_under_included_folder_makes_it_mixed():
+    trie = SelectionTrie([p("src")])
+    trie.set(p("src/gen"), False)
+    assert trie.rules() == [(p("src"), True), (p("src/gen"), False)]
+    assert trie.state(p("src")) == MIXED
+    assert trie.state(p("src/gen")) == UNCHECKED
+    assert trie.state(p("src/a.py")) == CHECKED
+    assert not trie.is_selected(p("src/gen/x.py"))
+    trie.set(p("src/gen"), True) # Вернули - правило исключения исчезает
+    assert trie.rules() == [(p("src"), True)]
+
+
+def test_unselecting_last_rule_prunes_the_trie():
+    trie = SelectionTrie([p("src/a.py")])
+    trie.set(p("src/a.py"), False)
+    assert not trie and trie.rules() == []
+    assert trie.state(p("src")) == UNCHECKED
+
+
+def test_regions_are_disjoint_with_skip_sets():
+    trie = SelectionTrie([p("src")])
+    trie.set(p("src/gen"), False)
+    trie.set(p("src/gen/keep.py"), True)
+    trie.set(p("docs/readme.md"), True)
+    assert list(trie.regions()) == [
+        SelectionRegion(p("docs/readme.md"), frozenset()),
+        SelectionRegion(p("src"), frozenset({p("src/gen")})),
+        SelectionRegion(p("src/gen/keep.py"), frozenset()),
+    ]
+
+
+def test_rules_roundtrip_and_copy_are_independent():
+    trie = SelectionTrie([p("src")])
+    trie.set(p("src/gen"), False)
+    restored = SelectionTrie.from_rules(trie.rules())
+    assert restored.rules() == trie.rules()
+    copy = trie.copy()
+    copy.set(p("src"), False)
+    assert trie.rules() == [(p("src"), True), (p("src/gen"), False)]
+    assert copy.rules() == []
+
+
+def test_remove_forgets_subtree_without_touching_ancestors():
+    trie = SelectionTrie([p("src")])
+    trie.set(p("src/gen"), False)
+    trie.remove(p("src/gen"))
+    assert trie.rules() == [(p("src"), True)]
+    trie.remove(p("missing"))
+    assert trie.rules() == [(p("src"), True)]
+
+
+def test_restricted_to_one_root():
+    other = Path("/other")
+    trie = SelectionTrie([ROOT, other / "lib"])
+    trie.set(p("tmp"), False)
+    assert trie.restricted(ROOT).rules() == [(ROOT, True), (p("tmp"), False)]
+    assert trie.restricted(other).rules() == [(other / "lib", True)]
+    assert SelectionTrie([Path("/")]).restricted(ROOT).rules() == [(ROOT, True)] # Выбран предок корня
@@ -0,0 +1,109 @@
+# --- Снимок и режим изменений ---
+from pathlib import Path
+
+from aggregator.reader import FileBlock, block_digest, format_file_block
+from aggregator.constants import DELTA_DIFF, DELTA_FILES, DELTA_OFF
+from aggregator.snapshot import DeltaTracker, FileSnapshot, format_delta_note
+
+ROOT = Path("/proj")
+
+
+def block(name: str, content: str) -> FileBlock:
+    text = format_file_block(name, content)
+    return FileBlock(ROOT / name, text, len(content), False, block_digest(text))
+
+
+def snapshot_of(*blocks_and_stamps) -> dict:
+    tracker = DeltaTracker()
+    for file_block, stamp in blocks_and_stamps: tracker.record(file_block, stamp, file_block.path.name)
+    return tracker.entries
+
+
+def test_full_mode_emits_everything_and_still_records():
+    tracker = DeltaTracker(mode=DELTA_OFF)
+    first = block("a.py", "x")
+    assert tracker.needs_read(first.path, (1, 1))
+    assert tracker.record(first, (1, 1), "a.py") == first.text
+    assert tracker.entries[first.path].digest == first.digest
+    assert format_delta_note(tracker) == ""
+
+
+def test_unchanged_stat_is_not_read():
+    previous = snapshot_of((block("a.py", "x"), (1, 1)))
+    tracker = DeltaTracker(previous, DELTA_FILES)
+    files, bases, stamps = tracker.select_reads([ROOT / "a.py", ROOT / "b.py"], [ROOT, ROOT], [(1, 1), (5, 5)])
+    assert files == [ROOT / "b.py"] and stamps == [(5, 5)]
+    assert tracker.unchanged == 1
+    assert tracker.entries[ROOT / "a.py"] == previous[ROOT / "a.py"] # Переносится в новый снимок
+
+
+def test_changed_stat_with_same_content_is_unchanged():
+    previous = snapshot_of((block("a.py", "x"), (1, 1)))
+    tracker = DeltaTracker(previous, DELTA_FILES)
+    assert tracker.needs_read(ROOT / "a.py", (2, 1)) # touch
+    assert tracker.record(block("a.py", "x"), (2, 1), "a.py") is None
+    assert tracker.unchanged == 1 and tracker.entries[ROOT / "a.py"].mtime_ns == 2
+    assert format_delta_note(tracker) == "[С ПОСЛЕДНЕГО КОПИРОВАНИЯ ИЗМЕНЕНИЙ НЕТ]\n\n"
+
+
+def test_added_and_modified_files_are_emitted():
+    previous = snapshot_of((block("a.py", "old"), (1, 3)))
+    tracker = DeltaTracker(previous, DELTA_FILES)
+    modified, added = block("a.py", "new!"), block("b.py", "b")
+    assert tracker.record(modified, (2, 4), "a.py") == modified.text
+    assert tracker.record(added, (1, 1), "b.py") == added.text
+    assert (tracker.added, tracker.modified, tracker.unchanged) == (1, 1, 0)
+    assert "новых: 1 · изменено: 1" in format_delta_note(tracker)
+
+
+def test_diff_mode_emits_unified_diff():
+    previous = snapshot_of((block("a.py", "a\nb\nc"), (1, 5)))
+    tracker = DeltaTracker(previous, DELTA_DIFF)
+    text = tracker.record(block("a.py", "a\nB\nc"), (2, 5), "a.py")
+    assert text.startswith("a.py (ИЗМЕНЁН)\n```diff\n")
+    assert "-b\n+B" in text and "--- a/a.py\n+++ b/a.py" in text
+
+
+def test_diff_mode_without_stored_content_emits_whole_block():
+    previous = {ROOT / "a.py": FileSnapshot(1, 1, "old-digest", None)}
+    tracker = DeltaTracker(previous, DELTA_DIFF)
+    new = block("a.py", "y")
+    assert tracker.record(new, (2, 1), "a.py") == new.text
+
+
+def test_deleted_files_inside_selection(tmp_path):
+    kept, gone, outside = tmp_path / "kept.py", tmp_path / "gone.py", tmp_path / "other" / "gone.py"
+    kept.write_text("x")
+    previous = {path: FileSnapshot(1, 1, "d", None) for path in (kept, gone, outside)}
+    tracker = DeltaTracker(previous, DELTA_FILES)
+    is_selected = lambda path: path.parent == tmp_path
+    assert tracker.deleted(is_selected, current=set()) == [gone] # kept.py есть на диске, other/ вне выбора
+    assert tracker.removed == [gone]
+    assert tracker.for_root(tmp_path) == ({}, [gone])
+
+
+def test_in_place_edit_with_fresh_stamp_is_detected(tmp_path):
+    from aggregator.budget import file_stamps
+    from aggregator.reader import read_file
+    from aggregator.tree_index import TreeIndex
+    path = tmp_path / "a.py"
+    path.write_text("first\n")
+    index = TreeIndex.build(tmp_path, use_ignore_files=False)
+    tracker = DeltaTracker()
+    tracker.record(read_file(path, tmp_path), file_stamps([path])[0], "a.py")
+    path.write_text("second version\n") # Индекс дерева не обновлялся
+    assert file_stamps([path], {tmp_path: index}) != file_stamps([path]) # stat индекса отстал
+    delta = DeltaTracker(tracker.entries, DELTA_FILES)
+    files, _, stamps = delta.select_reads([path], [tmp_path], file_stamps([path]))
+    assert files == [path]
+    assert delta.record(read_file(path, tmp_path), stamps[0], "a.py") is not None and delta.modified == 1
+
+
+def test_file_vanished_after_indexing_is_reported_deleted(tmp_path):
+    from aggregator.budget import file_stamps
+    path = tmp_path / "gone.py"
+    previous = {path: FileSnapshot(1, 1, "d", None)}
+    tracker = DeltaTracker(previous, DELTA_FILES)
+    files, _, _ = tracker.select_reads([path], [tmp_path], file_stamps([path])) # Файл ещё в индексе, но удалён
+    assert files == []
+    assert tracker.deleted(lambda p: True, current={path}) == [path]
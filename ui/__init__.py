@@ -0,0 +1,7 @@
+# Flet-компоненты интерфейса
+from .tree_view import VirtualTreeView, ROW_HEIGHT
+from .perf_panel import PerfPanel
+from .preview import PreviewPager, PAGE_CHARS
+from .render import RenderScheduler, FRAME_SECONDS
+
+__all__ = ["VirtualTreeView", "ROW_HEIGHT", "PerfPanel", "PreviewPager", "PAGE_CHARS", "RenderScheduler", "FRAME_SECONDS"]
@@ -0,0 +1,1177 @@
+# v3.7: Headless CLI, workspaces, budget, delta and dedup
+import flet as ft
+import os
+from pathlib import Path
+import logging
+import pyperclip
+import threading # For async operations
+import time
+from typing import Set, Dict, Optional, List, Callable, Mapping, Sequence
+
+from aggregator import (
+    TreeIndex, FilterEngine, aiter_blocks, run_blocking, collect_workspace, DEFAULT_READ_WORKERS,
+    ContentCache, DEFAULT_CONTENT_CACHE_BYTES, format_size, ScanController, CancelToken, ScanCancelled,
+    FsWatcher, ChangeBatch, SelectionTrie, CHECKED, profiler, IGNORE_FILE_NAMES, IgnoreRules, IndexStore,
+    OutputBuffer, DEFAULT_SPILL_CHARS, compose_output, compose_text, relative_display_path,
+    normalize_roots, root_labels, root_of, build_indexes,
+    plan_budget, file_sizes, file_stamps, format_budget_note, DEFAULT_FILE_CAP_BYTES, DEFAULT_BUDGET_TOKENS,
+    DeltaTracker, merge_snapshots, format_deleted_block, format_delta_note, display_bases, DELTA_OFF, DELTA_FILES, DELTA_DIFF, DELTA_MODES,
+    ContentSearch, ContentIndex, BlockDeduplicator, format_dedup_note, block_line_count,
+)
+from .tree_view import VirtualTreeView
+from .perf_panel import PerfPanel
+from .preview import PreviewPager
+from .render import RenderScheduler
+
+# --- Константы ---
+# TEXT_EXTENSIONS и IGNORE_DIRS живут в ядре (aggregator.constants)
+LAST_DIR_KEY = "last_directory_path_v3.6" # Ключ v3.6 оставлен, чтобы сохранённая директория не терялась при обновлении
+WORKSPACE_KEY = "workspace_roots_v3.7" # Корни рабочего пространства; LAST_DIR_KEY - активный из них
+BUDGET_KEY = "budget_tokens_v3.7"
+FILE_CAP_KEY = "file_cap_kb_v3.7"
+DELTA_KEY = "delta_mode_v3.7"
+# Изменяем соотношение панелей на 20/80
+LEFT_PANEL_EXPAND = 2  # Фиксированное соотношение: 20%
+RIGHT_PANEL_EXPAND = 8 # Фиксированное соотношение: 80% (2 + 8 = 10 total)
+READ_WORKERS = DEFAULT_READ_WORKERS # Потоки чтения файлов; 1 - последовательное чтение (для сравнения)
+CONTENT_CACHE_BYTES = DEFAULT_CONTENT_CACHE_BYTES # Бюджет кэша прочитанных файлов между нажатиями "Показать"
+STREAM_PUBLISH_INTERVAL = 0.3 # Не чаще раза в столько секунд частичный результат отправляется в UI
+STATE_SAVE_DELAY = 1.0 # Выбор и развёрнутые папки сохраняются после паузы в изменениях
+INDEX_SAVE_DELAY = 5.0 # Индекс после изменений от наблюдателя сохраняется не чаще раза в столько секунд
+OUTPUT_SPILL_CHARS = DEFAULT_SPILL_CHARS # Больше этого результат хранится во временном файле, а не в памяти
+ESTIMATE_DELAY = 0.3 # Оценка объёма выбора пересчитывается после паузы в изменениях
+
+# Стиль для placeholder текста
+HINT_STYLE = ft.TextStyle(color=ft.colors.with_opacity(0.5, ft.colors.ON_SURFACE), italic=True)
+
+# --- Основное приложение ---
+
+def main(page: ft.Page):
+    page.title = "File Content Aggregator v3.7" # Обновлен заголовок
+    page.vertical_alignment = ft.MainAxisAlignment.START
+    page.horizontal_alignment = ft.CrossAxisAlignment.START
+    page.window_width = 1300 # Немного увеличим ширину для кнопок
+    page.window_height = 850 # Немного увеличим высоту для полей промпта
+
+    render = RenderScheduler(page) # Все изменения события или кадра уходят клиенту одной отправкой
+
+    # --- Состояние приложения ---
+    selected_directory_text = ft.Text("Директория не выбрана", selectable=True, expand=True, no_wrap=True, tooltip="Выбранная директория")
+    current_scan_path: Optional[Path] = None # Активный корень рабочего пространства (его дерево показано слева)
+    workspace_roots: List[Path] = [] # Все корни рабочего пространства в порядке вкладок
+    indexes: Dict[Path, TreeIndex] = {} # Индексы всех корней; tree_index - индекс активного
+    selection = SelectionTrie() # Включённые и исключённые поддеревья; регионы для сбора не пересекаются
+    expanded_nodes: Set[Path] = set()
+    filter_text: str = ""
+    tree_index: Optional[TreeIndex] = None # Индекс активного корня, строится один раз при выборе
+    content_cache = ContentCache(CONTENT_CACHE_BYTES) # Блоки файлов, прочитанные при прошлых сканированиях
+    content_index = ContentIndex() # Слова содержимого для поиска по файлам, сверяются по mtime и размеру
+    scan_controller = ScanController() # Новый запуск вытесняет предыдущий, публикует только последнее поколение
+    fs_watcher: Optional[FsWatcher] = None # Включается кнопкой watch_button
+    index_store = IndexStore() # Кэш индексов и выбора на диске: повторное открытие директории без полного обхода
+    state_save_timer: Optional[threading.Timer] = None
+    index_save_timer: Optional[threading.Timer] = None
+    current_output: Optional[OutputBuffer] = None # Полный результат последней сборки (в поле вывода - одна страница)
+    file_cap_bytes = DEFAULT_FILE_CAP_BYTES # Больше - от файла берутся начало и конец (0 - без лимита)
+    budget_tokens = DEFAULT_BUDGET_TOKENS # Общий бюджет результата в токенах (0 - без лимита)
+    estimate_controller = ScanController() # Новая оценка выбора вытесняет незаконченную
+    estimate_timer: Optional[threading.Timer] = None
+    delta_mode = DELTA_OFF # Полный результат или только изменения с последнего копирования
+    pending_snapshot: Optional[tuple] = None # (результат, DeltaTracker, корни): станет снимком при копировании или сохранении
+
+    # --- UI Компоненты ---
+
+    # 1. Выбор директории и Запоминание (без изменений в логике)
+    def load_app_state():
+        nonlocal current_scan_path, file_cap_bytes, budget_tokens, delta_mode
+        file_cap_kb = page.client_storage.get(FILE_CAP_KEY)
+        if file_cap_kb is not None: file_cap_bytes = int(file_cap_kb) * 1024; file_cap_input.value = str(file_cap_kb)
+        budget_tokens = int(page.client_storage.get(BUDGET_KEY) or 0)
+        budget_input.value = str(budget_tokens) if budget_tokens else ""
+        saved_delta = page.client_storage.get(DELTA_KEY)
+        if saved_delta in DELTA_MODES: delta_mode = delta_mode_dropdown.value = saved_delta
+        last_dir_str = page.client_storage.get(LAST_DIR_KEY)
+        if last_dir_str:
+            last_dir_path = Path(last_dir_str)
+            if last_dir_path.is_dir():
+                logging.info(f"Loaded last directory: {last_dir_path}")
+                current_scan_path = last_dir_path.resolve()
+                saved_roots = normalize_roots(Path(r) for r in page.client_storage.get(WORKSPACE_KEY) or [] if Path(r).is_dir())
+                workspace_roots[:] = saved_roots if current_scan_path in saved_roots else [current_scan_path]
+                if len(workspace_roots) > 1: logging.info(f"Loaded workspace of {len(workspace_roots)} roots.")
+                selected_directory_text.value = f"Выбрано: {last_dir_str}"
+                update_ui_after_selection()
+            else:
+                logging.warning(f"Last directory path not found or invalid: {last_dir_str}")
+                page.client_storage.remove(LAST_DIR_KEY)
+                clear_ui_on_error()
+        else:
+             clear_ui_on_error()
+
+        if 'left_panel' in locals() and left_panel: left_panel.expand = LEFT_PANEL_EXPAND
+        if 'right_panel' in locals() and right_panel: right_panel.expand = RIGHT_PANEL_EXPAND
+        page.update() # Обновление после загрузки состояния
+
+    def save_last_directory(path: Path):
+        try:
+             page.client_storage.set(LAST_DIR_KEY, str(path))
+             page.client_storage.set(WORKSPACE_KEY, [str(root) for root in workspace_roots])
+             logging.info(f"Saved last directory: {path}")
+        except Exception as e:
+             logging.error(f"Failed to save last directory: {e}")
+
+    @render.batched
+    def pick_directory_result(e: ft.FilePickerResultEvent):
+        nonlocal current_scan_path
+        page.splash = ft.ProgressBar()
+        page.update()
+        if e.path:
+            new_path = Path(e.path)
+            if new_path.is_dir():
+                selected_directory_text.value = f"Выбрано: {e.path}"
+                current_scan_path = new_path.resolve()
+                workspace_roots[:] = [current_scan_path]; indexes.clear() # Новая директория - новое рабочее пространство из одного корня
+                logging.info(f"Directory selected: {current_scan_path}")
+                save_last_directory(current_scan_path)
+                content_cache.clear(); content_index.clear()
+                selection.clear()
+                expanded_nodes.clear()
+                filter_input.value = ""
+                start_prompt_input.value = ""
+                end_prompt_input.value = ""
+                content_display.value = "" # Очищаем основное поле тоже
+                set_output(None)
+                update_ui_after_selection()
+            else:
+                 selected_directory_text.value = "Выбранный путь не является директорией."
+                 current_scan_path = None
+                 clear_ui_on_error()
+        else:
+            selected_directory_text.value = "Выбор директории отменен"
+            if current_scan_path is None:
+                 clear_ui_on_error()
+        page.splash = None
+        render.mark_page() # Сплэш и всё изменённое выше - одной отправкой
+
+    file_picker = ft.FilePicker(on_result=pick_directory_result)
+    page.overlay.append(file_picker)
+
+    @render.batched
+    def add_root_result(e: ft.FilePickerResultEvent):
+        """Добавляет корень в рабочее пространство: индексируется только он, выбор в остальных сохраняется."""
+        nonlocal current_scan_path
+        if not e.path or current_scan_path is None: return
+        new_root = Path(e.path).resolve()
+        if not new_root.is_dir():
+            page.show_snack_bar(ft.SnackBar(ft.Text("Выбранный путь не является директорией."), open=True))
+            return
+        roots = normalize_roots([*workspace_roots, new_root])
+        if new_root not in roots or roots == workspace_roots:
+            page.show_snack_bar(ft.SnackBar(ft.Text("Эта папка уже входит в рабочее пространство."), open=True))
+            return
+        page.splash = ft.ProgressBar(); page.update()
+        for dropped in set(workspace_roots) - set(roots): indexes.pop(dropped, None) # Вложены в новый корень
+        workspace_roots[:] = roots
+        current_scan_path = new_root
+        logging.info(f"Root added to workspace: {new_root} ({len(roots)} roots)")
+        save_last_directory(new_root)
+        rebuild_index(prefer_cache=True) # Строится только новый корень
+        restore_saved_state([new_root])
+        schedule_estimate()
+        populate_tree_view()
+        update_button_states()
+        page.splash = None; render.mark_page()
+
+    add_root_picker = ft.FilePicker(on_result=add_root_result)
+    page.overlay.append(add_root_picker)
+
+    # -- Кнопки Верхней Панели --
+    # Определяем кнопки ДО их использования в layout и обработчиках
+    pick_dir_button = ft.IconButton( # Изменено на IconButton
+        icon=ft.icons.FOLDER_OPEN,
+        tooltip="Выбрать директорию [Ctrl+O]",
+        on_click=lambda _: file_picker.get_directory_path(dialog_title="Выберите директорию проекта"),
+    )
+    add_root_button = ft.IconButton(
+        icon=ft.icons.LIBRARY_ADD,
+        tooltip="Добавить папку в рабочее пространство (ещё один корень)",
+        on_click=lambda _: add_root_picker.get_directory_path(dialog_title="Добавить корень рабочего пространства"),
+        disabled=True,
+    )
+    remove_root_button = ft.IconButton(
+        icon=ft.icons.FOLDER_DELETE,
+        tooltip="Убрать активный корень из рабочего пространства",
+        on_click=None, # Назначается позже
+        disabled=True,
+    )
+    select_all_button = ft.IconButton(
+        icon=ft.icons.SELECT_ALL,
+        tooltip="Выбрать все видимые [Ctrl+A]",
+        on_click=None, # Назначается позже
+        disabled=True
+    )
+    deselect_all_button = ft.IconButton(
+        icon=ft.icons.DESELECT,
+        tooltip="Снять весь выбор [Esc] (во время сборки Esc отменяет её)",
+        on_click=None, # Назначается позже
+        disabled=True
+    )
+    show_content_button = ft.IconButton( # Изменено на IconButton
+        icon=ft.icons.VISIBILITY,
+        tooltip="Показать/Собрать контент [Enter]",
+        on_click=None,
+        disabled=True,
+    )
+    refresh_button = ft.IconButton( # Изменено на IconButton
+        icon=ft.icons.REFRESH,
+        tooltip="Обновить дерево [Ctrl+R]",
+        on_click=None,
+        disabled=True,
+    )
+    watch_button = ft.IconButton(
+        icon=ft.icons.SYNC_DISABLED, selected_icon=ft.icons.SYNC, selected=False,
+        tooltip="Следить за изменениями файлов (дерево и кэш обновляются автоматически)",
+        on_click=None,
+        disabled=True,
+    )
+    copy_button = ft.IconButton(
+        icon=ft.icons.CONTENT_COPY,
+        tooltip="Копировать всё [Ctrl+C]",
+        on_click=None,
+        disabled=True,
+    )
+    export_button = ft.IconButton(
+        icon=ft.icons.SAVE_ALT,
+        tooltip="Сохранить всё в файл (без загрузки в буфер обмена) [Ctrl+S]",
+        on_click=None,
+        disabled=True,
+    )
+    # Кнопки очистки полей
+    clear_start_prompt_button = ft.IconButton(
+        icon=ft.icons.CLEAR, tooltip="Очистить начальный промпт", on_click=None, disabled=True, icon_size=16
+    )
+    clear_content_display_button = ft.IconButton(
+        icon=ft.icons.CLEAR, tooltip="Очистить основное поле", on_click=None, disabled=True, icon_size=16
+    )
+    clear_end_prompt_button = ft.IconButton(
+        icon=ft.icons.CLEAR, tooltip="Очистить конечный промпт", on_click=None, disabled=True, icon_size=16
+    )
+    clear_all_button = ft.IconButton( # Переименована из clear_content_button
+        icon=ft.icons.CLEAR_ALL,
+        tooltip="Очистить все поля [Ctrl+X]",
+        on_click=None,
+        disabled=True,
+    )
+    perf_panel = PerfPanel(profiler, render=render) # Скрыта по умолчанию; пока скрыта, замеры выключены
+    page.overlay.append(perf_panel.file_picker)
+    perf_button = ft.IconButton(
+        icon=ft.icons.SPEED, selected=perf_panel.visible,
+        tooltip="Панель производительности: время стадий и экспорт замеров [Ctrl+P]",
+        on_click=None,
+    )
+    progress_ring = ft.ProgressRing(visible=False, width=16, height=16, stroke_width=2)
+    scan_status_text = ft.Text("", size=11, visible=False, tooltip="Прогресс сборки: файлы и прочитанный объём [Esc - отменить]")
+
+
+    # 2. Поиск/Фильтр (Левая панель)
+    def handle_filter_change(e):
+        nonlocal filter_text
+        filter_text = e.control.value if filter_engine.content_mode else e.control.value.lower() # Регистр важен в /regex/
+        logging.debug(f"Filter changed: '{filter_text}'")
+        filter_engine.submit(filter_text) # Debounce + фоновое вычисление, результат придёт в apply_filter_result
+
+    @render.batched
+    def apply_filter_result(query: str, visible_ids: Optional[Set[int]]):
+        """Вызывается из потока фильтра с готовым видимым множеством."""
+        nonlocal _current_visible_ids
+        if query != filter_text: return # Пока считали, пользователь ввёл ещё символы
+        _current_visible_ids = visible_ids
+        populate_tree_view()
+        update_button_states()
+        perf_panel.refresh()
+
+    filter_engine = FilterEngine(on_result=apply_filter_result, content_search=ContentSearch(READ_WORKERS, content_index))
+
+    @render.batched
+    def toggle_content_search(e):
+        """Фильтр по именам <-> поиск по содержимому; текущий запрос пересчитывается в новом режиме."""
+        nonlocal filter_text
+        enabled = not filter_engine.content_mode
+        filter_engine.set_content_mode(enabled)
+        render.set(content_search_button, selected=enabled)
+        render.set(filter_input, label="Поиск по содержимому" if enabled else "Фильтр дерева", hint_text="Текст или /регулярное выражение/..." if enabled else "Введите часть имени...")
+        filter_text = (filter_input.value or "") if enabled else (filter_input.value or "").lower()
+        logging.info(f"Content search {'enabled' if enabled else 'disabled'}")
+        filter_engine.submit(filter_text)
+
+    content_search_button = ft.IconButton(
+        icon=ft.icons.FIND_IN_PAGE_OUTLINED, selected_icon=ft.icons.FIND_IN_PAGE, selected=False, icon_size=18,
+        tooltip="Искать по содержимому файлов (Ctrl+A выбирает все найденные файлы)", on_click=toggle_content_search,
+    )
+
+    @render.batched
+    def switch_root(e):
+        """Вкладка корня: дерево и фильтр переключаются на его индекс."""
+        position = int(root_tabs.selected_index or 0)
+        if not 0 <= position < len(workspace_roots) or workspace_roots[position] == current_scan_path: return
+        show_root(workspace_roots[position])
+
+    root_tabs = ft.Tabs(tabs=[], selected_index=0, scrollable=True, visible=False, height=36, on_change=switch_root)
+
+    filter_input = ft.TextField(
+        label="Фильтр дерева", hint_text="Введите часть имени...",
+        prefix_icon=ft.icons.SEARCH, on_change=handle_filter_change,
+        dense=True, filled=False, border_radius=5, text_size=13, expand=True,
+        hint_style=HINT_STYLE # Стиль для placeholder
+    )
+
+    # Функции select_all_visible и deselect_all теперь привязаны к кнопкам в верхней панели
+    @render.batched
+    def select_all_visible(e):
+        if not current_scan_path: return
+        logging.info("Selecting all visible items...")
+        if _current_visible_ids is None: selection.set(tree_index.root, True) # Одно правило вместо всех узлов
+        elif filter_engine.content_mode: # Только найденные файлы, без их папок целиком
+            selection.update((tree_index.path_of(i), True) for i in _current_visible_ids if not tree_index.is_dir(i))
+        else: selection.update((path, True) for path in get_current_visible_paths())
+        tree_view.update(tree_view.refresh_checks()) # Патчим только отрисованные строки
+        update_button_states() # Обновляем все кнопки
+        schedule_state_save()
+
+    @render.batched
+    def deselect_all(e):
+        if not current_scan_path: return
+        logging.info("Deselecting all items...")
+        selection.clear()
+        tree_view.update(tree_view.refresh_checks())
+        update_button_states() # Обновляем все кнопки
+        schedule_state_save()
+
+    select_all_button.on_click = select_all_visible
+    deselect_all_button.on_click = deselect_all
+
+    # select_buttons_row больше не нужен в левой панели
+
+    def update_select_buttons_state():
+        # Эта функция теперь часть общей update_button_states
+        pass
+
+    # 3. Виртуализированное дерево файлов (Левая панель)
+    _current_visible_ids: Optional[Set[int]] = None # None - видны все узлы индекса
+
+    def get_current_visible_paths() -> Set[Path]:
+        if tree_index is None: return set()
+        if _current_visible_ids is None: return {tree_index.path_of(i) for i in tree_index.iter_alive()}
+        return {tree_index.path_of(i) for i in _current_visible_ids}
+
+    def rebuild_index(prefer_cache: bool = False):
+        """Строит индексы корней рабочего пространства (единственный полный обход диска для каждого).
+
+        Корни без индекса строятся параллельно; без prefer_cache активный корень строится заново.
+        С prefer_cache индекс сначала берётся из кэша на диске и сразу отрисовывается,
+        а сверка с диском по mtime папок идёт в фоне (revalidate_cached_index)."""
+        if not prefer_cache and current_scan_path is not None: indexes.pop(current_scan_path, None)
+        for root in [root for root in indexes if root not in workspace_roots]: del indexes[root]
+        missing = [root for root in workspace_roots if root not in indexes and root.is_dir()]
+        load = (lambda root: index_store.load(root, IgnoreRules(root))) if prefer_cache else None
+        built = build_indexes(missing, load=load)
+        for root, (index, _) in built.items(): indexes[root] = index
+        active_from_cache = current_scan_path in built and built[current_scan_path][1]
+        # Наблюдатель стартует после сверки, чтобы они не обновляли одни и те же папки одновременно
+        activate_root(current_scan_path, watch=not active_from_cache)
+        for index, from_cache in built.values():
+            if from_cache: threading.Thread(target=revalidate_cached_index, args=(index,), name="index-revalidate", daemon=True).start()
+            else: threading.Thread(target=index_store.save, args=(index,), name="index-save", daemon=True).start()
+
+    def activate_root(root: Optional[Path], watch: bool = True):
+        """Делает корень активным: его индекс в дереве и фильтре. Наблюдатель следит только за активным корнем."""
+        nonlocal current_scan_path, tree_index, _current_visible_ids
+        current_scan_path = root
+        tree_index = indexes.get(root) if root is not None else None
+        filter_engine.set_index(tree_index)
+        tree_view.set_index(tree_index)
+        _current_visible_ids = filter_paths(filter_text)
+        if root is not None: selected_directory_text.value = f"Выбрано: {root}" + (f" · корней: {len(workspace_roots)}" if len(workspace_roots) > 1 else "")
+        update_root_tabs()
+        if watch or tree_index is None: restart_watcher()
+
+    def show_root(root: Path):
+        """Переключение на другой корень: пока он был неактивен, за ним не следили - сверка в фоне."""
+        activate_root(root, watch=False)
+        save_last_directory(root)
+        populate_tree_view()
+        update_button_states()
+        render.mark(selected_directory_text)
+        if tree_index is not None: threading.Thread(target=revalidate_cached_index, args=(tree_index,), name="index-revalidate", daemon=True).start()
+
+    def update_root_tabs():
+        labels = root_labels(workspace_roots)
+        root_tabs.tabs = [ft.Tab(text=labels[root]) for root in workspace_roots]
+        root_tabs.selected_index = workspace_roots.index(current_scan_path) if current_scan_path in workspace_roots else 0
+        root_tabs.visible = len(workspace_roots) > 1
+        render.mark(root_tabs)
+
+    @render.batched
+    def remove_active_root(e):
+        if len(workspace_roots) <= 1 or current_scan_path not in workspace_roots: return
+        root = current_scan_path
+        position = workspace_roots.index(root)
+        workspace_roots.remove(root); indexes.pop(root, None)
+        selection.remove(root) # Сохранённый выбор корня остаётся в кэше и вернётся при повторном добавлении
+        expanded_nodes.difference_update([p for p in expanded_nodes if p.is_relative_to(root)])
+        logging.info(f"Root removed from workspace: {root} ({len(workspace_roots)} roots)")
+        show_root(workspace_roots[min(position, len(workspace_roots) - 1)])
+        schedule_state_save()
+
+    remove_root_button.on_click = remove_active_root
+
+    def revalidate_cached_index(index: TreeIndex):
+        """Фоновая сверка индекса из кэша с диском; изменения применяются как пачка от наблюдателя."""
+        nonlocal _current_visible_ids
+        try:
+            added, removed = index.revalidate()
+        except Exception as revalidate_err:
+            logging.error(f"Error revalidating cached index: {revalidate_err}")
+            return
+        if indexes.get(index.root) is not index: return # Пока сверяли, выбрали другую директорию или убрали корень
+        for removed_path in removed:
+            content_cache.invalidate(removed_path)
+            selection.remove(removed_path)
+            expanded_nodes.discard(removed_path)
+        if index is tree_index: # Неактивный корень перерисуется при переключении на него
+            if added or removed:
+                filter_engine.set_index(index)
+                _current_visible_ids = filter_paths(filter_text)
+                with render.batch():
+                    populate_tree_view()
+                    update_button_states()
+            restart_watcher()
+        index_store.save(index)
+
+    def restore_saved_state(roots: Optional[Sequence[Path]] = None):
+        """Выбор и развёрнутые папки с прошлого открытия корней (тех, где сейчас ничего не выбрано и не раскрыто)."""
+        restored = 0
+        for root in workspace_roots if roots is None else roots:
+            if root not in indexes or selection.restricted(root) or any(p.is_relative_to(root) for p in expanded_nodes): continue
+            saved = index_store.load_state(root)
+            selection.update([(p, True) for p in saved.selected if is_known_path(p)] + [(p, False) for p in saved.excluded if is_known_path(p)])
+            expanded_nodes.update(p for p in saved.expanded if is_known_path(p))
+            restored += len(saved.selected) + len(saved.expanded)
+        if restored: logging.info(f"Restored {len(selection.rules())} selection rules and {len(expanded_nodes)} expanded items.")
+
+    def index_for(path: Path) -> Optional[TreeIndex]:
+        root = root_of(path, workspace_roots)
+        return indexes.get(root) if root is not None else None
+
+    def is_known_path(path: Path) -> bool:
+        index = index_for(path)
+        return index is not None and (path == index.root or index.id_of(path) is not None)
+
+    def save_workspace_state(roots: List[Path], included: List[Path], expanded: Set[Path], excluded: List[Path]):
+        """Выбор и развёрнутые папки сохраняются отдельно для каждого корня."""
+        for root in roots:
+            index_store.save_state(
+                root, [p for p in included if p.is_relative_to(root)], {p for p in expanded if p.is_relative_to(root)},
+                [p for p in excluded if p.is_relative_to(root)],
+            )
+
+    def schedule_state_save():
+        nonlocal state_save_timer
+        schedule_estimate() # Сохранение ставится на каждое изменение выбора - оценка объёма тоже
+        if tree_index is None: return
+        if state_save_timer is not None: state_save_timer.cancel()
+        state_save_timer = threading.Timer(STATE_SAVE_DELAY, save_workspace_state, args=(list(indexes), selection.included(), set(expanded_nodes), selection.excluded()))
+        state_save_timer.daemon = True
+        state_save_timer.start()
+
+    # --- Бюджет: оценка объёма выбора до чтения ---
+    def schedule_estimate():
+        nonlocal estimate_timer
+        if estimate_timer is not None: estimate_timer.cancel()
+        estimate_timer = threading.Timer(ESTIMATE_DELAY, estimate_selection, args=(selection.copy(), list(workspace_roots), dict(indexes), file_cap_bytes, budget_tokens))
+        estimate_timer.daemon = True
+        estimate_timer.start()
+
+    def estimate_selection(snapshot: SelectionTrie, roots: List[Path], index_map: Dict[Path, TreeIndex], file_cap: int, budget: int):
+        """Фоново: файлы выбора по индексам и план бюджета по размерам из обхода, без чтения содержимого."""
+        token = estimate_controller.start()
+        try:
+            if not snapshot: text = ""
+            else:
+                files, _, _ = collect_workspace(snapshot, roots, indexes=index_map, token=token)
+                text = plan_budget(file_sizes(files, index_map), file_cap, budget).describe()
+        except ScanCancelled: return
+        except Exception as estimate_err:
+            logging.warning(f"Could not estimate selection size: {estimate_err}")
+            return
+        finally:
+            estimate_controller.finish(token)
+        if estimate_controller.is_current(token): render.set(budget_estimate_text, value=text) # Отправится с ближайшим кадром
+
+    @render.batched
+    def budget_settings_changed(e):
+        nonlocal file_cap_bytes, budget_tokens
+        file_cap_kb = int(file_cap_input.value) if (file_cap_input.value or "").strip().isdigit() else DEFAULT_FILE_CAP_BYTES // 1024
+        budget_tokens = int(budget_input.value) if (budget_input.value or "").strip().isdigit() else 0
+        file_cap_bytes = file_cap_kb * 1024
+        try:
+            page.client_storage.set(FILE_CAP_KEY, file_cap_kb); page.client_storage.set(BUDGET_KEY, budget_tokens)
+        except Exception as storage_err:
+            logging.error(f"Failed to save budget settings: {storage_err}")
+        schedule_estimate()
+
+    budget_input = ft.TextField(
+        label="Бюджет, токены", hint_text="без лимита", value="", width=130, dense=True, text_size=12,
+        keyboard_type=ft.KeyboardType.NUMBER, hint_style=HINT_STYLE, on_change=budget_settings_changed,
+        tooltip="Общий лимит результата (≈4 байта на токен); файлы сверх бюджета не читаются",
+    )
+    file_cap_input = ft.TextField(
+        label="Файл, КБ", value=str(DEFAULT_FILE_CAP_BYTES // 1024), width=90, dense=True, text_size=12,
+        keyboard_type=ft.KeyboardType.NUMBER, on_change=budget_settings_changed,
+        tooltip="От файла больше лимита берутся начало и конец; 0 - без лимита",
+    )
+    budget_estimate_text = ft.Text("", size=11, tooltip="Оценка выбора по размерам файлов, до чтения")
+
+    # --- Режим изменений: только файлы, изменённые с последнего копирования ---
+    def delta_mode_changed(e):
+        nonlocal delta_mode
+        delta_mode = delta_mode_dropdown.value if delta_mode_dropdown.value in DELTA_MODES else DELTA_OFF
+        try: page.client_storage.set(DELTA_KEY, delta_mode)
+        except Exception as storage_err: logging.error(f"Failed to save delta mode: {storage_err}")
+
+    delta_mode_dropdown = ft.Dropdown(
+        label="Результат", value=DELTA_OFF, width=225, dense=True, text_size=12, on_change=delta_mode_changed,
+        options=[
+            ft.dropdown.Option(DELTA_OFF, "Полный"),
+            ft.dropdown.Option(DELTA_FILES, "Изменения с копирования"),
+            ft.dropdown.Option(DELTA_DIFF, "Изменения как diff"),
+        ],
+        tooltip="Снимок результата запоминается при копировании и сохранении; в режиме изменений выводятся только новые, изменённые и удалённые файлы",
+    )
+
+    def commit_snapshot():
+        """Скопированный или сохранённый результат становится снимком для режима изменений (запись в фоне)."""
+        nonlocal pending_snapshot
+        if pending_snapshot is None or pending_snapshot[0] is not current_output: return
+        _, tracker, roots = pending_snapshot
+        pending_snapshot = None # Повторное копирование того же результата снимок не меняет
+
+        def save():
+            for root in roots: index_store.save_snapshot(root, *tracker.for_root(root))
+        threading.Thread(target=save, name="snapshot-save", daemon=True).start()
+
+    def schedule_index_save():
+        nonlocal index_save_timer
+        if tree_index is None or index_save_timer is not None and index_save_timer.is_alive(): return
+        index_save_timer = threading.Timer(INDEX_SAVE_DELAY, index_store.save, args=(tree_index,))
+        index_save_timer.daemon = True
+        index_save_timer.start()
+
+    # --- Наблюдение за файловой системой ---
+    def restart_watcher():
+        """(Пере)запускает наблюдатель для текущей директории, если он включён."""
+        nonlocal fs_watcher
+        if fs_watcher is not None: fs_watcher.stop(); fs_watcher = None
+        if watch_button.selected and tree_index is not None:
+            fs_watcher = FsWatcher(tree_index.root, on_changes=apply_fs_changes, rules=tree_index.rules)
+            fs_watcher.start()
+
+    @render.batched
+    def toggle_watch(e):
+        render.set(watch_button, selected=not watch_button.selected)
+        logging.info(f"File watching {'enabled' if watch_button.selected else 'disabled'}")
+        restart_watcher()
+
+    watch_button.on_click = toggle_watch
+
+    @render.batched
+    def apply_fs_changes(batch: ChangeBatch):
+        """Применяет пачку изменений из потока наблюдателя: патч индекса, точечная инвалидация кэша.
+        Выбор и развёрнутые узлы сохраняются (кроме удалённых путей)."""
+        nonlocal _current_visible_ids
+        if tree_index is None: return
+        ignore_files_changed = any(path.name in IGNORE_FILE_NAMES for path in batch.files)
+        if batch.overflow or ignore_files_changed: # Новые правила могут скрыть или открыть любое поддерево
+            logging.warning("FS event queue overflow, rebuilding index." if batch.overflow else "Ignore rules changed, rebuilding index.")
+            kept_selection, kept_expanded = selection.rules(), set(expanded_nodes)
+            rebuild_index() # Перезапускает и наблюдатель
+            selection.clear(); selection.update((p, selected) for p, selected in kept_selection if is_known_path(p))
+            expanded_nodes.clear(); expanded_nodes.update(p for p in kept_expanded if is_known_path(p))
+            content_cache.clear(); content_index.clear()
+        else:
+            removed: Set[Path] = set()
+            for dir_path in sorted(batch.dirs, key=lambda p: len(p.parts)): # Сначала родители: новые подпапки индексируются целиком
+                _, removed_paths = tree_index.refresh_dir(dir_path)
+                removed.update(removed_paths)
+            for file_path in batch.files:
+                tree_index.refresh_stat(file_path)
+                content_cache.invalidate(file_path)
+            for removed_path in removed:
+                content_cache.invalidate(removed_path)
+                selection.remove(removed_path)
+                expanded_nodes.discard(removed_path)
+            filter_engine.set_index(tree_index) # Имена могли добавиться или исчезнуть
+            _current_visible_ids = filter_paths(filter_text)
+            schedule_index_save()
+        schedule_state_save()
+        populate_tree_view()
+        update_button_states()
+
+    @render.batched
+    def toggle_expand(node_id: int):
+        node_path = tree_index.path_of(node_id)
+        if node_path in expanded_nodes:
+            expanded_nodes.remove(node_path)
+            logging.debug(f"Node collapsed: {node_path}")
+        else:
+            expanded_nodes.add(node_path)
+            logging.debug(f"Node expanded: {node_path}")
+        populate_tree_view() # Пересчёт плоской модели; отрисовывается только окно
+        update_button_states() # Обновляем кнопки
+        schedule_state_save()
+
+    @render.batched
+    def checkbox_changed(node_id: int, value: Optional[bool]):
+        # Значение от tristate-чекбокса не используется: клик по отмеченной папке снимает её целиком,
+        # по неотмеченной или частично выбранной - отмечает; внутри отмеченной папки снятие - это исключение
+        item_path = tree_index.path_of(node_id)
+        selected = selection.state(item_path) is not CHECKED
+        selection.set(item_path, selected)
+        logging.debug(f"{'Included in' if selected else 'Excluded from'} selection: {item_path}")
+        tree_view.update(tree_view.refresh_checks()) # Меняются отметки предков (частичный выбор) и потомков
+        update_button_states() # Обновляем кнопки
+        schedule_state_save()
+
+    tree_view = VirtualTreeView(
+        on_toggle_expand=toggle_expand, on_check=checkbox_changed,
+        is_selected=lambda node_id: selection.state(tree_index.path_of(node_id)),
+        is_expanded=lambda node_id: tree_index.path_of(node_id) in expanded_nodes,
+        render=render,
+    )
+    dir_tree_container = tree_view.list_view
+
+    def filter_paths(current_filter: str) -> Optional[Set[int]]:
+        """Синхронно: видимые узлы индекса - совпадения по имени плюс их предки (None - видно всё)."""
+        return filter_engine.compute(current_filter)
+
+    def populate_tree_view():
+        logging.info(f"Populating tree view for: {current_scan_path} with filter: '{filter_text}'")
+        if tree_index is None:
+            tree_view.show_message("Директория не выбрана.")
+            tree_view.update()
+            return
+        visible_ids = _current_visible_ids # Вычисляется FilterEngine при вводе фильтра и при построении индекса
+        try:
+            with profiler.span("tree_render") as span:
+                expanded_ids = {node_id for node_id in map(tree_index.id_of, expanded_nodes) if node_id is not None}
+                rows = tree_index.flatten(visible_ids, expanded_ids)
+                logging.info(f"Tree model: {len(rows)} rows ({len(tree_index) if visible_ids is None else len(visible_ids)} visible items).")
+                if not rows: tree_view.show_message(f"Ничего не найдено по запросу '{filter_text}'." if filter_text else "Папка пуста или все отфильтровано.")
+                else: tree_view.set_rows(rows)
+                span.set(rows=len(rows), rendered=tree_view.rendered_rows)
+        except Exception as e: tree_view.show_message(f"Ошибка построения дерева: {e}", color=ft.colors.RED); logging.error(f"Error building tree: {e}")
+        tree_view.update() # Помечает окно списка; отправка - вместе с остальными изменениями события
+        # Обновление кнопок происходит из вызывающей функции (update_ui_after_selection, refresh_data и т.д.)
+
+
+    # --- Правая панель: Поля и их кнопки очистки ---
+    def _create_field_with_clear_button(textfield: ft.TextField, clear_button: ft.IconButton):
+        # Helper для создания строки с полем и кнопкой очистки
+        return ft.Row(
+            [textfield, clear_button],
+            vertical_alignment=ft.CrossAxisAlignment.START, # Кнопка сверху
+            spacing=0 # Убрать лишний отступ
+        )
+
+    # 4. Поля для промптов и основного контента
+    start_prompt_input = ft.TextField(
+        label="Начальный промпт:", multiline=True, min_lines=3, max_lines=8, # Увеличена высота
+        dense=True, text_size=12, border_radius=5, hint_text="Добавьте текст перед содержимым файлов...",
+        hint_style=HINT_STYLE, expand=True, # expand=True чтобы заполнить Row
+        on_change=lambda e: on_text_field_change(e) # Кнопки очистки и общие кнопки
+    )
+    content_display = ft.TextField(
+        multiline=True, read_only=True, expand=True, # Основное поле растягивается в Column
+        border=ft.InputBorder.NONE, text_size=13, min_lines=15, # Оставим побольше строк
+        hint_text="Содержимое выбранных файлов появится здесь...", hint_style=HINT_STYLE,
+        on_change=lambda e: on_text_field_change(e)
+    )
+    preview = PreviewPager(content_display, render=render) # Страницы результата и оглавление по файлам
+    end_prompt_input = ft.TextField(
+        label="Завершающий промпт:", multiline=True, min_lines=3, max_lines=8, # Увеличена высота
+        dense=True, text_size=12, border_radius=5, hint_text="Добавьте текст после содержимого файлов...",
+        hint_style=HINT_STYLE, expand=True,
+        on_change=lambda e: on_text_field_change(e)
+    )
+
+    # --- Функции управления UI и данными ---
+    @render.batched
+    def clear_field(textfield: ft.TextField, button: ft.IconButton):
+        """Очищает указанное текстовое поле и обновляет кнопки."""
+        textfield.value = ""
+        if textfield is content_display: set_output(None)
+        render.mark(textfield)
+        render.set(button, disabled=True)
+        update_button_states() # Обновляем общие кнопки (Copy, Clear All)
+
+    clear_start_prompt_button.on_click = lambda _: clear_field(start_prompt_input, clear_start_prompt_button)
+    clear_content_display_button.on_click = lambda _: clear_field(content_display, clear_content_display_button)
+    clear_end_prompt_button.on_click = lambda _: clear_field(end_prompt_input, clear_end_prompt_button)
+
+    @render.batched
+    def clear_all_fields(e):
+        """Очищает все три поля."""
+        logging.info("Clearing all fields.")
+        clear_field(start_prompt_input, clear_start_prompt_button)
+        clear_field(content_display, clear_content_display_button)
+        clear_field(end_prompt_input, clear_end_prompt_button)
+        # Кнопка Clear All тоже должна стать disabled, это произойдет в update_button_states()
+        # update_button_states() вызывается из clear_field
+
+    clear_all_button.on_click = clear_all_fields # Назначаем обработчик для Clear All
+
+    def update_button_states():
+        """Обновляет состояние ВСЕХ кнопок на основе текущего состояния приложения."""
+        # Состояния
+        is_dir_selected = tree_index is not None
+        is_anything_selected_in_tree = bool(selection)
+        has_items_in_tree = tree_view.has_rows
+        has_start_prompt = bool(start_prompt_input.value)
+        has_content = bool(content_display.value)
+        has_end_prompt = bool(end_prompt_input.value)
+        has_any_content_to_manage = has_start_prompt or has_content or has_end_prompt
+
+        # Кнопки верхней панели
+        # pick_dir_button - всегда активна
+        scan_running = scan_controller.running
+        # render.set помечает кнопку, только если её состояние действительно изменилось
+        render.set(select_all_button, disabled=not (has_items_in_tree and is_dir_selected))
+        render.set(deselect_all_button, disabled=not (is_anything_selected_in_tree and is_dir_selected)) # Активна если что-то выбрано
+        render.set(show_content_button, disabled=not (is_anything_selected_in_tree and is_dir_selected)) # Повторный запуск вытесняет текущее сканирование
+        render.set(refresh_button, disabled=not is_dir_selected or scan_running)
+        render.set(watch_button, disabled=not is_dir_selected)
+        render.set(add_root_button, disabled=not is_dir_selected)
+        render.set(remove_root_button, disabled=len(workspace_roots) <= 1)
+        render.set(copy_button, disabled=not has_any_content_to_manage) # Частичный результат можно копировать и во время сканирования
+        render.set(export_button, disabled=not has_any_content_to_manage)
+        render.set(clear_all_button, disabled=not has_any_content_to_manage or scan_running)
+
+        # Кнопки очистки полей
+        render.set(clear_start_prompt_button, disabled=not has_start_prompt)
+        render.set(clear_content_display_button, disabled=not has_content or scan_running)
+        render.set(clear_end_prompt_button, disabled=not has_end_prompt)
+
+    @render.batched
+    def on_text_field_change(e):
+        update_button_states() # Кнопки очистки и общие кнопки (Copy, Clear All)
+
+    def clear_ui_on_error():
+        nonlocal tree_index, _current_visible_ids
+        tree_view.set_index(None)
+        tree_view.show_message("Выберите корректную директорию.")
+        # Очищаем поля
+        clear_field(start_prompt_input, clear_start_prompt_button)
+        clear_field(content_display, clear_content_display_button)
+        clear_field(end_prompt_input, clear_end_prompt_button)
+        selection.clear()
+        expanded_nodes.clear()
+        workspace_roots.clear(); indexes.clear()
+        tree_index = None; _current_visible_ids = set()
+        filter_engine.set_index(None)
+        update_root_tabs()
+        restart_watcher() # Останавливает наблюдатель: директории больше нет
+        # Обновляем состояние всех кнопок
+        update_button_states()
+        # Обновляем остальные компоненты
+        render.mark(dir_tree_container, filter_input, selected_directory_text) # Текст мог измениться
+
+    def update_ui_after_selection():
+        rebuild_index(prefer_cache=True) # Повторное открытие рисуется из кэша, сверка с диском - в фоне
+        restore_saved_state()
+        schedule_estimate()
+        populate_tree_view()
+        set_output(None)
+        content_display.value = "Выберите файлы/папки в дереве слева и нажмите 'Показать' [Enter]." # Обновлено сообщение с подсказкой hotkey
+        scan_status_text.visible = False
+        # Не сбрасываем промпты здесь
+        # Обновляем состояние всех кнопок
+        update_button_states()
+        # Обновляем компоненты
+        render.mark(content_display, scan_status_text, start_prompt_input, end_prompt_input, filter_input, selected_directory_text)
+
+
+    # --- Логика сканирования ---
+    async def scan_and_display_content(
+        paths_to_scan: SelectionTrie, roots: Sequence[Path],
+        display_control: ft.TextField, prog_ring: ft.ProgressRing, indexes: Optional[Mapping[Path, TreeIndex]] = None,
+        read_workers: int = READ_WORKERS, cache: Optional[ContentCache] = None, token: Optional[CancelToken] = None,
+        file_cap: int = DEFAULT_FILE_CAP_BYTES, budget: int = DEFAULT_BUDGET_TOKENS, delta: str = DELTA_OFF,
+        # Кнопки больше не передаем, используем глобальные ссылки и update_button_states
+    ):
+        """Сборка как конвейер asyncio на цикле событий страницы.
+
+        Сбор файлов и план бюджета выполняются в пуле потоков (run_blocking), чтение - стадиями
+        aiter_blocks с ограниченными очередями. Контролы меняются только здесь, в потоке цикла
+        страницы, и отправляются явным flush; между блоками цикл обслуживает остальные события.
+        Снимок прочитанного копится всегда; с delta файлы сверяются с прошлым снимком корней.
+        """
+        nonlocal pending_snapshot
+        token = token or scan_controller.start()
+        if not paths_to_scan:
+             logging.warning("scan_and_display_content called with empty selection.")
+             final_text = "Ошибка: Не выбраны файлы или папки для отображения."
+             scan_error = None
+             display_control.value = final_text
+             prog_ring.visible = False
+             scan_controller.finish(token)
+             update_button_states() # Обновляем состояние кнопок
+             render.mark(display_control, prog_ring); render.flush()
+             return
+
+        logging.info(f"Scanning content for {len(paths_to_scan.rules())} selection rules.")
+        output = OutputBuffer(OUTPUT_SPILL_CHARS) # Блоки не склеиваются: в поле уходит только начало результата
+        files_to_process: List[Path] = []
+        plan = None
+        tracker: Optional[DeltaTracker] = None
+        deduplicator = BlockDeduplicator() # Одинаковое содержимое выводится один раз, повторы - ссылкой
+        scan_error = None
+        final_text = ""
+        files_done = 0; bytes_read = 0
+        cancelled = False
+        try:
+            # 1. Сбор файлов (по индексам корней, параллельно и без лишних обращений к диску)
+            files_to_process, file_bases, dir_error_blocks = await run_blocking(
+                lambda: collect_workspace(paths_to_scan, roots, indexes=indexes, token=token)
+            )
+            for error_block in dir_error_blocks: output.append(error_block)
+            collected = files_to_process
+            # 2. Сверка со снимком по свежему stat (stat в индексе отстаёт от правок на месте): нетронутые файлы не читаются
+            previous = await run_blocking(lambda: merge_snapshots(index_store.load_snapshot(root) for root in roots)) if delta != DELTA_OFF else None
+            tracker = DeltaTracker(previous, delta)
+            files_to_process, file_bases, stamps = tracker.select_reads(files_to_process, file_bases, await run_blocking(file_stamps, files_to_process))
+            # 3. План бюджета по размерам из того же свежего stat (file_stamps): большие файлы обрезаются, файлы сверх бюджета не читаются
+            plan = plan_budget([size for _, size in stamps], file_cap, budget)
+            total_files_count = plan.files; logging.info(f"Total text files to read: {total_files_count} of {len(files_to_process)}, ~{plan.tokens} tokens")
+            # 4. Чтение файлов: блоки приходят по порядку и публикуются в UI пачками не чаще STREAM_PUBLISH_INTERVAL
+            publish_scan_progress(token, display_control, prog_ring, output, 0, total_files_count, 0)
+            last_publish = time.monotonic()
+            with profiler.span("read", workers=read_workers) as read_span: # Включает промежуточные публикации в UI
+                try:
+                    async for block in aiter_blocks(files_to_process[:plan.files], None, workers=read_workers, cache=cache, token=token, bases=file_bases, limits=plan.limits): # Один пул чтения на все корни
+                        label = str(relative_display_path(block.path, file_bases[files_done]))
+                        text = tracker.record(block, stamps[files_done], label)
+                        if text is block.text: text = deduplicator.process(block, label)
+                        if text is not None: output.append(text, label=label, size=block.size, lines=block_line_count(text))
+                        files_done += 1; bytes_read += block.size
+                        if block.cached: read_span.add(cached=1)
+                        if time.monotonic() - last_publish >= STREAM_PUBLISH_INTERVAL:
+                            publish_scan_progress(token, display_control, prog_ring, output, files_done, total_files_count, bytes_read)
+                            last_publish = time.monotonic()
+                finally:
+                    read_span.set(files=files_done, bytes=bytes_read, duplicates=deduplicator.duplicates)
+            if tracker.active:
+                display = display_bases(roots)
+                for deleted_path in await run_blocking(tracker.deleted, paths_to_scan.is_selected, set(collected)):
+                    label = str(relative_display_path(deleted_path, display[root_of(deleted_path, roots)]))
+                    output.append(format_deleted_block(label), label=label)
+                output.append(format_delta_note(tracker))
+            output.append(format_dedup_note(deduplicator))
+            budget_note = format_budget_note(plan)
+            if budget_note: output.append(budget_note)
+            if cache is not None: logging.info(f"Content cache: {cache.hits} hits, {cache.misses} misses, {len(cache)} entries, {cache.current_bytes} chars")
+        except ScanCancelled: cancelled = True
+        except Exception as general_scan_err: logging.error(f"Error during selected content scan preparation: {general_scan_err}"); scan_error = general_scan_err
+        finally:
+            scan_controller.finish(token)
+            # --- Обновление UI (только для последнего поколения) ---
+            if not scan_controller.is_current(token):
+                logging.info(f"Scan generation {token.generation} superseded, result discarded.")
+                if output is not current_output: output.close()
+                return
+            with profiler.span("assemble", parts=output.part_count) as span: # Предпросмотр, а не склейка всего результата
+                if scan_error: final_text = f"Произошла ошибка при сканировании:\n\n{scan_error}"
+                elif cancelled and not len(output): final_text = "Сканирование отменено."
+                elif not len(output): final_text = "Не найдено текстовых файлов в выбранных элементах (или они были отфильтрованы)."
+                if scan_error or not len(output): output.close(); output = None # Сообщение вместо результата - буфер не нужен
+                set_output(output) # Результат: в поле - первая страница
+                pending_snapshot = (output, tracker, list(roots)) if output is not None and tracker is not None else None
+                if output is None: display_control.value = final_text
+                span.set(chars=len(output) if output is not None else 0, pages=preview.page_count, spilled=int(output is not None and output.spilled))
+            prog_ring.visible = False; prog_ring.value = None
+            scan_status_text.value = (
+                f"{files_done} файлов · {format_size(bytes_read)}" + (f" · обрезано: {plan.truncated}" if plan is not None and plan.truncated else "")
+                + (f" · вне бюджета: {plan.skipped}" if plan is not None and plan.skipped else "")
+                + (f" · {deduplicator.summary()}" if deduplicator.duplicates else "")
+                + (f" · {tracker.summary()}" if tracker is not None and tracker.active else "") + (" · отменено" if cancelled else "")
+            )
+            update_button_states() # Обновляем все кнопки
+            perf_panel.refresh()
+            logging.info("Selected content scanning complete. Requesting page update.")
+            render.mark(display_control, prog_ring, scan_status_text)
+            render.flush() # Итог не ждёт кадра
+
+    def publish_scan_progress(
+        token: CancelToken, display_control: ft.TextField, prog_ring: ft.ProgressRing,
+        output: OutputBuffer, files_done: int, files_total: int, bytes_read: int
+    ):
+        """Промежуточная публикация из конвейера сканирования (в цикле страницы): готовые блоки и счётчики прогресса."""
+        if not scan_controller.is_current(token) or token.cancelled: return # Устаревшее поколение не трогает UI
+        with render.batch(): # Отправка сразу, из цикла страницы, а не таймером кадра из другого потока
+            if len(output):
+                if output is current_output: preview.refresh() # Текущая страница остаётся, добавляются новые
+                else: set_output(output) # Частичный результат можно листать, копировать и сохранять целиком
+            prog_ring.value = files_done / files_total if files_total else None
+            scan_status_text.value = f"{files_done}/{files_total} файлов · {format_size(bytes_read)}"
+            update_button_states() # Копирование частичного результата становится доступным
+            render.mark(display_control, prog_ring, scan_status_text)
+
+    def set_output(output: Optional[OutputBuffer]):
+        """Сменить текущий результат; прежний буфер (и его временный файл) освобождается.
+        С результатом поле вывода показывает его первую страницу, без него - сообщение."""
+        nonlocal current_output
+        previous, current_output = current_output, output
+        if previous is not None and previous is not output: previous.close()
+        preview.set_output(output)
+
+    @render.batched
+    def start_scan_async(e):
+        if not selection or show_content_button.disabled: return # Проверяем доступность кнопки
+        token = scan_controller.start() # Отменяет предыдущее сканирование, если оно ещё идёт
+        logging.info(f"Starting scan generation {token.generation}")
+        progress_ring.visible = True; progress_ring.value = None
+        scan_status_text.value = "Сбор файлов..."; scan_status_text.visible = True
+        content_display.value = "Подготовка к сканированию..."
+        set_output(None)
+        update_button_states()
+        render.mark(progress_ring, scan_status_text, content_display)
+        render.flush() # Обновляем UI перед запуском конвейера
+        paths_to_scan_copy = selection.copy() # Снимок: выбор можно менять, пока идёт сканирование
+        page.run_task( # Конвейер работает на цикле событий страницы; новый запуск вытесняет его через token
+            scan_and_display_content,
+            paths_to_scan_copy, list(workspace_roots), content_display, progress_ring, dict(indexes), READ_WORKERS, content_cache, token, file_cap_bytes, budget_tokens, delta_mode,
+        )
+
+    show_content_button.on_click = start_scan_async
+
+    @render.batched
+    def refresh_data(e):
+        nonlocal filter_text
+        if refresh_button.disabled: return # Не выполнять если кнопка неактивна
+        if current_scan_path and current_scan_path.is_dir():
+            logging.info(f"Refreshing data for: {current_scan_path}")
+            page.splash = ft.ProgressBar(); page.update()
+            selection.remove(current_scan_path) # Выбор в остальных корнях рабочего пространства сохраняется
+            expanded_nodes.difference_update([p for p in expanded_nodes if p.is_relative_to(current_scan_path)])
+            filter_input.value = ""; filter_text = ""
+            rebuild_index() # Заново строится только активный корень
+            schedule_state_save()
+            populate_tree_view()
+            content_display.value = "Дерево обновлено. Выберите элементы и нажмите 'Показать' [Enter]."
+            set_output(None)
+            # Не сбрасываем промпты
+            update_button_states() # Обновляем кнопки
+            logging.info("Refresh complete.")
+            page.splash = None; render.mark_page()
+        else:
+            logging.warning("Refresh clicked but no valid directory selected.")
+            clear_ui_on_error()
+
+    refresh_button.on_click = refresh_data
+
+    def copy_to_clipboard(e):
+        if copy_button.disabled: return
+        # Результат берётся из буфера целиком (в поле - только предпросмотр) и склеивается с промптами один раз
+        full_text_to_copy = compose_text(
+            start_prompt_input.value or "", current_output, end_prompt_input.value or "",
+            body_text=content_display.value or "" if current_output is None else "",
+        )
+        if full_text_to_copy:
+            logging.info(f"Copying {len(full_text_to_copy)} chars (incl. prompts) to clipboard.")
+            try:
+                with profiler.span("clipboard", chars=len(full_text_to_copy)): pyperclip.copy(full_text_to_copy)
+                commit_snapshot()
+                page.show_snack_bar(ft.SnackBar(ft.Text("Промпты и текст скопированы!"), open=True))
+            except Exception as clip_err:
+                 logging.error(f"Clipboard error: {clip_err}")
+                 try:
+                     page.set_clipboard(full_text_to_copy)
+                     commit_snapshot()
+                     page.show_snack_bar(ft.SnackBar(ft.Text("Промпты и текст скопированы (Flet)!"), open=True))
+                 except Exception as flet_clip_err:
+                     logging.error(f"Flet Clipboard error: {flet_clip_err}")
+                     page.show_snack_bar(ft.SnackBar(ft.Text(f"Ошибка копирования: {flet_clip_err}"), open=True, bgcolor=ft.colors.RED_200))
+        else:
+            logging.info("Copy clicked, but nothing to copy."); page.show_snack_bar(ft.SnackBar(ft.Text("Нет текста для копирования."), open=True))
+
+    copy_button.on_click = copy_to_clipboard
+
+    def export_result(e: ft.FilePickerResultEvent):
+        if not e.path: return
+        output = current_output
+        try:
+            with profiler.span("export") as span:
+                with open(e.path, "w", encoding="utf-8", newline="\n") as out: # Потоком по частям, без сборки в одну строку
+                    written = compose_output(
+                        out, start_prompt_input.value or "", output, end_prompt_input.value or "",
+                        body_text=content_display.value or "" if output is None else "",
+                    )
+                span.set(chars=written)
+            logging.info(f"Exported {written} chars to {e.path}")
+            if output is current_output: commit_snapshot()
+            page.show_snack_bar(ft.SnackBar(ft.Text(f"Сохранено: {e.path}"), open=True))
+        except Exception as export_err:
+            logging.error(f"Export error: {export_err}")
+            page.show_snack_bar(ft.SnackBar(ft.Text(f"Ошибка сохранения: {export_err}"), open=True, bgcolor=ft.colors.RED_200))
+
+    export_picker = ft.FilePicker(on_result=export_result)
+    page.overlay.append(export_picker)
+
+    def start_export(e):
+        if export_button.disabled: return
+        export_picker.save_file(dialog_title="Сохранить результат", file_name="aggregated.txt", allowed_extensions=["txt", "md"])
+
+    export_button.on_click = start_export
+
+    @render.batched
+    def toggle_perf_panel(e):
+        render.set(perf_button, selected=perf_panel.toggle())
+        render.mark(perf_panel.container)
+
+    perf_button.on_click = toggle_perf_panel
+
+    # --- Обработчик Горячих Клавиш ---
+    @render.batched
+    def on_keyboard(e: ft.KeyboardEvent):
+        logging.debug(f"Keyboard event: key={e.key}, shift={e.shift}, ctrl={e.ctrl}, alt={e.alt}, meta={e.meta}")
+        if e.ctrl:
+            if e.key == "O": # Ctrl + O - Выбрать директорию
+                logging.info("Hotkey Ctrl+O detected.")
+                pick_dir_button.on_click(None) # Вызываем обработчик кнопки
+            elif e.key == "A": # Ctrl + A - Выбрать все
+                 logging.info("Hotkey Ctrl+A detected.")
+                 if not select_all_button.disabled:
+                     select_all_visible(None)
+            elif e.key == "R": # Ctrl + R - Обновить
+                 logging.info("Hotkey Ctrl+R detected.")
+                 if not refresh_button.disabled:
+                     refresh_data(None)
+            elif e.key == "C": # Ctrl + C - Копировать все
+                 logging.info("Hotkey Ctrl+C detected.")
+                 if not copy_button.disabled:
+                     copy_to_clipboard(None)
+            elif e.key == "S": # Ctrl + S - Сохранить в файл
+                 logging.info("Hotkey Ctrl+S detected.")
+                 start_export(None)
+            elif e.key == "X": # Ctrl + X - Очистить все
+                 logging.info("Hotkey Ctrl+X detected.")
+                 if not clear_all_button.disabled:
+                     clear_all_fields(None)
+            elif e.key == "P": # Ctrl + P - Панель производительности
+                 logging.info("Hotkey Ctrl+P detected.")
+                 toggle_perf_panel(None)
+            elif e.key in ("Page Down", "Page Up"): # Ctrl + PageDown/PageUp - Страницы результата
+                 preview.step(1 if e.key == "Page Down" else -1)
+        elif e.key == "Enter": # Enter - Показать содержимое
+             logging.info("Hotkey Enter detected.")
+             if not show_content_button.disabled:
+                 start_scan_async(None)
+        elif e.key == "Escape": # Esc - Отменить сканирование, иначе снять выбор
+             logging.info("Hotkey Escape detected.")
+             if scan_controller.cancel():
+                 logging.info("Scan cancelled by user.")
+             elif not deselect_all_button.disabled:
+                 deselect_all(None)
+        # Отправляется только то, что обработчик клавиши действительно изменил (batched)
+
+    page.on_keyboard_event = on_keyboard
+
+    # --- Сборка Layout ---
+
+    # Левая панель
+    left_panel = ft.Container(
+        content=ft.Column([
+            root_tabs, # Вкладки корней рабочего пространства (видны, если корней больше одного)
+            ft.Row([filter_input, content_search_button], spacing=0), # Фильтр по именам или поиск по содержимому
+            # select_buttons_row убран отсюда
+            # ft.Divider(height=5), # Разделитель больше не нужен здесь
+            dir_tree_container, # Дерево сразу под фильтром
+            ft.Row([budget_input, file_cap_input], spacing=5), # Лимиты результата
+            budget_estimate_text, # Оценка выбора до чтения
+            delta_mode_dropdown, # Полный результат или изменения с последнего копирования
+        ], expand=True, spacing=5),
+        padding=10, border=ft.border.all(1, ft.colors.with_opacity(0.3, ft.colors.OUTLINE)),
+        border_radius=ft.border_radius.all(5), expand=LEFT_PANEL_EXPAND, # 20%
+    )
+
+    # Правая панель
+    right_panel = ft.Container(
+         content=ft.Column([
+            _create_field_with_clear_button(start_prompt_input, clear_start_prompt_button),
+            ft.Divider(height=1, thickness=0.5), # Тонкий разделитель
+            # Оборачиваем основное поле и кнопку в Row, чтобы кнопка была сбоку
+            # Но основное поле должно растягиваться по высоте, поэтому оно остается в Column
+             ft.Row(
+                 [preview.outline_container, content_display], # Оглавление (скрыто по умолчанию) и основное поле
+                 expand=True # Row растягивается по высоте Column
+             ),
+            ft.Row([preview.nav_row, ft.Container(expand=True), clear_content_display_button], spacing=0), # Страницы слева, кнопка очистки справа
+            ft.Divider(height=1, thickness=0.5),
+            _create_field_with_clear_button(end_prompt_input, clear_end_prompt_button),
+         ],
+         expand=True, spacing=2), # Уменьшим spacing
+        padding=10, border=ft.border.all(1, ft.colors.with_opacity(0.3, ft.colors.OUTLINE)),
+        border_radius=ft.border_radius.all(5), expand=RIGHT_PANEL_EXPAND, # 80%
+    )
+
+    # --- Основной Layout страницы ---
+    page.add(
+        ft.Column([
+            # Верхняя панель с кнопками
+            ft.Row(
+                [
+                    pick_dir_button,
+                    add_root_button,
+                    remove_root_button,
+                    ft.VerticalDivider(width=10), # Разделитель
+                    selected_directory_text, # Растягивается
+                    ft.VerticalDivider(width=10),
+                    # Группа кнопок выбора
+                    select_all_button,
+                    deselect_all_button,
+                    ft.VerticalDivider(width=10),
+                    # Группа кнопок действий
+                    show_content_button,
+                    refresh_button,
+                    watch_button,
+                    copy_button,
+                    export_button,
+                    clear_all_button, # Общая очистка здесь
+                    perf_button,
+                    progress_ring, # Индикатор рядом с кнопками действий
+                    scan_status_text,
+                ],
+                alignment=ft.MainAxisAlignment.START,
+                vertical_alignment=ft.CrossAxisAlignment.CENTER,
+                spacing=2 # Уменьшим spacing между кнопками
+            ),
+            ft.Divider(height=5),
+            # Основная строка с панелями
+            ft.Row(
+                [
+                    left_panel,
+                    ft.VerticalDivider(width=1),
+                    right_panel,
+                ],
+                vertical_alignment=ft.CrossAxisAlignment.START,
+                expand=True
+            ),
+            perf_panel.container, # Панель производительности (Ctrl+P)
+        ], expand=True)
+    )
+
+    # Загрузка состояния при старте
+    load_app_state()
+    update_button_states() # Устанавливаем начальное состояние кнопок
+
+    # Финальное обновление страницы
+    page.update()
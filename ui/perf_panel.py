@@ -0,0 +1,96 @@
+# --- Панель производительности: сводка спанов профайлера и экспорт замеров ---
+import logging
+from pathlib import Path
+from typing import Optional
+
+import flet as ft
+
+from aggregator import Profiler
+from .render import RenderScheduler
+
+EXPORT_JSON = "json"
+EXPORT_TRACE = "trace"
+
+
+def _format_counts(counts: dict) -> str:
+    return ", ".join(f"{key}={value:,}".replace(",", " ") if isinstance(value, int) else f"{key}={value}" for key, value in counts.items())
+
+
+class PerfPanel:
+    """Сворачиваемая панель: по каждой стадии - вызовы, последнее, максимальное и суммарное время
+    и суммы счётчиков. Пока панель скрыта, профайлер выключен и замеры ничего не стоят."""
+
+    def __init__(self, profiler: Profiler, render: Optional[RenderScheduler] = None):
+        self.profiler = profiler
+        self.render = render
+        self._export_kind = EXPORT_JSON
+        self.file_picker = ft.FilePicker(on_result=self._on_export_path)
+        self._table = ft.DataTable(
+            columns=[ft.DataColumn(ft.Text(title, size=11)) for title in ("Стадия", "Вызовы", "Посл., мс", "Макс., мс", "Всего, мс", "Счётчики")],
+            rows=[], column_spacing=16, heading_row_height=28, data_row_min_height=24, data_row_max_height=24,
+        )
+        self._empty_text = ft.Text("Замеров пока нет: выполните действие в приложении.", size=11, italic=True)
+        header = ft.Row([
+            ft.Text("Производительность", size=12, weight=ft.FontWeight.BOLD),
+            ft.Container(expand=True),
+            ft.IconButton(icon=ft.icons.REFRESH, icon_size=16, tooltip="Обновить сводку", on_click=lambda _: self.refresh(update=True)),
+            ft.IconButton(icon=ft.icons.DELETE_SWEEP, icon_size=16, tooltip="Сбросить замеры", on_click=lambda _: self._clear()),
+            ft.IconButton(icon=ft.icons.DATA_OBJECT, icon_size=16, tooltip="Экспорт в JSON", on_click=lambda _: self._export(EXPORT_JSON)),
+            ft.IconButton(icon=ft.icons.TIMELINE, icon_size=16, tooltip="Экспорт trace-event (chrome://tracing, Perfetto)", on_click=lambda _: self._export(EXPORT_TRACE)),
+        ], spacing=0)
+        self.container = ft.Container(
+            content=ft.Column([header, self._empty_text, ft.Row([self._table], scroll=ft.ScrollMode.AUTO)], spacing=2, scroll=ft.ScrollMode.AUTO),
+            height=220, visible=False, padding=ft.padding.symmetric(horizontal=10, vertical=4),
+            border=ft.border.all(1, ft.colors.with_opacity(0.3, ft.colors.OUTLINE)), border_radius=ft.border_radius.all(5),
+        )
+
+    @property
+    def visible(self) -> bool:
+        return self.container.visible
+
+    def toggle(self) -> bool:
+        """Показать/скрыть панель; вместе с ней включается и выключается профайлер."""
+        self.container.visible = not self.container.visible
+        self.profiler.enabled = self.container.visible
+        logging.info(f"Performance profiling {'enabled' if self.profiler.enabled else 'disabled'}")
+        self.refresh()
+        return self.container.visible
+
+    def refresh(self, update: bool = False):
+        """Перестроить таблицу из текущей сводки (только если панель видна)."""
+        if not self.container.visible: return
+        summary = self.profiler.summary()
+        self._table.rows = [
+            ft.DataRow(cells=[ft.DataCell(ft.Text(value, size=11)) for value in (
+                name, str(entry["calls"]), f"{entry['last_seconds'] * 1000:.1f}", f"{entry['max_seconds'] * 1000:.1f}",
+                f"{entry['total_seconds'] * 1000:.1f}", _format_counts(entry["counts"]),
+            )])
+            for name, entry in sorted(summary.items(), key=lambda item: -item[1]["total_seconds"])
+        ]
+        self._empty_text.visible = not summary
+        if self.render is not None: self.render.mark(self.container) # Уйдёт вместе с остальными изменениями события
+        if update and self.render is not None: self.render.flush()
+        elif update and self.container.page: self.container.update()
+
+    def _clear(self):
+        self.profiler.clear()
+        self.refresh(update=True)
+
+    def _export(self, kind: str):
+        self._export_kind = kind
+        default_name = "aggregator-perf.json" if kind == EXPORT_JSON else "aggregator-trace.json"
+        self.file_picker.save_file(dialog_title="Сохранить замеры", file_name=default_name, allowed_extensions=["json"])
+
+    def _on_export_path(self, e: ft.FilePickerResultEvent):
+        if not e.path: return
+        path = Path(e.path)
+        try:
+            if self._export_kind == EXPORT_JSON: self.profiler.export_json(path)
+            else: self.profiler.export_trace(path)
+            logging.info(f"Performance data exported to {path}")
+            message = f"Замеры сохранены: {path}"
+        except OSError as export_err:
+            logging.error(f"Failed to export performance data: {export_err}")
+            message = f"Ошибка сохранения замеров: {export_err}"
+        page = self.container.page
+        if page: page.show_snack_bar(ft.SnackBar(ft.Text(message), open=True))
@@ -0,0 +1,166 @@
+# --- Постраничный предпросмотр результата: окно текста по блокам файлов и оглавление ---
+import bisect
+import logging
+from typing import List, Optional
+
+import flet as ft
+
+from aggregator import OutputBuffer, OutlineEntry, format_size
+from .render import RenderScheduler
+
+PAGE_CHARS = 100_000 # Столько символов результата отправляется клиенту за раз
+OUTLINE_ROW_HEIGHT = 26
+OUTLINE_MAX_ROWS = 1000 # Строк оглавления в окне вокруг текущей страницы
+OUTLINE_WIDTH = 300
+
+
+class PreviewPager:
+    """Показывает в поле вывода одну страницу результата, а не весь текст.
+
+    Полный результат остаётся в OutputBuffer на стороне Python (копирование и экспорт читают
+    его оттуда). Страницы выровнены по началам блоков файлов; блок длиннее страницы режется.
+    Оглавление (путь, размер, строки) позволяет перейти к странице нужного файла; при
+    огромном числе файлов отрисовывается только окно оглавления вокруг текущей страницы.
+    С планировщиком изменения всегда помечаются в нём, и update отправляет их сразу.
+    """
+
+    def __init__(self, display: ft.TextField, page_chars: int = PAGE_CHARS, render: Optional[RenderScheduler] = None):
+        self.display = display
+        self.render = render
+        self.page_chars = page_chars
+        self.output: Optional[OutputBuffer] = None
+        self.page_index = 0
+        self._bounds: List[int] = []
+        self._outline: List[OutlineEntry] = []
+        self._starts: List[int] = [] # Начала файлов оглавления, для bisect
+        self._first_button = ft.IconButton(icon=ft.icons.FIRST_PAGE, icon_size=16, tooltip="Первая страница", on_click=lambda _: self.show(0, update=True))
+        self._prev_button = ft.IconButton(icon=ft.icons.CHEVRON_LEFT, icon_size=16, tooltip="Предыдущая страница [Ctrl+PageUp]", on_click=lambda _: self.step(-1, update=True))
+        self._next_button = ft.IconButton(icon=ft.icons.CHEVRON_RIGHT, icon_size=16, tooltip="Следующая страница [Ctrl+PageDown]", on_click=lambda _: self.step(1, update=True))
+        self._last_button = ft.IconButton(icon=ft.icons.LAST_PAGE, icon_size=16, tooltip="Последняя страница", on_click=lambda _: self.show(len(self._bounds) - 1, update=True))
+        self._outline_button = ft.IconButton(
+            icon=ft.icons.LIST, selected_icon=ft.icons.LIST_ALT, selected=False, icon_size=16,
+            tooltip="Оглавление: файлы результата", on_click=lambda _: self.toggle_outline(),
+        )
+        self._status_text = ft.Text("", size=11)
+        self.nav_row = ft.Row(
+            [self._outline_button, self._first_button, self._prev_button, self._status_text, self._next_button, self._last_button],
+            spacing=0, visible=False, vertical_alignment=ft.CrossAxisAlignment.CENTER,
+        )
+        self._outline_list = ft.ListView(expand=1, spacing=0, item_extent=OUTLINE_ROW_HEIGHT)
+        self.outline_container = ft.Container(
+            content=self._outline_list, width=OUTLINE_WIDTH, visible=False, padding=ft.padding.only(right=5),
+            border=ft.border.only(right=ft.border.BorderSide(1, ft.colors.with_opacity(0.3, ft.colors.OUTLINE))),
+        )
+
+    # --- Публичный API ---
+    @property
+    def page_count(self) -> int:
+        return len(self._bounds)
+
+    def set_output(self, output: Optional[OutputBuffer], update: bool = False):
+        """Новый результат (None - в поле сообщение, постраничный режим выключен)."""
+        self.output = output
+        self.page_index = 0
+        self._bounds = []; self._outline = []; self._starts = []
+        if output is None:
+            self.nav_row.visible = False
+            self.outline_container.visible = self._outline_button.selected = False
+            self._update(update)
+            return
+        self.refresh(update=update)
+
+    def refresh(self, update: bool = False):
+        """Пересчитать страницы (результат растёт во время сканирования) и перерисовать текущую."""
+        if self.output is None: return
+        self._outline = self.output.outline()
+        self._starts = [entry.start for entry in self._outline]
+        self._bounds = self.output.pages(self.page_chars)
+        self.show(min(self.page_index, max(0, len(self._bounds) - 1)), update=update)
+
+    def step(self, delta: int, update: bool = False) -> bool:
+        if self.output is None or not 0 <= self.page_index + delta < len(self._bounds): return False
+        self.show(self.page_index + delta, update=update)
+        return True
+
+    def show(self, page_index: int, update: bool = False):
+        """Отправить в поле вывода страницу page_index."""
+        if self.output is None: return
+        self.page_index = max(0, min(page_index, len(self._bounds) - 1))
+        total = len(self.output)
+        if self._bounds:
+            start = self._bounds[self.page_index]
+            end = self._bounds[self.page_index + 1] if self.page_index + 1 < len(self._bounds) else total
+        else:
+            start = end = 0
+        self.display.value = self.output.read(start, end - start)
+        paged = len(self._bounds) > 1
+        self.nav_row.visible = paged or bool(self._outline)
+        for button, disabled in (
+            (self._first_button, self.page_index == 0), (self._prev_button, self.page_index == 0),
+            (self._next_button, self.page_index >= len(self._bounds) - 1), (self._last_button, self.page_index >= len(self._bounds) - 1),
+        ):
+            button.disabled = disabled; button.visible = paged
+        files = self._files_on_page(start, end)
+        self._status_text.value = (
+            (f"Стр. {self.page_index + 1}/{len(self._bounds)} · " if paged else "")
+            + f"символы {start:,}–{end:,} из {total:,}".replace(",", " ")
+            + (f" · {self._files_label(files)} из {len(self._outline)}" if files else "")
+        )
+        if self.outline_container.visible: self._render_outline()
+        self._update(update)
+
+    def jump_to(self, entry_index: int, update: bool = True):
+        """Перейти к странице, с которой начинается файл entry_index оглавления."""
+        if self.output is None or not 0 <= entry_index < len(self._outline): return
+        self.show(OutputBuffer.page_of(self._bounds, self._outline[entry_index].start), update=update)
+
+    def toggle_outline(self):
+        self.outline_container.visible = self._outline_button.selected = not self.outline_container.visible
+        if self.outline_container.visible: self._render_outline()
+        self._update(True)
+
+    # --- Внутреннее ---
+    def _files_on_page(self, start: int, end: int):
+        """(первый, за последним) индексы файлов оглавления, начинающихся на странице; None - таких нет."""
+        first, last = bisect.bisect_left(self._starts, start), bisect.bisect_left(self._starts, end)
+        return (first, last) if last > first else None
+
+    @staticmethod
+    def _files_label(files) -> str:
+        first, last = files
+        return f"файл {first + 1}" if last - first == 1 else f"файлы {first + 1}–{last}"
+
+    def _render_outline(self):
+        """Окно оглавления вокруг файлов текущей страницы (строки - лёгкие контейнеры фиксированной высоты)."""
+        if not self._outline:
+            self._outline_list.controls = [ft.Text("Нет файлов", size=11, italic=True)]
+            return
+        current_start = self._bounds[self.page_index] if self._bounds else 0
+        current = min(bisect.bisect_left(self._starts, current_start), len(self._outline) - 1)
+        first = max(0, min(current - OUTLINE_MAX_ROWS // 2, len(self._outline) - OUTLINE_MAX_ROWS))
+        rows: List[ft.Control] = []
+        if first > 0: rows.append(ft.Text(f"… ещё {first} выше", size=10, italic=True))
+        for entry_index in range(first, min(len(self._outline), first + OUTLINE_MAX_ROWS)):
+            entry = self._outline[entry_index]
+            on_page = OutputBuffer.page_of(self._bounds, entry.start) == self.page_index
+            rows.append(ft.Container(
+                content=ft.Row([
+                    ft.Text(entry.label, size=11, no_wrap=True, expand=True, weight=ft.FontWeight.BOLD if on_page else None, tooltip=entry.label),
+                    ft.Text(f"{format_size(entry.size)} · {entry.lines} стр.", size=10, no_wrap=True),
+                ], spacing=4),
+                height=OUTLINE_ROW_HEIGHT, padding=ft.padding.symmetric(horizontal=4),
+                on_click=lambda _, i=entry_index: self.jump_to(i),
+            ))
+        remaining = len(self._outline) - first - OUTLINE_MAX_ROWS
+        if remaining > 0: rows.append(ft.Text(f"… ещё {remaining} ниже", size=10, italic=True))
+        self._outline_list.controls = rows
+
+    def _update(self, send: bool):
+        if self.render is not None:
+            self.render.mark(self.display, self.nav_row, self.outline_container)
+            if send: self.render.flush()
+            return
+        page = self.nav_row.page
+        if not send or page is None: return
+        try: page.update(self.display, self.nav_row, self.outline_container)
+        except Exception as update_err: logging.warning(f"Could not update preview: {update_err}")
@@ -0,0 +1,94 @@
+# --- Планировщик отрисовки: грязные контролы и одна отправка клиенту на событие или кадр ---
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Callable, Dict, Optional
+
+import flet as ft
+
+from aggregator import profiler
+
+FRAME_SECONDS = 1 / 30 # Изменения из фоновых потоков вне batch() отправляются не чаще раза за кадр
+
+
+class RenderScheduler:
+    """Собирает изменённые контролы и отправляет их одним page.update(*controls).
+
+    Обработчики событий работают внутри batch() (или обёрнуты batched): всё, что они
+    пометили, уходит клиенту одним сообщением при выходе из самого внешнего batch.
+    Пометки вне batch (фоновое сканирование, фильтр, наблюдатель) копятся до ближайшего
+    кадра FRAME_SECONDS. set() меняет только отличающиеся свойства и не помечает контрол,
+    если ничего не изменилось; сами свойства Flet сравнивает со снимком и шлёт только разницу.
+    """
+
+    def __init__(self, page: ft.Page, frame_seconds: float = FRAME_SECONDS):
+        self.page = page
+        self.frame_seconds = frame_seconds
+        self._dirty: Dict[int, ft.Control] = {} # id -> контрол, в порядке пометки
+        self._full = False # Нужно обновить страницу целиком (сменилась раскладка, оверлеи)
+        self._lock = threading.Lock()
+        self._local = threading.local() # Глубина batch() в текущем потоке
+        self._timer: Optional[threading.Timer] = None
+        self.flushes = 0
+
+    # --- Пометки ---
+    def mark(self, *controls: Optional[ft.Control]):
+        with self._lock:
+            for control in controls:
+                if control is not None: self._dirty[id(control)] = control
+        self._after_mark()
+
+    def mark_page(self):
+        with self._lock: self._full = True
+        self._after_mark()
+
+    def set(self, control: ft.Control, **props) -> bool:
+        """Присвоить свойства; контрол помечается, только если какое-то из них изменилось."""
+        changed = False
+        for name, value in props.items():
+            if getattr(control, name) != value:
+                setattr(control, name, value); changed = True
+        if changed: self.mark(control)
+        return changed
+
+    # --- Группировка ---
+    @contextmanager
+    def batch(self):
+        depth = getattr(self._local, "depth", 0)
+        self._local.depth = depth + 1
+        try:
+            yield self
+        finally:
+            self._local.depth = depth
+            if depth == 0: self.flush()
+
+    def batched(self, handler: Callable) -> Callable:
+        """Обёртка обработчика события: все его пометки уходят одной отправкой."""
+        def wrapper(*args, **kwargs):
+            with self.batch(): return handler(*args, **kwargs)
+        wrapper.__name__ = getattr(handler, "__name__", "handler")
+        return wrapper
+
+    def _after_mark(self):
+        if getattr(self._local, "depth", 0): return # Отправится при выходе из batch
+        with self._lock:
+            if self._timer is not None: return
+            self._timer = threading.Timer(self.frame_seconds, self.flush)
+            self._timer.daemon = True
+            self._timer.start()
+
+    # --- Отправка ---
+    def flush(self):
+        with self._lock:
+            if self._timer is not None: self._timer.cancel(); self._timer = None
+            full, self._full = self._full, False
+            controls = [control for control in self._dirty.values() if control.page is not None]
+            self._dirty.clear()
+        if not full and not controls: return
+        self.flushes += 1
+        try:
+            with profiler.span("ui_update", controls=len(controls), full=int(full)):
+                if full: self.page.update()
+                else: self.page.update(*controls)
+        except Exception as update_err:
+            logging.warning(f"Could not flush UI updates: {update_err}")
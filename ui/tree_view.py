@@ -0,0 +1,182 @@
+# --- Виртуализированное дерево файлов: плоская модель строк + окно видимых контролов ---
+import math
+import logging
+from typing import Callable, Dict, List, Optional, Tuple
+
+import flet as ft
+
+from aggregator import TreeIndex
+from .render import RenderScheduler
+
+ROW_HEIGHT = 30 # Фиксированная высота строки - по ней считается окно прокрутки
+INDENT_WIDTH = 20
+OVERSCAN_ROWS = 40 # Запас строк сверху и снизу от видимой области
+DEFAULT_VIEWPORT_ROWS = 40 # Пока клиент не прислал размер области прокрутки
+ROW_CACHE_LIMIT = 3000
+
+
+class _RowControls:
+    """Контролы одной строки дерева, которые можно точечно обновлять."""
+    __slots__ = ("container", "expand_button", "checkbox")
+
+    def __init__(self, container: ft.Container, expand_button: Optional[ft.IconButton], checkbox: ft.Checkbox):
+        self.container = container
+        self.expand_button = expand_button
+        self.checkbox = checkbox
+
+
+class VirtualTreeView:
+    """Дерево, отрисованное через ListView, в котором материализованы только строки рядом с экраном.
+
+    Модель - плоский список (id узла, глубина) из TreeIndex.flatten. Высоту невидимых строк
+    заменяют два контейнера-распорки, поэтому полоса прокрутки соответствует всему дереву.
+    Разворачивание, сворачивание и отметки меняют только затронутые строки.
+    """
+
+    def __init__(
+        self,
+        on_toggle_expand: Callable[[int], None],
+        on_check: Callable[[int, bool], None],
+        is_selected: Callable[[int], Optional[bool]], # None - папка выбрана частично
+        is_expanded: Callable[[int], bool],
+        render: Optional[RenderScheduler] = None,
+    ):
+        self.render = render
+        self.on_toggle_expand = on_toggle_expand
+        self.on_check = on_check
+        self.is_selected = is_selected
+        self.is_expanded = is_expanded
+        self.index: Optional[TreeIndex] = None
+        self.rows: List[Tuple[int, int]] = []
+        self._start = 0
+        self._end = 0
+        self._viewport_rows = DEFAULT_VIEWPORT_ROWS
+        self._row_cache: Dict[int, _RowControls] = {}
+        self._top_spacer = ft.Container(height=0)
+        self._bottom_spacer = ft.Container(height=0)
+        self.list_view = ft.ListView(
+            expand=1, spacing=0, padding=ft.padding.only(top=5),
+            on_scroll=self._on_scroll, on_scroll_interval=50,
+        )
+
+    # --- Публичный API ---
+    @property
+    def has_rows(self) -> bool:
+        return bool(self.rows)
+
+    @property
+    def rendered_rows(self) -> int:
+        """Сколько строк сейчас материализовано в контролы."""
+        return self._end - self._start
+
+    def set_index(self, index: Optional[TreeIndex]):
+        """Новый индекс - все закэшированные строки больше не действительны."""
+        self.index = index
+        self._row_cache.clear()
+        self.rows = []
+
+    def show_message(self, message: str, color: Optional[str] = None):
+        self.rows = []
+        self._start = self._end = 0
+        self.list_view.controls = [ft.Text(message, size=12, color=color)]
+
+    def set_rows(self, rows: List[Tuple[int, int]]):
+        """Новая плоская модель (после фильтра или разворачивания); материализуется только окно."""
+        self.rows = rows
+        first_visible = self._start + OVERSCAN_ROWS if self._start else 0
+        self._materialize(min(first_visible, max(0, len(rows) - self._viewport_rows)))
+
+    def refresh_node(self, node_id: int) -> List[ft.Control]:
+        """Привести строку узла к текущему состоянию (иконка раскрытия, отметка). Возвращает изменённые контролы."""
+        row = self._row_cache.get(node_id)
+        if row is None: return []
+        changed = []
+        is_selected = self.is_selected(node_id)
+        if row.checkbox.value != is_selected:
+            row.checkbox.value = is_selected; changed.append(row.checkbox)
+        if row.expand_button is not None:
+            icon = ft.icons.ARROW_DROP_DOWN if self.is_expanded(node_id) else ft.icons.ARROW_RIGHT
+            if row.expand_button.icon != icon:
+                row.expand_button.icon = icon; changed.append(row.expand_button)
+        return changed
+
+    def refresh_checks(self) -> List[ft.Control]:
+        """Синхронизировать отметки материализованных строк (после выбрать все/снять выбор)."""
+        changed: List[ft.Control] = []
+        for node_id, _ in self.rows[self._start:self._end]:
+            changed.extend(self.refresh_node(node_id))
+        # Строки вне окна создаются заново с актуальным состоянием, их кэш можно сбросить
+        visible_window = {node_id for node_id, _ in self.rows[self._start:self._end]}
+        for node_id in [n for n in self._row_cache if n not in visible_window]: del self._row_cache[node_id]
+        return changed
+
+    def update(self, controls: Optional[List[ft.Control]] = None):
+        """Отправить клиенту либо только изменённые контролы, либо окно списка целиком.
+
+        С планировщиком контролы только помечаются и уходят вместе с остальными изменениями события."""
+        if self.render is not None:
+            if controls is None: self.render.mark(self.list_view)
+            else: self.render.mark(*controls)
+            return
+        page = self.list_view.page
+        if page is None: return
+        try:
+            if controls is None: self.list_view.update()
+            elif controls: page.update(*controls)
+        except Exception as update_err:
+            logging.warning(f"Could not update tree view: {update_err}")
+
+    # --- Окно прокрутки ---
+    def _on_scroll(self, e: ft.OnScrollEvent):
+        if e.viewport_dimension:
+            self._viewport_rows = max(1, math.ceil(e.viewport_dimension / ROW_HEIGHT))
+        first_visible = int(max(0.0, e.pixels) // ROW_HEIGHT)
+        last_visible = first_visible + self._viewport_rows
+        margin = OVERSCAN_ROWS // 2
+        if first_visible < self._start + margin and self._start > 0 or last_visible > self._end - margin and self._end < len(self.rows):
+            self._materialize(first_visible)
+            self.update()
+            if self.render is not None: self.render.flush() # Прокрутка не ждёт кадра
+
+    def _materialize(self, first_visible: int):
+        self._start = max(0, first_visible - OVERSCAN_ROWS)
+        self._end = min(len(self.rows), first_visible + self._viewport_rows + OVERSCAN_ROWS)
+        self._top_spacer.height = self._start * ROW_HEIGHT
+        self._bottom_spacer.height = (len(self.rows) - self._end) * ROW_HEIGHT
+        window = [self._get_row(node_id, depth).container for node_id, depth in self.rows[self._start:self._end]]
+        self.list_view.controls = [self._top_spacer, *window, self._bottom_spacer]
+        if len(self._row_cache) > ROW_CACHE_LIMIT:
+            window_ids = {node_id for node_id, _ in self.rows[self._start:self._end]}
+            for node_id in [n for n in self._row_cache if n not in window_ids]: del self._row_cache[node_id]
+
+    def _get_row(self, node_id: int, depth: int) -> _RowControls:
+        row = self._row_cache.get(node_id)
+        if row is not None:
+            self.refresh_node(node_id)
+            return row
+        row = self._build_row(node_id, depth)
+        self._row_cache[node_id] = row
+        return row
+
+    def _build_row(self, node_id: int, depth: int) -> _RowControls:
+        index = self.index
+        is_dir = index.is_dir(node_id)
+        expand_button = None
+        if is_dir:
+            expand_button = ft.IconButton(
+                icon=ft.icons.ARROW_DROP_DOWN if self.is_expanded(node_id) else ft.icons.ARROW_RIGHT,
+                icon_size=18, tooltip="Развернуть/Свернуть", data=node_id, style=ft.ButtonStyle(padding=0),
+                on_click=lambda e: self.on_toggle_expand(e.control.data),
+            )
+            expand_control: ft.Control = expand_button
+        else:
+            expand_control = ft.Container(width=24, height=24)
+        checkbox = ft.Checkbox(
+            value=self.is_selected(node_id), tristate=True, data=node_id, visual_density=ft.VisualDensity.COMPACT,
+            on_change=lambda e: self.on_check(e.control.data, bool(e.control.value)),
+        )
+        icon = ft.Icon(ft.icons.FOLDER if is_dir else ft.icons.INSERT_DRIVE_FILE_OUTLINED, size=16, opacity=0.8)
+        text = ft.Text(index.names[node_id], size=12, overflow=ft.TextOverflow.ELLIPSIS, no_wrap=True, weight=ft.FontWeight.BOLD if is_dir else ft.FontWeight.NORMAL)
+        node_row = ft.Row([expand_control, checkbox, icon, text], spacing=2, alignment=ft.MainAxisAlignment.START, vertical_alignment=ft.CrossAxisAlignment.CENTER, wrap=False)
+        container = ft.Container(content=node_row, height=ROW_HEIGHT, padding=ft.padding.only(left=depth * INDENT_WIDTH))
+        return _RowControls(container, expand_button, checkbox)